@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+"""Measure how long an abort Post waits behind a backlog of BlockChanges.
+
+The Process queue is filled with changes to a motors block with subscribers,
+as a scan streaming positions would, then an abort Post is queued for the
+scan block. Handling it changes the scan block's state and responds with a
+Return. The latency is the time from queueing the Post to the Return
+arriving on its response queue. With lanes it only waits for the scan
+block's own changes, so stays bounded however big the backlog is, with a
+single FIFO lane it grows with the backlog.
+"""
+import os
+import sys
+import time
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from collections import OrderedDict
+from threading import Lock
+
+from malcolm.core.lanequeue import LaneQueue
+from malcolm.core.process import Process, PROCESS_STOP
+from malcolm.core.request import Post, Subscribe
+from malcolm.core.response import Return
+from malcolm.compat import queue
+
+NUM_SUBSCRIBERS = 10
+
+
+class NullQueue(object):
+    def put(self, item):
+        pass
+
+
+class TimingQueue(object):
+    """Records when the response arrives, then stops the Process"""
+    def __init__(self, process):
+        self.process = process
+        self.times = []
+
+    def put(self, item):
+        self.times.append(time.time())
+        self.process.q.put(PROCESS_STOP)
+
+
+class NullSyncFactory(object):
+    def create_queue(self):
+        return queue.Queue()
+
+    def create_lock(self):
+        return Lock()
+
+    def create_lane_queue(self, lane_for, lanes):
+        return LaneQueue(self.create_queue(), self.create_lock(), lane_for,
+                         lanes)
+
+
+def make_process(fifo):
+    p = Process("proc", NullSyncFactory())
+    if fifo:
+        p.q.lane_for = lambda message: 0
+    # drain the process block
+    while p.q.qsize():
+        p.handle_message(p.q.get())
+    p._block_state_cache["motors"] = OrderedDict(
+        position=OrderedDict(value=0))
+    p._block_state_cache["scan"] = OrderedDict(
+        state=OrderedDict(value="Running"))
+    for i, endpoint in enumerate(
+            [["motors", "position"]] * NUM_SUBSCRIBERS + [["scan", "state"]]):
+        request = Subscribe(None, NullQueue(), endpoint, True)
+        request.set_id(i)
+        p._subscriptions.add(request.endpoint, request)
+    return p
+
+
+def abort_latency(fifo, backlog):
+    p = make_process(fifo)
+    response_queue = TimingQueue(p)
+
+    def handle_post(request):
+        p.on_changed([["scan", "state", "value"], "Aborted"])
+        p.block_respond(Return(request.id_, request.context),
+                        request.response_queue, "scan")
+
+    p._handle_functions[Post] = handle_post
+    for i in range(backlog):
+        p.on_changed([["motors", "position", "value"], i])
+    queued = time.time()
+    p.q.put(Post(None, response_queue, ["scan", "abort"]))
+    p.recv_loop()
+    return response_queue.times[0] - queued
+
+
+def main():
+    print("%10s %16s %16s" % ("backlog", "fifo ms", "lanes ms"))
+    for backlog in (100, 1000, 10000, 100000):
+        fifo = abort_latency(True, backlog)
+        lanes = abort_latency(False, backlog)
+        print("%10d %16.3f %16.3f" % (backlog, fifo * 1e3, lanes * 1e3))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+#!/usr/bin/env python
+"""Measure the cost of the Maps made for calling a Method with many
+parameters.
+
+Each call makes a Map of the parameters, checks it is valid, and the function
+reads every parameter and fills in a Map of return values with one entry per
+parameter, which is then checked against the returns MapMeta.
+"""
+import os
+import sys
+import timeit
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from collections import OrderedDict
+
+from malcolm.core.map import Map
+from malcolm.core.mapmeta import MapMeta
+from malcolm.core.method import Method
+from malcolm.vmetas import NumberMeta, StringMeta
+
+REPEATS = 200
+
+
+def make_method(num_parameters):
+    elements = OrderedDict()
+    for i in range(num_parameters):
+        if i % 2:
+            elements["p%d" % i] = NumberMeta("float64")
+        else:
+            elements["p%d" % i] = StringMeta()
+    takes = MapMeta()
+    takes.set_elements(elements)
+    takes.set_required(list(elements))
+    returns = MapMeta()
+    returns.set_elements(elements)
+    method = Method()
+    method.set_takes(takes)
+    method.set_returns(returns)
+
+    def func(parameters, returns):
+        for k, v in parameters.items():
+            returns[k] = v
+        return returns
+
+    method.set_function(func)
+    parameters = OrderedDict(
+        ("p%d" % i, i if i % 2 else str(i)) for i in range(num_parameters))
+    return method, parameters
+
+
+def main():
+    print("%12s %16s %16s" % ("parameters", "us per call", "us per items"))
+    for num_parameters in (10, 50, 100, 200):
+        method, parameters = make_method(num_parameters)
+        t = timeit.timeit(lambda: method.call_function(dict(parameters)),
+                          number=REPEATS)
+        m = Map(method.takes, parameters)
+        t_items = timeit.timeit(m.items, number=REPEATS)
+        print("%12d %16.1f %16.1f" % (num_parameters, t / REPEATS * 1e6,
+                                      t_items / REPEATS * 1e6))
+
+
+if __name__ == "__main__":
+    main()
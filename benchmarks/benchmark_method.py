@@ -0,0 +1,37 @@
+#!/usr/bin/env python
+"""Measure the overhead of calling a small Method like say_hello.
+
+The function does no work, so the time per call is the cost of validating the
+parameters, filling in defaults and validating the return value.
+"""
+import os
+import sys
+import timeit
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from malcolm.core.method import Method, takes, returns, REQUIRED
+from malcolm.vmetas import NumberMeta, StringMeta
+
+REPEATS = 10000
+
+
+@takes("name", StringMeta(description="a name"), REQUIRED,
+       "sleep", NumberMeta("float64", description="Time to wait"), 0)
+@returns("greeting", StringMeta(description="a greeting"), REQUIRED)
+def say_hello(parameters, return_map):
+    return_map.greeting = "Hello %s" % parameters.name
+    return return_map
+
+
+def main():
+    method = say_hello.Method
+    method.set_function(say_hello)
+    print("%16s" % "us per call")
+    for _ in range(3):
+        t = timeit.timeit(lambda: method.call_function(dict(name="me")),
+                          number=REPEATS)
+        print("%16.1f" % (t / REPEATS * 1e6))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+"""Measure how many messages per second Process.recv_loop can handle.
+
+The queue is filled with the mix a busy Process sees: changes to a block
+with delta and update subscribers, the responses blocks send back, and Gets.
+Every message handled allocates more of them, so this shows the cost of
+allocating and freeing messages as well as handling them. The memory used by
+each kind of message is shown too.
+"""
+import os
+import sys
+import time
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from collections import OrderedDict
+from threading import Lock
+
+from malcolm.core.lanequeue import LaneQueue
+from malcolm.core.process import Process, BlockChanges, BlockRespond, \
+    PROCESS_STOP
+from malcolm.core.request import Get, Subscribe
+from malcolm.core.response import Return, Delta
+from malcolm.compat import queue
+
+NUM_ATTRIBUTES = 10
+NUM_SUBSCRIBERS = 10
+NUM_MESSAGES = 100000
+
+
+class NullQueue(object):
+    def put(self, item):
+        pass
+
+
+class NullSyncFactory(object):
+    def create_queue(self):
+        return queue.Queue()
+
+    def create_lock(self):
+        return Lock()
+
+    def create_lane_queue(self, lane_for, lanes):
+        return LaneQueue(self.create_queue(), self.create_lock(), lane_for,
+                         lanes)
+
+
+def make_process():
+    p = Process("proc", NullSyncFactory())
+    # drain the process block
+    while p.q.qsize():
+        p.handle_message(p.q.get())
+    p._block_state_cache["block"] = OrderedDict(
+        ("attr%d" % i, OrderedDict(value=0)) for i in range(NUM_ATTRIBUTES))
+    for i in range(NUM_SUBSCRIBERS):
+        endpoint = ["block", "attr%d" % (i % NUM_ATTRIBUTES)]
+        request = Subscribe(None, NullQueue(), endpoint, delta=bool(i % 2))
+        request.set_id(i)
+        p._subscriptions.add(endpoint, request)
+    return p
+
+
+def fill(p):
+    response_queue = NullQueue()
+    for i in range(NUM_MESSAGES):
+        kind = i % 4
+        if kind < 2:
+            change = [["block", "attr%d" % (i % NUM_ATTRIBUTES), "value"], i]
+            p.q.put(BlockChanges("block", [change]))
+        elif kind == 2:
+            p.q.put(BlockRespond(Return(i, None, i), response_queue))
+        else:
+            request = Get(None, response_queue, ["block", "attr0", "value"])
+            request.set_id(i)
+            p.q.put(request)
+    p.q.put(PROCESS_STOP)
+
+
+def message_size(message):
+    size = sys.getsizeof(message)
+    if hasattr(message, "__dict__"):
+        size += sys.getsizeof(message.__dict__)
+    return size
+
+
+def run():
+    p = make_process()
+    fill(p)
+    start = time.time()
+    p.recv_loop()
+    return NUM_MESSAGES / (time.time() - start)
+
+
+def main():
+    for message in (Get(None, None, ["block"]), Delta(1, None, [], None, 1),
+                    BlockChanges("block", [])):
+        print("%16s %6d bytes" % (type(message).__name__,
+                                  message_size(message)))
+    print("%16s" % "messages/s")
+    for _ in range(3):
+        print("%16d" % run())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+"""Measure the cost of fanning a single change out to subscribers of a block.
+
+Subscribers are spread evenly over the attributes of a 100 attribute block,
+so each change is only of interest to a fraction of them.
+"""
+import os
+import sys
+import timeit
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from collections import OrderedDict
+from threading import Lock
+
+from malcolm.core.lanequeue import LaneQueue
+from malcolm.core.process import Process, BlockChanges
+from malcolm.core.request import Subscribe
+from malcolm.compat import queue
+
+NUM_ATTRIBUTES = 100
+REPEATS = 200
+
+
+class NullQueue(object):
+    def put(self, item):
+        pass
+
+
+class NullSyncFactory(object):
+    def create_queue(self):
+        return queue.Queue()
+
+    def create_lock(self):
+        return Lock()
+
+    def create_lane_queue(self, lane_for, lanes):
+        return LaneQueue(self.create_queue(), self.create_lock(), lane_for,
+                         lanes)
+
+
+def make_process(num_subscribers):
+    p = Process("proc", NullSyncFactory())
+    block_dict = OrderedDict(
+        ("attr%d" % i, OrderedDict(value=0)) for i in range(NUM_ATTRIBUTES))
+    p._block_state_cache["block"] = block_dict
+    response_queue = NullQueue()
+    for i in range(num_subscribers):
+        endpoint = ["block", "attr%d" % (i % NUM_ATTRIBUTES)]
+        request = Subscribe(None, response_queue, endpoint, delta=bool(i % 2))
+        request.set_id(i)
+        p._subscriptions.add(endpoint, request)
+    return p
+
+
+def notify(p, i=[0]):
+    i[0] += 1
+    change = [["block", "attr%d" % (i[0] % NUM_ATTRIBUTES), "value"], i[0]]
+    p._handle_block_changes(BlockChanges(name="block", changes=[change]))
+
+
+def main():
+    print("%12s %16s" % ("subscribers", "us per notify"))
+    for num_subscribers in (10, 100, 1000, 10000):
+        p = make_process(num_subscribers)
+        t = timeit.timeit(lambda: notify(p), number=REPEATS)
+        print("%12d %16.1f" % (num_subscribers, t / REPEATS * 1e6))
+
+
+if __name__ == "__main__":
+    main()
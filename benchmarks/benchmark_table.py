@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+"""Measure how long it takes to build a table of scan positions.
+
+The table has float64 x and y columns and an int32 point number column, as
+a scan would publish. It is built a row at a time with append(), all at once
+with extend() and from whole columns with from_columns(), then every row is
+read back.
+"""
+import os
+import sys
+import time
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from collections import OrderedDict
+
+import numpy as np
+
+import malcolm.core
+from malcolm.core.table import Table
+from malcolm.vmetas import NumberArrayMeta, TableMeta
+
+
+def make_meta():
+    meta = TableMeta()
+    meta.set_elements(OrderedDict((
+        ("point", NumberArrayMeta("int32")),
+        ("x", NumberArrayMeta("float64")),
+        ("y", NumberArrayMeta("float64")))))
+    return meta
+
+
+def timed(f, *args):
+    start = time.time()
+    f(*args)
+    return (time.time() - start) * 1000
+
+
+def append_rows(meta, rows):
+    t = Table(meta)
+    for row in rows:
+        t.append(row)
+    # appended rows are validated and added the next time the table is used
+    len(t)
+
+
+def extend_rows(meta, rows):
+    Table(meta).extend(rows)
+
+
+def read_rows(t):
+    for i in range(len(t)):
+        t[i]
+
+
+def main():
+    meta = make_meta()
+    print("%8s %12s %12s %12s %12s" % (
+        "rows", "append ms", "extend ms", "columns ms", "read ms"))
+    for num_rows in (1000, 10000, 100000):
+        point = np.arange(num_rows, dtype=np.int32)
+        x = np.random.random(num_rows)
+        y = np.random.random(num_rows)
+        rows = [[int(p), float(a), float(b)] for p, a, b in zip(point, x, y)]
+        t = Table.from_columns(meta, [point, x, y])
+        print("%8d %12.1f %12.1f %12.1f %12.1f" % (
+            num_rows, timed(append_rows, meta, rows),
+            timed(extend_rows, meta, rows),
+            timed(Table.from_columns, meta, [point, x, y]),
+            timed(read_rows, t)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+"""Measure what publishing an edit to a large table attribute costs.
+
+A table of scan positions is set as the value of an Attribute, then one row
+is changed, a row is inserted in the middle and ten rows are appended, and
+the Attribute is set to the same table again after each. The changes it
+reports are encoded as JSON, as a subscriber would receive them, and
+compared with setting a new Table with the same rows.
+"""
+import json
+import os
+import sys
+import time
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from collections import OrderedDict
+
+import numpy as np
+
+import malcolm.core
+from malcolm.core.attribute import Attribute
+from malcolm.core.serializable import serialize_hook
+from malcolm.core.table import Table
+from malcolm.vmetas import NumberArrayMeta, TableMeta
+
+
+class ChangeRecorder(object):
+    def __init__(self):
+        self.changes = []
+
+    def on_changed(self, change, notify=True):
+        self.changes.append(change)
+
+
+def make_meta():
+    meta = TableMeta()
+    meta.set_elements(OrderedDict((
+        ("point", NumberArrayMeta("int32")),
+        ("x", NumberArrayMeta("float64")),
+        ("y", NumberArrayMeta("float64")))))
+    return meta
+
+
+def publish(attribute, value):
+    """Set value, returning the ms taken and bytes of JSON reported"""
+    recorder = attribute.parent
+    del recorder.changes[:]
+    start = time.time()
+    attribute.set_value(value)
+    encoded = [json.dumps(c, default=serialize_hook)
+               for c in recorder.changes]
+    return (time.time() - start) * 1000, sum(len(e) for e in encoded)
+
+
+def edit_row(t):
+    t[len(t) // 2] = [-1, 0.5, 0.5]
+
+
+def insert_row(t):
+    t.insert(len(t) // 2, [[-1, 0.5, 0.5]])
+
+
+def append_rows(t):
+    t.extend([[-1, 0.5, 0.5]] * 10)
+
+
+def main():
+    meta = make_meta()
+    print("%8s %8s %10s %10s %12s %12s" % (
+        "rows", "edit", "rows ms", "rows B", "whole ms", "whole B"))
+    for num_rows in (1000, 10000, 100000):
+        t = Table.from_columns(meta, [
+            np.arange(num_rows, dtype=np.int32),
+            np.random.random(num_rows), np.random.random(num_rows)])
+        attribute = Attribute(meta)
+        attribute.set_parent(ChangeRecorder(), "table")
+        attribute.set_value(t)
+        for edit in (edit_row, insert_row, append_rows):
+            edit(t)
+            rows_ms, rows_bytes = publish(attribute, t)
+            whole_ms, whole_bytes = publish(
+                attribute, Table.from_columns(
+                    meta, [t.point.copy(), t.x.copy(), t.y.copy()]))
+            # carry on editing the table as the value
+            attribute.set_value(t)
+            print("%8d %8s %10.2f %10d %12.2f %12d" % (
+                num_rows, edit.__name__.split("_")[0], rows_ms, rows_bytes,
+                whole_ms, whole_bytes))
+
+
+if __name__ == "__main__":
+    main()
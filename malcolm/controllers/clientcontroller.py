@@ -3,6 +3,7 @@ from collections import OrderedDict
 
 from malcolm.core import Controller,  Post, Subscribe, Return, Method, takes, \
     Serializable
+from malcolm.core.cache import is_row_change
 
 
 @takes()
@@ -20,6 +21,8 @@ class ClientController(Controller):
         """
         super(ClientController, self).__init__(block=block, process=process,
                                                block_name=block_name)
+        # seq of the last change applied to the block, to resume from
+        self._seq = None
         request = Subscribe(
             None, self, [self.process.name, "remoteBlocks", "value"])
         request.set_id(self.REMOTE_BLOCKS_ID)
@@ -38,9 +41,13 @@ class ClientController(Controller):
                     if change[0] == []:
                         # update root
                         self._regenerate_block(change[1])
+                    elif is_row_change(change):
+                        # rows of a table attribute
+                        self._splice_rows(change)
                     else:
                         # just pass it to the block to handle
                         self.block.update(change)
+                self._seq = response.seq
 
     def _regenerate_block(self, d):
         children = OrderedDict()
@@ -55,11 +62,24 @@ class ClientController(Controller):
                     functools.partial(self.call_server_method, k))
         self.block.replace_children(children)
 
+    def _splice_rows(self, change):
+        path, _, start, stop, columns = change
+        assert path[1:] == ["value"], \
+            "Expected rows of an attribute value, got %s" % (path,)
+        attribute = self.block.attributes[path[0]]
+        table = attribute.value
+        table.splice(start, stop, columns)
+        # publishes just the spliced rows to our own subscribers
+        attribute.set_value(table)
+
     def _subscribe_to_block(self, block_name):
         self.client_comms = self.process.get_client_comms(block_name)
         assert self.client_comms, \
             "Process doesn't know about block %s" % block_name
-        request = Subscribe(None, self, [block_name], delta=True)
+        # Only ask for rows if the server understands them, otherwise rows is
+        # left at its default and isn't sent
+        request = Subscribe(None, self, [block_name], delta=True,
+                            seq=self._seq, rows=self.client_comms.rows)
         request.set_id(self.BLOCK_ID)
         self.client_comms.q.put(request)
 
@@ -1,5 +1,3 @@
-import time
-
 from malcolm.core import Attribute, Controller, takes, Method, REQUIRED
 from malcolm.vmetas import PointGeneratorMeta, StringMeta, NumberMeta
 from malcolm.statemachines import RunnableDeviceStateMachine
@@ -24,7 +22,8 @@ class ScanPointTickerController(Controller):
 
     @takes("generator", PointGeneratorMeta(
                         description="Generator instance"), REQUIRED,
-           "axis_name", StringMeta( description="Specifier for axis"), REQUIRED,
+           "axis_name", StringMeta(
+                        description="Specifier for axis"), REQUIRED,
            "exposure", NumberMeta(
                        description="Detector exposure time"), REQUIRED)
     def configure(self, params):
@@ -46,13 +45,15 @@ class ScanPointTickerController(Controller):
     @Method.wrap_method
     def run(self):
         """
-        Start the ticker process
+        Start the ticker process, setting value to each point in turn.
+        Called directly it sleeps for the exposure time after each point
 
         Yields:
-            Point: Scan points from PointGenerator
+            float: Exposure time to wait before the next point, without
+            holding the block lock
         """
         axis_name = self.axis_name.value
         for point in self.generator.value.iterator():
             self.value.set_value(point.positions[axis_name])
             self.block.notify_subscribers()
-            time.sleep(self.exposure.value)
+            yield self.exposure.value
@@ -0,0 +1,310 @@
+import asyncio
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError
+from multiprocessing import cpu_count
+import sys
+import threading
+
+from malcolm.compat import queue
+from malcolm.core.lanequeue import LaneQueue
+from malcolm.core.loggable import Loggable
+from malcolm.core.syncfactory import QueueLoop
+
+
+class AsyncioQueue(object):
+    """Queue that can be put to from any thread, and serviced either by a
+    QueueLoop on the event loop or by a blocking get() from another thread"""
+
+    def __init__(self, sync_factory):
+        """
+        Args:
+            sync_factory (AsyncioSyncFactory): The factory that made it
+        """
+        self.sync_factory = sync_factory
+        self.loop = sync_factory.loop
+        if sys.version_info < (3, 10):
+            self._queue = asyncio.Queue(loop=self.loop)
+        else:
+            # Binds to the loop the first time it is awaited
+            self._queue = asyncio.Queue()
+
+    def put(self, item):
+        """Put an item on the queue
+
+        Args:
+            item: The item to put
+        """
+        if self.sync_factory.in_loop():
+            self._queue.put_nowait(item)
+        else:
+            self.loop.call_soon_threadsafe(self._queue.put_nowait, item)
+
+    def get(self, block=True, timeout=None):
+        """Block the calling thread until there is an item on the queue. Must
+        not be called from the event loop, as nothing can be put while it is
+        blocked
+
+        Args:
+            block (bool): If False then don't wait, raise queue.Empty if there
+                is nothing ready
+            timeout (float): Maximum time in seconds to wait, or None forever
+
+        Returns:
+            The item that was put first
+        """
+        if not block:
+            return self.get_nowait()
+        assert not self.sync_factory.in_loop(), \
+            "Can't block the event loop waiting for a queue"
+        future = asyncio.run_coroutine_threadsafe(
+            asyncio.wait_for(self._queue.get(), timeout), self.loop)
+        try:
+            return future.result()
+        except (asyncio.TimeoutError, TimeoutError):
+            raise queue.Empty()
+
+    def get_nowait(self):
+        """Return an item if one is ready, otherwise raise queue.Empty. From
+        another thread the item is taken on the event loop, so anything that
+        thread has put is there to be taken"""
+        if self.sync_factory.in_loop() or not self.loop.is_running():
+            return self._get_nowait()
+        future = Future()
+
+        def take():
+            try:
+                future.set_result(self._get_nowait())
+            except queue.Empty as e:
+                future.set_exception(e)
+
+        self.loop.call_soon_threadsafe(take)
+        return future.result()
+
+    def _get_nowait(self):
+        try:
+            return self._queue.get_nowait()
+        except asyncio.QueueEmpty:
+            raise queue.Empty()
+
+    def wait_get(self, timeout, then=None):
+        """Return a future that waits on the event loop for an item. Must be
+        called from the event loop
+
+        Args:
+            timeout (float): Maximum time in seconds to wait, or None forever
+            then (callable): If given, the future's result is then(item)
+                rather than item
+
+        Returns:
+            asyncio.Future: Done when an item is taken or timeout expires
+        """
+        waiter = asyncio.ensure_future(
+            asyncio.wait_for(self._queue.get(), timeout))
+        if then is None:
+            return waiter
+        future = self.loop.create_future()
+
+        def chain(waiter):
+            if waiter.cancelled():
+                future.cancel()
+                return
+            try:
+                future.set_result(then(waiter.result()))
+            except Exception as e:
+                future.set_exception(e)
+
+        waiter.add_done_callback(chain)
+        return future
+
+    def qsize(self):
+        return self._queue.qsize()
+
+
+class AsyncioSpawned(object):
+    """The result of AsyncioSyncFactory.spawn()"""
+
+    def __init__(self, future, sync_factory):
+        """
+        Args:
+            future (concurrent.futures.Future): Done when the function is
+            sync_factory (AsyncioSyncFactory): The factory that spawned it
+        """
+        self._future = future
+        self._sync_factory = sync_factory
+
+    def wait(self, timeout=None):
+        """Wait for the spawned function to finish. Must not be called from
+        the event loop
+
+        Args:
+            timeout (float): Maximum time in seconds to wait, or None forever
+        """
+        assert not self._sync_factory.in_loop(), \
+            "Can't block the event loop waiting for a spawned function"
+        try:
+            self._future.exception(timeout)
+        except TimeoutError:
+            pass
+
+    def ready(self):
+        return self._future.done()
+
+    def get(self, timeout=None):
+        """Wait for the spawned function to finish and return its result"""
+        return self._future.result(timeout)
+
+
+class _QueueLoopRunner(object):
+    """Runs a QueueLoop as callbacks on the event loop, taking items without
+    waiting while there are any, and yielding to other callbacks every
+    max_batch items"""
+
+    max_batch = 100
+
+    def __init__(self, queue_loop, future, loop):
+        """
+        Args:
+            queue_loop (QueueLoop): The loop to run
+            future (concurrent.futures.Future): Set when the loop finishes
+            loop (asyncio.AbstractEventLoop): The event loop to run it on
+        """
+        self.queue_loop = queue_loop
+        self.q = queue_loop.q
+        self.loop = loop
+        self.future = future
+
+    def run(self):
+        try:
+            for _ in range(self.max_batch):
+                timeout = self.queue_loop.next_timeout()
+                try:
+                    item = self.q.get_nowait()
+                except queue.Empty:
+                    waiter = self.q.wait_get(timeout)
+                    waiter.add_done_callback(self.on_wait_done)
+                    return
+                if not self.queue_loop.handle(item):
+                    self.future.set_result(None)
+                    return
+            # Let other callbacks have a go
+            self.loop.call_soon(self.run)
+        except Exception as e:
+            self.future.set_exception(e)
+
+    def on_wait_done(self, waiter):
+        try:
+            item = waiter.result()
+        except asyncio.TimeoutError:
+            # A timer is due
+            pass
+        except Exception as e:
+            self.future.set_exception(e)
+            return
+        else:
+            try:
+                if not self.queue_loop.handle(item):
+                    self.future.set_result(None)
+                    return
+            except Exception as e:
+                self.future.set_exception(e)
+                return
+        self.run()
+
+
+class AsyncioSyncFactory(Loggable):
+    """Create primitives that work on an asyncio event loop
+
+    A QueueLoop that is spawned runs on the event loop, as does a coroutine
+    function. Any other function is run on a pool of threads, as it may
+    block. This means a Process, ServerComms and ClientComms all run on one
+    thread, along with tornado's IOLoop if it uses the same event loop. The
+    event loop must be run by the caller, for instance by the IOLoop.start
+    that WSServerComms spawns.
+    """
+
+    def __init__(self, name, loop=None, pool_size=None):
+        """
+        Args:
+            name(str): Logger name e.g. "Sync"
+            loop(asyncio.AbstractEventLoop): The event loop to use, default
+                is the current event loop
+            pool_size(int): Number of threads for blocking functions, default
+                is the number of CPUs
+        """
+        self.set_logger_name(name)
+        if loop is None:
+            loop = asyncio.get_event_loop()
+        self.loop = loop
+        if pool_size is None:
+            pool_size = cpu_count()
+        self.pool_size = pool_size
+        self.executor = ThreadPoolExecutor(pool_size)
+        # Number of spawned functions that are running or waiting for a thread
+        self.busy = 0
+        self._busy_lock = threading.Lock()
+        # Ident of the thread running the loop, known once it has started
+        self._loop_thread = None
+        self.loop.call_soon_threadsafe(self._set_loop_thread)
+
+    def _set_loop_thread(self):
+        self._loop_thread = threading.current_thread().ident
+
+    def in_loop(self):
+        """Return True if called from the thread running the event loop"""
+        return threading.current_thread().ident == self._loop_thread
+
+    def spawn(self, function, *args, **kwargs):
+        """Runs the function on the event loop if it is a QueueLoop or a
+        coroutine function, otherwise in a worker thread
+
+        Args:
+            function: Function to run
+            args: Positional arguments to run the function with
+            kwargs: Keyword arguments to run the function with
+
+        Returns:
+            AsyncioSpawned: Something you can call wait(timeout) on to see
+            when it's finished executing
+        """
+        if isinstance(function, QueueLoop):
+            assert isinstance(function.q, (AsyncioQueue, LaneQueue)), \
+                "Can only run a QueueLoop on a queue from this factory"
+            future = Future()
+            runner = _QueueLoopRunner(function, future, self.loop)
+            self.loop.call_soon_threadsafe(runner.run)
+        elif asyncio.iscoroutinefunction(function):
+            future = asyncio.run_coroutine_threadsafe(
+                function(*args, **kwargs), self.loop)
+        else:
+            with self._busy_lock:
+                self.busy += 1
+            future = self.executor.submit(self._run, function, args, kwargs)
+        return AsyncioSpawned(future, self)
+
+    def _run(self, function, args, kwargs):
+        try:
+            return function(*args, **kwargs)
+        except Exception:
+            self.log_exception("Exception running %s", function)
+            raise
+        finally:
+            with self._busy_lock:
+                self.busy -= 1
+
+    def create_queue(self):
+        """Creates a new AsyncioQueue object"""
+        return AsyncioQueue(self)
+
+    def create_lane_queue(self, lane_for, lanes):
+        """Creates a new LaneQueue object that can be serviced on the loop
+
+        Args:
+            lane_for (callable): Returns the lane for an item, 0 is highest
+            lanes (int): The number of lanes
+        """
+        return LaneQueue(self.create_queue(), self.create_lock(), lane_for,
+                         lanes)
+
+    def create_lock(self):
+        """Creates a new simple Lock object"""
+        return threading.Lock()
+
@@ -1,11 +1,17 @@
 from malcolm.core.monitorable import Monitorable, NO_VALIDATE
 from malcolm.core.serializable import Serializable
+from malcolm.core.table import Table
 from malcolm.core.vmeta import VMeta
 
 
 @Serializable.register_subclass("epics:nt/NTAttribute:1.0")
 class Attribute(Monitorable):
-    """Represents a value with type information that may be backed elsewhere"""
+    """Represents a value with type information that may be backed elsewhere
+
+    Setting the Table that is already the value, after changing some of its
+    rows, reports just the rows that changed as
+    [["value"], "rows", start, stop, columns] rather than the whole Table.
+    """
 
     endpoints = ["meta", "value"]
 
@@ -30,4 +36,17 @@ class Attribute(Monitorable):
 
     def set_value(self, value, notify=True):
         value = self.meta.validate(value)
+        if isinstance(value, Table):
+            row_changes = value.take_row_changes()
+            if value is self.value and row_changes is not None \
+                    and self._reporting:
+                self._report_row_changes(row_changes, notify)
+                return
         self.set_endpoint(NO_VALIDATE, "value", value, notify)
+
+    def _report_row_changes(self, row_changes, notify):
+        """Report the rows of the value that changed, in order"""
+        last = len(row_changes) - 1
+        for i, (start, stop, columns) in enumerate(row_changes):
+            self.on_changed([["value"], "rows", start, stop, columns],
+                            notify and i == last)
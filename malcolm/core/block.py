@@ -3,9 +3,10 @@ from collections import OrderedDict
 from malcolm.core.monitorable import Monitorable
 from malcolm.core.serializable import Serializable
 from malcolm.core.request import Put, Post
-from malcolm.core.response import Return
+from malcolm.core.response import Return, Error
 from malcolm.core.attribute import Attribute
-from malcolm.core.method import Method
+from malcolm.core.method import Method, SteppedCall
+from malcolm.core.tracer import tracer
 
 
 class DummyLock(object):
@@ -71,6 +72,7 @@ class Block(Monitorable):
             % (child_name, self.name)
         setattr(self, child_name, attribute_or_method)
         d[child_name] = attribute_or_method
+        self._cached_dict = None
         attribute_or_method.set_parent(self, child_name)
 
     def _where_child_stored(self, child):
@@ -108,6 +110,7 @@ class Block(Monitorable):
         for attr_name in self.attributes:
             delattr(self, attr_name)
         self.attributes.clear()
+        self._cached_dict = None
         for name, child in children.items():
             d = self._where_child_stored(child)
             assert d is not None, \
@@ -125,27 +128,82 @@ class Block(Monitorable):
 
         Args:
             request(Request): Request object specifying action
+
+        Returns:
+            SteppedCall: If the request called a generator Method that hasn't
+            finished, the call that should be passed to resume() after
+            call.delay seconds. Otherwise None
         """
         self.log_debug("Received request %s", request)
         assert isinstance(request, Post) or isinstance(request, Put), \
             "Expected Post or Put request, received %s" % request.typeid
+        start = tracer.now()
         with self.lock:
-            if isinstance(request, Post):
-                if len(request.endpoint) != 2:
-                    raise ValueError("POST endpoint requires 2 part endpoint")
-                method_name = request.endpoint[1]
-                response = self.methods[method_name].get_response(request)
-            elif isinstance(request, Put):
-                attr_name = request.endpoint[1]
-                if len(request.endpoint) != 3:
-                    raise ValueError("PUT endpoint requires 3 part endpoint")
-                assert request.endpoint[2] == "value", \
-                    "Can only put to an attribute value"
-                self.attributes[attr_name].put(request.value)
-                self.attributes[attr_name].set_value(request.value)
-                response = Return(request.id_, request.context)
-            self.parent.block_respond(response, request.response_queue)
+            tracer.complete("lock wait", request, start)
+            start = tracer.now()
+            try:
+                return self._handle_locked_request(request)
+            finally:
+                tracer.complete("lock held", request, start)
+
+    def resume(self, call):
+        """Run the next step of a generator Method with the lock held,
+        responding if it has finished
+
+        Args:
+            call (SteppedCall): The call returned by handle_request() or
+                resume()
 
+        Returns:
+            SteppedCall: The call if it hasn't finished, otherwise None
+        """
+        start = tracer.now()
+        with self.lock:
+            tracer.complete("lock wait", call.request, start)
+            start = tracer.now()
+            try:
+                return self._step(call)
+            finally:
+                tracer.complete("lock held", call.request, start)
+
+    def _step(self, call):
+        finished = call.step()
+        if call.progress is not None:
+            self.parent.block_respond(
+                call.progress, call.request.response_queue, self.name)
+        if not finished:
+            return call
+        self.parent.block_respond(
+            call.response, call.request.response_queue, self.name)
+
+    def _handle_locked_request(self, request):
+        if isinstance(request, Post):
+            if len(request.endpoint) != 2:
+                raise ValueError("POST endpoint requires 2 part endpoint")
+            method_name = request.endpoint[1]
+            response = self.methods[method_name].get_response(request)
+            if isinstance(response, SteppedCall):
+                return self._step(response)
+        elif isinstance(request, Put):
+            attr_name = request.endpoint[1]
+            if len(request.endpoint) != 3:
+                raise ValueError("PUT endpoint requires 3 part endpoint")
+            assert request.endpoint[2] == "value", \
+                "Can only put to an attribute value"
+            try:
+                # A value received by comms may only be decoded now
+                value = request.value
+            except Exception as error:
+                self.log_exception(
+                    "Error decoding value of Put %s", request.id_)
+                response = Error(request.id_, request.context,
+                                 "Could not decode Put value: %s" % error)
+            else:
+                self.attributes[attr_name].put(value)
+                self.attributes[attr_name].set_value(value)
+                response = Return(request.id_, request.context)
+        self.parent.block_respond(
+            response, request.response_queue, self.name)
 
     def lock_released(self):
         return LockRelease(self.lock)
@@ -0,0 +1,118 @@
+from collections import deque
+import time
+
+from malcolm.core.loggable import Loggable
+from malcolm.core.method import SteppedCall
+
+
+class BlockExecutor(Loggable):
+    """Services Post and Put requests for a single Block from a bounded queue,
+    using at most max_workers SyncFactory threads at a time
+
+    A Post to a generator Method is handled a step at a time. Between steps
+    the call goes to the back of the queue, or waits on call_later, so it
+    holds neither the Block lock nor a thread while other requests are
+    handled.
+    """
+
+    def __init__(self, name, sync_factory, block, max_queue, max_workers=1,
+                 call_later=None):
+        """
+        Args:
+            name (str): Logger name e.g. "proc.myblock.executor"
+            sync_factory (SyncFactory): Used to spawn workers and make locks
+            block (Block): The block whose handle_request will be called
+            max_queue (int): Maximum number of requests waiting to be handled
+            max_workers (int): Maximum number of requests handled at once
+            call_later (callable): call_later(delay, function, *args) calls
+                function(*args) after delay seconds. Used to resume generator
+                Methods. If None the worker sleeps for the delay instead
+        """
+        self.set_logger_name(name)
+        self.sync_factory = sync_factory
+        self.block = block
+        self.max_queue = max_queue
+        self.max_workers = max_workers
+        self.call_later = call_later
+        self._lock = sync_factory.create_lock()
+        self._requests = deque()
+        self._running = 0  # number of workers servicing self._requests
+        self._workers = []  # spawned results of workers that may be running
+
+    def submit(self, request):
+        """Queue a request to be passed to block.handle_request
+
+        Args:
+            request (Request): The Post or Put to handle
+
+        Returns:
+            bool: False if the queue was full and the request was rejected
+        """
+        with self._lock:
+            if len(self._requests) >= self.max_queue:
+                return False
+            self._queue(request)
+        return True
+
+    def resume(self, call):
+        """Queue the next step of a generator Method to be passed to
+        block.resume. It was accepted already, so is never rejected
+
+        Args:
+            call (SteppedCall): The call to resume
+        """
+        with self._lock:
+            self._queue(call)
+
+    def _queue(self, item):
+        # Must be called with self._lock held
+        self._requests.append(item)
+        if self._running < self.max_workers:
+            self._running += 1
+            # Reap the results of workers that have finished
+            self._workers = [w for w in self._workers if not w.ready()]
+            self._workers.append(self.sync_factory.spawn(self._work))
+
+    def _work(self):
+        """Handle requests until the queue is empty"""
+        while True:
+            with self._lock:
+                if not self._requests:
+                    self._running -= 1
+                    return
+                item = self._requests.popleft()
+            try:
+                if isinstance(item, SteppedCall):
+                    call = self.block.resume(item)
+                else:
+                    call = self.block.handle_request(item)
+            except Exception:
+                self.log_exception("Exception while handling %s", item)
+            else:
+                if isinstance(call, SteppedCall):
+                    self._schedule(call)
+
+    def _schedule(self, call):
+        """Resume a call that hasn't finished after its delay, without
+        holding a worker while it waits"""
+        if not call.delay:
+            # Let anything already queued go first
+            self.resume(call)
+        elif self.call_later is None:
+            time.sleep(call.delay)
+            self.resume(call)
+        else:
+            self.call_later(call.delay, self.resume, call)
+
+    def wait(self, timeout=None):
+        """Wait for any running workers to finish
+
+        Args:
+            timeout (float): Maximum amount of time to wait for each worker.
+                None means forever
+        """
+        with self._lock:
+            workers = self._workers
+            self._workers = []
+        for worker in workers:
+            worker.wait(timeout=timeout)
@@ -1,8 +1,46 @@
 from collections import OrderedDict
 
+import numpy as np
+
+
+def is_row_change(change):
+    """Whether change is [path, "rows", start, stop, columns], saying that
+    rows start:stop of the table at path were replaced by the rows in columns,
+    a dict of column name -> values"""
+    return len(change) == 5 and change[1] == "rows"
+
+
+def splice_rows(value, start, stop, rows):
+    """Return a copy of value with items start:stop replaced by rows
+
+    Args:
+        value (list or numpy.ndarray): A column, which is not modified
+        start (int): The first item to replace
+        stop (int): The item after the last to replace
+        rows (list or numpy.ndarray): The items to put in their place
+
+    Returns:
+        list or numpy.ndarray: The same type as value
+    """
+    if not 0 <= start <= stop <= len(value):
+        raise IndexError("Rows %s:%s out of range for %d rows"
+                         % (start, stop, len(value)))
+    if isinstance(value, np.ndarray):
+        return np.concatenate(
+            (value[:start], np.asarray(rows, value.dtype), value[stop:]))
+    return list(value[:start]) + list(rows) + list(value[stop:])
+
 
 class Cache(OrderedDict):
-    """OrderedDict subclass that supports delta changeset updates"""
+    """OrderedDict subclass that supports delta changeset updates
+
+    The dictionaries below the top level are never modified once they are in
+    the Cache. A delta_update copies each dictionary on the path to the change
+    and swaps the copies in, sharing everything else with the previous state.
+    This means anything returned from walk_path() or snapshot() is a
+    consistent view that later updates will not touch, so it can be
+    serialized by another thread without taking a lock or a deep copy.
+    """
 
     def delta_update(self, delta):
         """Update dictionary from the given delta
@@ -11,27 +49,56 @@ class Cache(OrderedDict):
             delta (list): where delta is [path, update] for an addition or
                 change, and [path] for deletion. path is a tuple of paths within
                 the dictionary to change, and update is the value that it should
-                be updated to
+                be updated to. [path, "rows", start, stop, columns] splices
+                rows into each column of the table at path
         """
-        d = self
-        assert len(delta) in (1, 2), \
+        assert len(delta) in (1, 2) or is_row_change(delta), \
             "Expected [path] for deletion or [path, update] for addition. " \
             "Got %s" % (delta,)
         path = delta[0]
         assert len(path) > 0, \
             "Expected path to be a non-empty list, got %s" % (path,)
-        d = self.walk_path(path[:-1])
+        # Copy each dictionary below the top level on the way down
+        parents = [self]
+        for p in path[:-1]:
+            parents.append(parents[-1][p].copy())
+        d = parents[-1]
         if len(delta) == 1:
             # deletion
             del d[path[-1]]
+        elif len(delta) == 5:
+            # rows of a table, or of a column if subscribed to one
+            _, _, start, stop, columns = delta
+            table = d[path[-1]]
+            if isinstance(columns, dict):
+                table = table.copy()
+                for name, rows in columns.items():
+                    table[name] = splice_rows(table[name], start, stop, rows)
+            else:
+                table = splice_rows(table, start, stop, columns)
+            d[path[-1]] = table
         else:
             # addition or change
-            value = delta[1]
-            d[path[-1]] = value
+            d[path[-1]] = delta[1]
+        # Then link the copies together from the bottom, finishing with the
+        # only modification of an existing dictionary
+        for i in reversed(range(len(path) - 1)):
+            parents[i][path[i]] = parents[i + 1]
 
     def walk_path(self, path):
         """Walk the path, and return the given endpoint"""
+        if not path:
+            return self.snapshot()
         d = self
         for p in path:
             d = d[p]
         return d
+
+    def snapshot(self):
+        """Return the current state, unaffected by any later updates
+
+        Returns:
+            OrderedDict: Shallow copy of the top level, sharing everything
+            below it with the Cache
+        """
+        return OrderedDict(self)
@@ -3,6 +3,7 @@ from collections import OrderedDict
 from malcolm.core.loggable import Loggable
 from malcolm.core.spawnable import Spawnable
 from malcolm.core.response import Update
+from malcolm.core.syncfactory import QueueLoop
 
 
 class ClientComms(Loggable, Spawnable):
@@ -10,6 +11,9 @@ class ClientComms(Loggable, Spawnable):
     a method"""
     # The id that will be use for subscriptions to the blocks the server has
     SERVER_BLOCKS_ID=0
+    # True if the server is known to send changes to rows of tables, so a
+    # Subscribe can ask for them. Older servers reject a Subscribe with rows
+    rows = False
 
     def __init__(self, name, process):
         self.set_logger_name(name)
@@ -17,25 +21,33 @@ class ClientComms(Loggable, Spawnable):
         self.q = self.process.create_queue()
         self._current_id = 1
         self.requests = OrderedDict()
+        # Service self.q, sending requests to server
+        self.send_loop = QueueLoop(self.q, self.handle_request)
         self.add_spawn_function(self.send_loop,
                                 self.make_default_stop_func(self.q))
 
-    def send_loop(self):
-        """Service self.q, sending requests to server"""
-        while True:
-            request = self.q.get()
-            if request is Spawnable.STOP:
-                break
-            try:
-                request.set_id(self._current_id)
-                self._current_id += 1
-
-                # TODO: Move request store into new method?
-                self.requests[request.id_] = request
-                self.send_to_server(request)
-            except Exception:
-                self.log_exception(
-                    "Exception sending request %s", request.to_dict())
+    def handle_request(self, request):
+        """Send a single request from self.q to the server
+
+        Args:
+            request (Request): The request to send
+
+        Returns:
+            bool: False if it was Spawnable.STOP, and send_loop should stop
+        """
+        if request is Spawnable.STOP:
+            return False
+        try:
+            request.set_id(self._current_id)
+            self._current_id += 1
+
+            # TODO: Move request store into new method?
+            self.requests[request.id_] = request
+            self.send_to_server(request)
+        except Exception:
+            self.log_exception(
+                "Exception sending request %s", request.to_dict())
+        return True
 
     def send_to_server(self, request):
         """Abstract method to dispatch request to a server
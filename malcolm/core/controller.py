@@ -60,7 +60,11 @@ class Controller(Loggable):
 
         for name, member in inspect.getmembers(self, inspect.ismethod):
             if hasattr(member, "Method"):
-                member.Method.set_function(member)
+                if hasattr(member, "steps"):
+                    # Step through the generator rather than sleeping
+                    member.Method.set_function(member.steps.__get__(self))
+                else:
+                    member.Method.set_function(member)
                 yield (name, member.Method)
 
     def create_attributes(self):
@@ -116,18 +120,20 @@ class Controller(Loggable):
         if self.stateMachine.is_allowed(initial_state=self.state.value,
                                         target_state=state):
 
-            self.state.set_value(state)
+            # Make all the changes without notifying so that subscribers get
+            # a single update when we are done
+            self.state.set_value(state, notify=False)
 
             if state in self.stateMachine.busy_states:
-                self.busy.set_value(True)
+                self.busy.set_value(True, notify=False)
             else:
-                self.busy.set_value(False)
+                self.busy.set_value(False, notify=False)
 
-            self.status.set_value(message)
+            self.status.set_value(message, notify=False)
 
             for method in self.block.methods.values():
                 writeable = self.methods_writeable[state][method.name]
-                method.set_writeable(writeable)
+                method.set_writeable(writeable, notify=False)
 
             self.block.notify_subscribers()
 
@@ -0,0 +1,98 @@
+from collections import deque
+
+
+class LaneQueue(object):
+    """Queue that sorts items into lanes, getting from the highest priority
+    lane that has anything in it
+
+    An item in a lower lane is still taken before the front of a higher lane
+    if it is older than that item and max_wait items have been taken since it
+    was put, so a busy high priority lane can delay the others by a bounded
+    amount, but never starve them. Items within a lane are taken in the order
+    they were put.
+
+    Each put() also puts a token on an ordinary queue from the SyncFactory,
+    and each get() takes a token before taking an item. This leaves the
+    waiting, and waking up of the thread or event loop servicing the queue,
+    to the SyncFactory.
+    """
+
+    def __init__(self, doorbell, lock, lane_for, lanes, max_wait=100):
+        """
+        Args:
+            doorbell (Queue): Queue from the SyncFactory to put tokens on
+            lock (Lock): Lock from the SyncFactory to protect the lanes
+            lane_for (callable): Called with each item that is put, returning
+                the lane it should go in, 0 being the highest priority
+            lanes (int): Number of lanes
+            max_wait (int): Number of items that can be taken from higher
+                lanes ahead of an older item in a lower lane
+        """
+        self.doorbell = doorbell
+        self.lane_for = lane_for
+        self.max_wait = max_wait
+        self._lock = lock
+        # deque((put_seq, taken_when_put, item)) for each lane
+        self._lanes = [deque() for _ in range(lanes)]
+        self._put_seq = 0
+        self._taken = 0
+
+    def put(self, item):
+        """Put an item in the lane it belongs in
+
+        Args:
+            item: The item to put
+        """
+        lane = self._lanes[self.lane_for(item)]
+        with self._lock:
+            lane.append((self._put_seq, self._taken, item))
+            self._put_seq += 1
+        self.doorbell.put(None)
+
+    def get(self, block=True, timeout=None):
+        """Take the next item, waiting for one if there isn't one yet
+
+        Args:
+            block (bool): If False then don't wait, raise queue.Empty if there
+                is nothing ready
+            timeout (float): Maximum time in seconds to wait, or None forever
+
+        Returns:
+            The next item from the highest priority lane that is not starving
+            a lower one
+        """
+        self.doorbell.get(block, timeout)
+        return self._take()
+
+    def get_nowait(self):
+        """Take the next item if there is one, otherwise raise queue.Empty"""
+        self.doorbell.get_nowait()
+        return self._take()
+
+    def wait_get(self, timeout):
+        """Return an awaitable for the next item. Only supported if the
+        doorbell is an AsyncioQueue"""
+        return self.doorbell.wait_get(timeout, self._take)
+
+    def _take(self, _=None):
+        with self._lock:
+            fronts = [lane for lane in self._lanes if lane]
+            chosen = fronts[0]
+            starved_since = self._taken - self.max_wait
+            for lane in fronts[1:]:
+                put_seq, taken_when_put, _ = lane[0]
+                if taken_when_put <= starved_since and \
+                        put_seq < chosen[0][0]:
+                    chosen = lane
+            self._taken += 1
+            return chosen.popleft()[2]
+
+    def qsize(self):
+        """Return the number of items waiting in all the lanes"""
+        with self._lock:
+            return sum(len(lane) for lane in self._lanes)
+
+    def lane_sizes(self):
+        """Return a list of the number of items waiting in each lane"""
+        with self._lock:
+            return [len(lane) for lane in self._lanes]
@@ -1,54 +1,117 @@
-from malcolm.core.serializable import Serializable
+from collections import OrderedDict
+
+from malcolm.core.serializable import Serializable, serialize_object
 
 
 @Serializable.register_subclass("malcolm:core/Map:1.0")
 class Map(Serializable):
-    # real data stored as attributes
-    # dictionary type view supported
+    """Validated values for some of the elements of a MapMeta, accessible as
+    items or attributes
+
+    Values are validated once by their element's meta when they are set, then
+    kept in a dict, so looking up, adding and removing keys takes constant
+    time. Iteration is in the order of the meta's elements.
+    """
+
+    __slots__ = ("meta", "_values", "_endpoints")
 
     def __init__(self, meta, d=None):
-        self.meta = meta
-        d = {} if d is None else d
+        object.__setattr__(self, "meta", meta)
+        object.__setattr__(self, "_values", {})
+        # Keys in the order of meta.elements, or None if they have changed
+        object.__setattr__(self, "_endpoints", None)
+        if d is None:
+            return
+        if isinstance(d, Map) and d.meta is meta:
+            # Already validated against this meta
+            self._values.update(d._values)
+            return
         for key, value in d.items():
             if key in meta.elements:
                 self[key] = value
             else:
                 raise ValueError("%s is not a valid key for given meta" % key)
 
+    @classmethod
+    def from_validated(cls, meta, values):
+        """Make a Map without validating values again
+
+        Args:
+            meta (MapMeta): The meta the values were validated against
+            values (dict): The validated values, which the Map takes over
+
+        Returns:
+            Map: The new Map
+        """
+        inst = cls.__new__(cls)
+        object.__setattr__(inst, "meta", meta)
+        object.__setattr__(inst, "_values", values)
+        object.__setattr__(inst, "_endpoints", None)
+        return inst
+
     @property
     def endpoints(self):
-        return [e for e in self.meta.elements if hasattr(self, e)]
+        if self._endpoints is None:
+            values = self._values
+            object.__setattr__(self, "_endpoints", [
+                e for e in self.meta.elements if e in values])
+        return self._endpoints
+
+    def to_dict(self, **overrides):
+        d = OrderedDict()
+        d["typeid"] = self.typeid
+        for e in self.endpoints:
+            d[e] = serialize_object(self._values[e])
+        return d
 
     def __repr__(self):
         return self.to_dict().__repr__()
 
+    def __getattr__(self, attr):
+        # Only called if attr is not a slot, method or property
+        if attr in Map.__slots__:
+            raise AttributeError(attr)
+        try:
+            return self._values[attr]
+        except KeyError:
+            raise AttributeError(attr)
+
     def __setattr__(self, attr, val):
-        if hasattr(self, "meta"):
-            self[attr] = val
-        else:
-            object.__setattr__(self, attr, val)
+        self[attr] = val
+
+    def __delattr__(self, attr):
+        try:
+            del self[attr]
+        except KeyError:
+            raise AttributeError(attr)
 
     def __setitem__(self, key, val):
+        values = self._values
+        if key in values and values[key] is val:
+            # Already validated
+            return
         if key not in self.meta.elements:
             raise ValueError("%s is not a valid key for given meta" % key)
         val = self.meta.elements[key].validate(val)
-        object.__setattr__(self, key, val)
+        if key not in values:
+            object.__setattr__(self, "_endpoints", None)
+        values[key] = val
 
     def __getitem__(self, key):
-        if key in self.endpoints:
-            return getattr(self, key)
-        else:
-            raise KeyError
+        return self._values[key]
+
+    def __delitem__(self, key):
+        del self._values[key]
+        object.__setattr__(self, "_endpoints", None)
 
     def __contains__(self, key):
-        return key in self.endpoints
+        return key in self._values
 
     def __len__(self):
-        return len(self.endpoints)
+        return len(self._values)
 
     def __iter__(self):
-        for e in self.endpoints:
-            yield e
+        return iter(self.endpoints)
 
     def update(self, d):
         if not set(d).issubset(self.meta.elements):
@@ -57,22 +120,23 @@ class Map(Serializable):
             self[k] = d[k]
 
     def clear(self):
-        for e in self.meta.elements:
-            if hasattr(self, e):
-                delattr(self, e)
+        self._values.clear()
+        object.__setattr__(self, "_endpoints", None)
 
     def keys(self):
-        return self.endpoints
+        return list(self.endpoints)
 
     def values(self):
-        return [self[e] for e in self.endpoints]
+        values = self._values
+        return [values[e] for e in self.endpoints]
 
     def items(self):
-        return [(e, self[e]) for e in self.endpoints]
+        values = self._values
+        return [(e, values[e]) for e in self.endpoints]
 
     def check_valid(self):
         for e in self.meta.required:
-            if e not in self.endpoints:
+            if e not in self._values:
                 raise KeyError(e)
 
     def __eq__(self, rhs):
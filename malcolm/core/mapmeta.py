@@ -1,6 +1,7 @@
 from collections import OrderedDict
 
 from malcolm.compat import base_string
+from malcolm.core.map import Map
 from malcolm.core.meta import Meta
 from malcolm.core.serializable import Serializable
 from malcolm.core.vmeta import VMeta
@@ -16,12 +17,64 @@ class MapMeta(Meta):
         super(MapMeta, self).__init__(description, tags)
         self.elements = OrderedDict()
         self.required = []
+        # Made by validate() from elements and required when first needed
+        self._validator = None
 
     def set_elements(self, elements, notify=True):
         """Set the elements dict from a ScalarMeta or serialized dict"""
         self.set_endpoint(
             {base_string: VMeta}, "elements", elements, notify)
+        self._validator = None
 
     def set_required(self, required, notify=True):
         """Set the required string list"""
         self.set_endpoint([base_string], "required", required, notify)
+        self._validator = None
+
+    def validate(self, d, defaults=None):
+        """Make a Map of the values in d, cast by the validate() of their
+        element, in a single pass
+
+        Args:
+            d (dict): Values to validate. If it is a Map for this MapMeta then
+                its values have already been validated, and are only checked
+                to make sure the required ones are present
+            defaults (dict): Validated values to use for anything not in d
+
+        Returns:
+            Map: The validated values
+
+        Raises:
+            ValueError: If d has a key that is not an element
+            KeyError: If a required element is missing
+        """
+        if self._validator is None:
+            self._validator = self._make_validator()
+        return self._validator(d, defaults)
+
+    def _make_validator(self):
+        validators = dict((k, v.validate) for k, v in self.elements.items())
+        required = list(self.required)
+
+        def validator(d, defaults):
+            if isinstance(d, Map) and d.meta is self:
+                values = dict(d.items())
+            else:
+                values = {}
+                for k, v in d.items():
+                    try:
+                        validate = validators[k]
+                    except KeyError:
+                        raise ValueError(
+                            "%s is not a valid key for given meta" % k)
+                    values[k] = validate(v)
+            if defaults:
+                for k, v in defaults.items():
+                    if k not in values:
+                        values[k] = v
+            for k in required:
+                if k not in values:
+                    raise KeyError(k)
+            return Map.from_validated(self, values)
+
+        return validator
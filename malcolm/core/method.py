@@ -1,12 +1,15 @@
 from collections import OrderedDict
-from inspect import getdoc
+import functools
+from inspect import getdoc, isgenerator, isgeneratorfunction
+import time
 
 from malcolm.compat import base_string
 from malcolm.core.map import Map
 from malcolm.core.mapmeta import MapMeta
 from malcolm.core.monitorable import NO_VALIDATE
-from malcolm.core.response import Return, Error
-from malcolm.core.serializable import Serializable
+from malcolm.core.response import Return, Error, Delta
+from malcolm.core.serializable import Serializable, serialize_object
+from malcolm.core.tracer import tracer
 from malcolm.core.vmeta import VMeta
 
 OPTIONAL = object()
@@ -44,11 +47,12 @@ class Method(VMeta):
 
     def set_defaults(self, defaults, notify=True):
         """Set the default dict"""
+        validated = OrderedDict()
         for k, v in defaults.items():
             assert isinstance(k, base_string), \
                 "Expected string, got %s" % (k,)
-            defaults[k] = self.takes.elements[k].validate(v)
-        self.set_endpoint(NO_VALIDATE, "defaults", defaults, notify)
+            validated[k] = self.takes.elements[k].validate(v)
+        self.set_endpoint(NO_VALIDATE, "defaults", validated, notify)
 
     def set_returns(self, returns, notify=True):
         """Set the return parameters for the method to validate against"""
@@ -69,22 +73,34 @@ class Method(VMeta):
         """
         Validate function parameters, call function and validate the response
 
+        If the function is a generator it is run to completion here, sleeping
+        for the time given by each yield
+
         Args:
             parameters_dict(dict): Dictionary of parameter names and values
 
         Returns:
             Map: Return values
         """
+        return_val, expected_response = self._start_function(parameters_dict)
+        if isgenerator(return_val):
+            call = SteppedCall(self, None, return_val, expected_response)
+            while not call.step():
+                if call.delay:
+                    time.sleep(call.delay)
+            return_val = call.result
+        return self._validate_returns(return_val)
+
+    def _start_function(self, parameters_dict):
+        """Validate the parameters and call the function
 
+        Returns:
+            tuple: (return value of the function, Map it was given to fill)
+        """
         if not self.writeable:
             raise ValueError("Cannot call a method that is not writeable")
 
-        for arg in self.defaults:
-            if arg not in parameters_dict.keys():
-                parameters_dict[arg] = self.defaults[arg]
-
-        parameters = Map(self.takes, parameters_dict)
-        parameters.check_valid()
+        parameters = self.takes.validate(parameters_dict, self.defaults)
         expected_response = Map(self.returns)
 
         if len(self.takes.elements) > 0:
@@ -98,10 +114,11 @@ class Method(VMeta):
             else:
                 return_val = self.func()
 
-        if len(self.returns.elements) > 0:
-            return_val = Map(self.returns, return_val)
-            return_val.check_valid()
+        return return_val, expected_response
 
+    def _validate_returns(self, return_val):
+        if len(self.returns.elements) > 0:
+            return_val = self.returns.validate(return_val)
         return return_val
 
     def get_response(self, request):
@@ -110,6 +127,10 @@ class Method(VMeta):
 
         Args:
             request (Request): The request to handle
+
+        Returns:
+            Response or SteppedCall: The Return or Error to respond with, or
+            a SteppedCall that will make one if the function is a generator
         """
         self.log_debug("Received request %s", request)
         try:
@@ -121,15 +142,34 @@ class Method(VMeta):
                 parameters = {}
             if "typeid" in parameters:
                 parameters.pop("typeid")
-            result = self.call_function(parameters)
+            start = tracer.now()
+            try:
+                if isgeneratorfunction(self.func):
+                    generator, expected_response = self._start_function(
+                        parameters)
+                    return SteppedCall(self, request, generator,
+                                       expected_response)
+                result = self.call_function(parameters)
+            finally:
+                tracer.complete("call_function", request, start)
         except Exception as error:
-            err_message = str(error)
-            self.log_exception("Error raised %s", err_message)
-            message = "Method %s raised an error: %s" % (self.name, err_message)
-            return Error(request.id_, request.context, message)
+            return self._error_response(request, error)
         else:
-            self.log_debug("Returning result %s", result)
-            return Return(request.id_, request.context, value=result)
+            return self._return_response(request, result)
+
+    def _error_response(self, request, error):
+        err_message = str(error)
+        self.log_exception("Error raised %s", err_message)
+        message = "Method %s raised an error: %s" % (self.name, err_message)
+        return Error(request.id_, request.context, message)
+
+    def _delta_response(self, request, changes):
+        self.log_debug("Streaming changes %s", changes)
+        return Delta(request.id_, request.context, changes=changes)
+
+    def _return_response(self, request, result):
+        self.log_debug("Returning result %s", result)
+        return Return(request.id_, request.context, value=result)
 
     @classmethod
     def wrap_method(cls, func):
@@ -137,6 +177,11 @@ class Method(VMeta):
         Checks if a function already has a Method implementation of itself and
         if it does not, creates one.
 
+        A generator function is replaced by one that runs it to completion,
+        sleeping for the time given by each yield, so it can still be called
+        directly. The generator function is kept as its steps attribute, for
+        the Method to step through.
+
         Args:
             func: Function to wrap
 
@@ -147,11 +192,151 @@ class Method(VMeta):
         if not hasattr(func, "Method"):
             description = getdoc(func) or ""
             method = cls(description)
+            if isgeneratorfunction(func):
+                func = _run_to_completion(func)
             func.Method = method
 
         return func
 
 
+def _generator_result(stop):
+    """Get the value a generator returned from the StopIteration it raised
+
+    Args:
+        stop (StopIteration): Raised when the generator finished
+
+    Returns:
+        The returned value, or None as generators can only return a value in
+        Python 3
+    """
+    return getattr(stop, "value", None)
+
+
+def _run_to_completion(steps):
+    """Make a function that calls the generator function steps, then runs
+    the generator to completion, sleeping for the time given by each yield
+
+    Returns:
+        function: The function, with steps as an attribute
+    """
+    @functools.wraps(steps)
+    def run_to_completion(*args, **kwargs):
+        generator = steps(*args, **kwargs)
+        while True:
+            try:
+                delay = next(generator)
+            except StopIteration as stop:
+                return _generator_result(stop)
+            # A partial result gives no delay
+            if delay and not isinstance(delay, (dict, Map)):
+                time.sleep(delay)
+
+    run_to_completion.steps = steps
+    return run_to_completion
+
+
+class SteppedCall(object):
+    """A call of a Method whose function is a generator, run one step at a
+    time so that the Block lock and pool thread can be given up in between
+
+    Each step runs the generator to its next yield, which gives the time in
+    seconds to wait before the next step, or None to run it as soon as other
+    requests to the Block have had a turn. It can also yield a partial result
+    as a Map or dict, usually the Map of return values it was given, and the
+    next step is run as if it yielded None. If the request is a streaming
+    Post, the caller is sent a Delta with the top level keys that have
+    changed since the last partial result. Values are compared by equality,
+    so arrays should be replaced rather than changed in place. When the
+    generator finishes its result is what it returned, or the Map of return
+    values it was given.
+    """
+
+    def __init__(self, method, request, generator, expected_response):
+        """
+        Args:
+            method (Method): The Method being called
+            request (Post): The request to respond to, or None if called
+                directly
+            generator (generator): The generator the function returned
+            expected_response (Map): The return values the function was given
+        """
+        self.method = method
+        self.request = request
+        self.generator = generator
+        self.expected_response = expected_response
+        # Seconds to wait before the next step
+        self.delay = None
+        # Value the generator finished with
+        self.result = None
+        # Return or Error for request, once finished
+        self.response = None
+        # Delta to send for the partial result of the last step, if streaming
+        self.progress = None
+        # Serialized partial result last sent
+        self._sent = None
+
+    def step(self):
+        """Run the generator to its next yield
+
+        Returns:
+            bool: True if it has finished, when result and, if there is a
+            request, response will be filled in
+        """
+        self.progress = None
+        try:
+            self.delay = next(self.generator)
+            if isinstance(self.delay, (dict, Map)):
+                partial = self.delay
+                self.delay = None
+                if self.request is not None and self.request.stream:
+                    self._stream(serialize_object(partial))
+        except StopIteration as stop:
+            result = _generator_result(stop)
+            if result is None and len(self.method.returns.elements) > 0:
+                result = self.expected_response
+            self.result = result
+            if self.request is not None:
+                self._respond(result)
+            return True
+        except Exception as error:
+            if self.request is None:
+                raise
+            self.response = self.method._error_response(self.request, error)
+            return True
+        return False
+
+    def _stream(self, partial):
+        if self._sent is None:
+            changes = [[[], partial]]
+        else:
+            changes = []
+            for k, v in partial.items():
+                if k not in self._sent or not _equal(self._sent[k], v):
+                    changes.append([[k], v])
+            for k in self._sent:
+                if k not in partial:
+                    changes.append([[k]])
+        self._sent = partial
+        if changes:
+            self.progress = self.method._delta_response(self.request, changes)
+
+    def _respond(self, result):
+        try:
+            result = self.method._validate_returns(result)
+        except Exception as error:
+            self.response = self.method._error_response(self.request, error)
+        else:
+            self.response = self.method._return_response(self.request, result)
+
+
+def _equal(a, b):
+    try:
+        return bool(a == b)
+    except ValueError:
+        # Arrays with more than one element are ambiguous
+        return False
+
+
 def _prepare_map_meta(args, allow_defaults):
     # prepare some data structures that will be used for the takes MapMeta
     defaults = OrderedDict()
@@ -195,7 +380,7 @@ def takes(*args):
     def decorator(func):
 
         if not hasattr(func, "Method"):
-            Method.wrap_method(func)
+            func = Method.wrap_method(func)
 
         takes_meta, defaults = _prepare_map_meta(args, allow_defaults=True)
 
@@ -223,7 +408,7 @@ def returns(*args):
     def decorator(func):
 
         if not hasattr(func, "Method"):
-            Method.wrap_method(func)
+            func = Method.wrap_method(func)
 
         returns_meta, _ = _prepare_map_meta(args, allow_defaults=False)
 
@@ -246,7 +431,7 @@ def only_in(*states):
     def decorator(func):
 
         if not hasattr(func, "Method"):
-            Method.wrap_method(func)
+            func = Method.wrap_method(func)
 
         func.Method.only_in = states
 
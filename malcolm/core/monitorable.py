@@ -1,10 +1,60 @@
+from collections import OrderedDict
+
 from malcolm.core.loggable import Loggable
-from malcolm.core.serializable import Serializable, serialize_object
+from malcolm.core.serializable import Serializable, serialize_object, \
+    _set_endpoints
 
 NO_VALIDATE = object()
 
 
 class Monitorable(Loggable, Serializable):
+    """Serializable that reports changes to its parent
+
+    The result of to_dict() is kept until something changes. Every change is
+    reported through on_changed(), which forgets the dict here and then in
+    each parent on the way up, so a change rebuilds just the dicts on its
+    path and reuses the rest. The dict is shared by every caller, so must not
+    be modified.
+    """
+
+    # Result of to_dict() if nothing has changed since, or None
+    _cached_dict = None
+
+    # False while from_dict() fills in a new instance, as nothing can be
+    # watching it yet, so there is no need to serialize each change
+    _reporting = True
+
+    @classmethod
+    def _make_decoder(cls):
+        """Make the function that from_dict() uses to create an instance of
+        cls from a dict. Changes are not reported while it is filled in"""
+        if not isinstance(cls.endpoints, list):
+            return super(Monitorable, cls)._make_decoder()
+        setters = cls._endpoint_setters()
+
+        def decode(d):
+            inst = cls.__new__(cls)
+            inst._reporting = False
+            inst.__init__()
+            _set_endpoints(inst, d, setters)
+            del inst._reporting
+            return inst
+
+        return decode
+
+    def to_dict(self, **overrides):
+        """
+        Create a dictionary representation of object attributes, reusing the
+        one from last time if nothing has changed
+
+        Returns:
+            dict: Serialised version of self
+        """
+        if overrides:
+            return super(Monitorable, self).to_dict(**overrides)
+        if self._cached_dict is None:
+            self._cached_dict = super(Monitorable, self).to_dict()
+        return self._cached_dict
 
     def set_parent(self, parent, name):
         """Sets the parent for changes to be propagated to"""
@@ -26,6 +76,7 @@ class Monitorable(Loggable, Serializable):
         Args:
             change: [[path], value] pair for changed values
         """
+        self._cached_dict = None
         if not hasattr(self, "parent"):
             return
         path = change[0]
@@ -57,13 +108,19 @@ class Monitorable(Loggable, Serializable):
             ktype, vtype = list(type_.items())[0]
             assert isinstance(value, dict), \
                 "Expected dict, got %s" % (value,)
+            # Cast into a new dict, as value may be shared with a to_dict()
+            cast = OrderedDict()
             for k, v in value.items():
                 assert k == self._cast(k, ktype), \
                     "Changing of key types not supported"
-                value[k] = self._cast(v, vtype)
+                cast[k] = self._cast(v, vtype)
+            value = cast
         elif type_ is not NO_VALIDATE:
             value = self._cast(value, type_)
         setattr(self, name, value)
         if hasattr(value, "set_parent"):
             value.set_parent(self, name)
-        self.on_changed([[name], serialize_object(value)], notify)
+        if self._reporting:
+            self.on_changed([[name], serialize_object(value)], notify)
+        else:
+            self._cached_dict = None
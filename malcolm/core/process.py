@@ -1,68 +1,756 @@
-from collections import OrderedDict, namedtuple
+from collections import OrderedDict, deque
+import heapq
+import time
+import uuid
 
 from malcolm.core.loggable import Loggable
-from malcolm.core.request import Request, Post, Put, Subscribe, Get
+from malcolm.core.request import Request, Post, Put, Subscribe, Unsubscribe, \
+    Get
 from malcolm.core.response import Return, Update, Delta
-from malcolm.core.cache import Cache
+from malcolm.core.cache import Cache, is_row_change
+from malcolm.core.subscriptiontrie import SubscriptionTrie
+from malcolm.core.syncfactory import QueueLoop
 from malcolm.core.block import Block
+from malcolm.core.blockexecutor import BlockExecutor
+from malcolm.core.processstats import ProcessStats, LATENCY_COLUMNS, \
+    LATENCY_HEADINGS
 from malcolm.core.attribute import Attribute
-from malcolm.vmetas import StringArrayMeta
+from malcolm.core.table import Table
+from malcolm.core.tracer import tracer
+from malcolm.vmetas import StringArrayMeta, NumberMeta, NumberArrayMeta, \
+    TableMeta
 
 
 # Sentinel object that when received stops the recv_loop
 PROCESS_STOP = object()
 
+# Most released messages of each type kept for reuse
+FREE_LIST_SIZE = 1000
+
+
+class _InternalMessage(object):
+    """Base for the messages a Process sends itself. Like the namedtuples
+    they replace they have no instance dict and compare equal by value"""
+
+    __slots__ = ()
+
+    def __eq__(self, other):
+        return type(self) is type(other) and all(
+            getattr(self, f) == getattr(other, f) for f in self.__slots__)
+
+    def __ne__(self, other):
+        return not self == other
+
+    __hash__ = None
+
+    def __repr__(self):
+        return "%s(%s)" % (type(self).__name__, ", ".join(
+            "%s=%r" % (f, getattr(self, f)) for f in self.__slots__))
+
+
+class _ReusableMessage(_InternalMessage):
+    """Internal message sent for every change, which the handler releases so
+    that notifying subscribers doesn't allocate a new one each time. Each
+    subclass needs its own _free list"""
+
+    __slots__ = ()
+
+    @classmethod
+    def reuse(cls, *args):
+        """Take a released message from the free list and initialise it with
+        args, or make a new one if there are none"""
+        try:
+            message = cls._free.pop()
+        except IndexError:
+            return cls(*args)
+        message.__init__(*args)
+        return message
+
+    def release(self):
+        """Give the message back to the free list, dropping what it refers
+        to. It must not be used after this"""
+        for f in self.__slots__:
+            setattr(self, f, None)
+        if len(self._free) < FREE_LIST_SIZE:
+            self._free.append(self)
+
+
 # Internal update messages
-BlockNotify = namedtuple("BlockNotify", "name")
-BlockChanged = namedtuple("BlockChanged", "change")
-BlockRespond = namedtuple("BlockRespond", "response, response_queue")
-BlockAdd = namedtuple("BlockAdd", "block")
-BlockList = namedtuple("BlockList", "client_comms, blocks")
+class BlockChanges(_ReusableMessage):
+    __slots__ = ("name", "changes")
+    _free = []
+
+    def __init__(self, name, changes):
+        self.name = name
+        self.changes = changes
+
+
+class BlockRespond(_ReusableMessage):
+    __slots__ = ("response", "response_queue", "block_name")
+    _free = []
+
+    def __init__(self, response, response_queue, block_name=None):
+        self.response = response
+        self.response_queue = response_queue
+        self.block_name = block_name
+
+
+class BlockAdd(_InternalMessage):
+    __slots__ = ("block",)
+
+    def __init__(self, block):
+        self.block = block
+
+
+class BlockList(_InternalMessage):
+    __slots__ = ("client_comms", "blocks")
+
+    def __init__(self, client_comms, blocks):
+        self.client_comms = client_comms
+        self.blocks = blocks
+
+
+class UnsubscribeAll(_InternalMessage):
+    __slots__ = ("response_queue", "context")
+
+    def __init__(self, response_queue, context):
+        self.response_queue = response_queue
+        self.context = context
+
+
+class CallLater(_InternalMessage):
+    __slots__ = ("due", "function", "args")
+
+    def __init__(self, due, function, args):
+        self.due = due
+        self.function = function
+        self.args = args
+
+
+# Lanes of a Process queue, highest priority first
+CONTROL_LANE, REQUEST_LANE, CHANGES_LANE = range(3)
+_MESSAGE_LANES = {
+    Post: CONTROL_LANE,
+    Put: CONTROL_LANE,
+    BlockAdd: CONTROL_LANE,
+    BlockList: CONTROL_LANE,
+    CallLater: CONTROL_LANE,
+    # BlockRespond publishes the changes its Block has made before the
+    # response is sent, so it can overtake the BlockChanges for them
+    BlockRespond: CONTROL_LANE,
+    Get: REQUEST_LANE,
+    Subscribe: REQUEST_LANE,
+    Unsubscribe: REQUEST_LANE,
+    UnsubscribeAll: REQUEST_LANE,
+    BlockChanges: CHANGES_LANE,
+}
 
 
-class Process(Loggable):
-    """Hosts a number of Blocks, distributing requests between them"""
+def message_lane(message):
+    """Return the lane of a Process queue that a message should go in.
+    Anything unknown, including PROCESS_STOP, goes in the lowest priority lane
+    so it is handled after everything queued before it"""
+    return _MESSAGE_LANES.get(type(message), CHANGES_LANE)
 
-    def __init__(self, name, sync_factory):
+
+class _Conflation(object):
+    """Changes held back from a Subscribe with a min_period"""
+
+    __slots__ = ("last_sent", "changes")
+
+    def __init__(self, last_sent):
+        self.last_sent = last_sent  # time the last response was sent
+        self.changes = OrderedDict()  # path tuple -> change since last_sent
+
+
+class ProcessShard(Loggable):
+    """Owns the cached state, subscriptions and pending changes for a subset
+    of the Blocks in a Process, servicing requests for them on its own queue"""
+
+    def __init__(self, name, sync_factory, process=None, history_depth=100):
+        """
+        Args:
+            name (str): Logger name
+            sync_factory (SyncFactory): Used to make queues and locks
+            process (Process): The Process this is a shard of, or None if this
+                is the Process
+            history_depth (int): Number of BlockChanges to keep per Block so
+                that subscriptions can be resumed
+        """
         self.set_logger_name(name)
         self.name = name
         self.sync_factory = sync_factory
-        self.q = self.create_queue()
-        self._blocks = OrderedDict()  # block name -> block
+        self.process = self if process is None else process
+        self.history_depth = history_depth
+        if process is None:
+            # Part of every seq, so one from before a restart isn't mistaken
+            # for one given since
+            self.epoch = uuid.uuid4().hex
+        else:
+            self.epoch = process.epoch
+        self.q = self.sync_factory.create_lane_queue(
+            message_lane, CHANGES_LANE + 1)
         self._block_state_cache = Cache()
+        self._subscriptions = SubscriptionTrie()  # endpoint -> subs
+        # (response_queue, context) -> OrderedDict(id -> sub)
+        self._owned_subscriptions = OrderedDict()
+        # sub with min_period -> _Conflation
+        self._conflations = OrderedDict()
+        # subs with conflated changes waiting to be sent -> None
+        self._conflated_pending = OrderedDict()
+        # block name -> OrderedDict(path tuple -> change) since last notify
+        self._pending_changes = OrderedDict()
+        # block name -> {path tuple -> [keys of its row changes in pending]}
+        self._pending_rows = {}
+        # block name -> deque([changes]) notified but not yet published
+        self._notified = {}
+        # block name -> seq of the last BlockChanges
+        self._block_seqs = {}
+        # block name -> deque((seq, changes)) of the last history_depth seqs
+        self._block_history = {}
+        self._pending_lock = self.create_lock()
+        self._handle_functions = {
+            Get: self._handle_get,
+            Subscribe: self._handle_subscribe,
+            Unsubscribe: self._handle_unsubscribe,
+            UnsubscribeAll: self._handle_unsubscribe_all,
+            BlockChanges: self._handle_block_changes,
+            BlockRespond: self._handle_block_respond,
+            BlockAdd: self._handle_block_add,
+        }
+        # Service self.q, distributing the requests to the right block
+        self.recv_loop = QueueLoop(
+            self.q, self.handle_message, self._service_timers)
+
+    def handle_message(self, request):
+        """Handle a single message from self.q
+
+        Args:
+            request: The Request or internal message to handle
+
+        Returns:
+            bool: False if it was PROCESS_STOP, and recv_loop should stop
+        """
+        self.log_debug("Received request %s", request)
+        if request is PROCESS_STOP:
+            # Got the sentinel, stop immediately
+            return False
+        if tracer.enabled and isinstance(request, Request):
+            tracer.instant("dequeue", request)
+        start = time.time()
+        try:
+            self._handle_functions[type(request)](request)
+        except Exception:
+            self.log_exception("Exception while handling %s", request)
+        self.process.stats.record_handled(type(request), time.time() - start)
+        return True
+
+    def _service_timers(self):
+        """Do any periodic work that is due
+
+        Returns:
+            float: Time in seconds until the next is due, or None if there is
+                nothing scheduled
+        """
+        return self._flush_conflated()
+
+    def create_queue(self):
+        """
+        Create a queue using sync_factory object
+
+        Returns:
+            Queue: New queue
+        """
+
+        return self.sync_factory.create_queue()
+
+    def create_lock(self):
+        """
+        Create a lock using sync_factory object
+
+        Returns:
+            Lock: New lock
+        """
+        return self.sync_factory.create_lock()
+
+    def record_change(self, change):
+        """Add a change to the pending changes for its block, collapsing
+        repeated writes to the same path
+
+        Args:
+            change (list): [path, value] for an addition or change, [path]
+                for a deletion, or [path, "rows", start, stop, columns] for
+                rows of a table. path[0] is the block name
+        """
+        with self._pending_lock:
+            block_name = change[0][0]
+            pending = self._pending_changes.setdefault(
+                block_name, OrderedDict())
+            path = tuple(change[0])
+            if is_row_change(change):
+                # Each applies to the rows left by the last, so they are all
+                # kept in order under keys of their own
+                key = path + (object(),)
+                self._pending_rows.setdefault(block_name, {}).setdefault(
+                    path, []).append(key)
+                pending[key] = change
+                return
+            # A repeated path moves to the end so it is applied after anything
+            # written above it in the meantime
+            pending.pop(path, None)
+            rows = self._pending_rows.get(block_name)
+            if rows:
+                # Superseded, and no longer apply to the value before this
+                for key in rows.pop(path, ()):
+                    pending.pop(key)
+            pending[path] = change
+
+    def _pop_pending(self, block_name):
+        """Take the changes made to a block since the last call. Must be
+        called with self._pending_lock held
+
+        Returns:
+            list: The pending changes in the order they should be applied
+        """
+        pending = self._pending_changes.pop(block_name, None)
+        self._pending_rows.pop(block_name, None)
+        if pending:
+            return list(pending.values())
+        else:
+            return []
+
+    def queue_changes(self, block_name):
+        """Take the changes made to a block since the last call, keeping them
+        to be published by the next BlockChanges or BlockRespond for it
+
+        Args:
+            block_name (str): The name of the block that has changed
+
+        Returns:
+            bool: True if there were any changes, so a BlockChanges with
+                changes=None should be queued to publish them
+        """
+        with self._pending_lock:
+            changes = self._pop_pending(block_name)
+            if changes:
+                self._notified.setdefault(block_name, deque()).append(changes)
+        return bool(changes)
+
+    def _take_notified(self, block_name, count=None):
+        """Take the oldest count batches kept by queue_changes(), or all of
+        them if count is None
+
+        Returns:
+            list: [changes] in the order they should be published
+        """
+        with self._pending_lock:
+            notified = self._notified.get(block_name)
+            if not notified:
+                return []
+            if count is None or count >= len(notified):
+                del self._notified[block_name]
+                return list(notified)
+            return [notified.popleft() for _ in range(count)]
+
+    def _handle_block_changes(self, request):
+        """Publish changes to subscribers. If request.changes is None, the
+        oldest batch kept by queue_changes() is published, unless a
+        BlockRespond has published it already"""
+        if request.changes is None:
+            batches = self._take_notified(request.name, 1)
+        else:
+            batches = [request.changes]
+        for changes in batches:
+            self._publish_changes(request.name, changes)
+        request.release()
+
+    def _handle_block_respond(self, request):
+        """Publish the changes the block has made, then push the response to
+        the required queue, so subscribers see them before the requester
+        sees the response"""
+        if request.block_name is not None:
+            self._publish_notified(request.block_name)
+        request.response_queue.put(request.response)
+        request.release()
+
+    def _publish_notified(self, block_name):
+        """Publish all the batches kept by queue_changes() for a block ahead
+        of the BlockChanges queued for them"""
+        for changes in self._take_notified(block_name):
+            self._publish_changes(block_name, changes)
+
+    def _publish_changes(self, block_name, changes):
+        """Update subscribers with changes and applies stored changes to the
+        cached structure"""
+        # update cached dict
+        for delta in changes:
+            self._block_state_cache.delta_update(delta)
+        seq = self._record_history(block_name, changes)
+
+        endpoint_changes = self._filter_changes(changes)
+        whole_changes = self._without_rows(changes)
+        if whole_changes is None:
+            endpoint_wholes = endpoint_changes
+        else:
+            # for subscribers that didn't ask for rows of tables
+            endpoint_wholes = self._filter_changes(whole_changes)
+        endpoints = list(endpoint_wholes)
+        endpoints += [e for e in endpoint_changes if e not in endpoint_wholes]
+
+        # Every subscriber to an endpoint with the same delta mode gets the
+        # same payload and encoding_key, and they are sent one after the
+        # other, so that comms can serialize it once for all of them
+        for endpoint in endpoints:
+            subscriptions = (endpoint_wholes.get(endpoint) or
+                             endpoint_changes[endpoint])[0]
+            # id(changes) -> (changes, [subscriptions])
+            deltas = OrderedDict()
+            updates = []
+            for subscription in subscriptions:
+                if subscription.rows:
+                    found = endpoint_changes.get(endpoint)
+                else:
+                    found = endpoint_wholes.get(endpoint)
+                if found is None:
+                    continue
+                changes = found[1]
+                if subscription.min_period:
+                    self._conflate(subscription, changes)
+                elif subscription.delta:
+                    deltas.setdefault(
+                        id(changes), (changes, []))[1].append(subscription)
+                else:
+                    updates.append(subscription)
+            fanout = len(updates)
+            for changes, subscribers in deltas.values():
+                encoding_key = object()
+                fanout += len(subscribers)
+                for subscription in subscribers:
+                    # respond with the filtered changes
+                    response = Delta(subscription.id_, subscription.context,
+                                     changes, encoding_key, seq)
+                    self.log_debug("Responding to subscription %s", response)
+                    subscription.response_queue.put(response)
+            if updates:
+                # respond with the structure of everything
+                # below the endpoint
+                d = self._block_state_cache.walk_path(endpoint)
+                encoding_key = object()
+            for subscription in updates:
+                response = Update(subscription.id_, subscription.context,
+                                  d, encoding_key, seq)
+                self.log_debug("Responding to subscription %s", response)
+                subscription.response_queue.put(response)
+            self.process.stats.record_fanout(fanout)
+
+    def _filter_changes(self, changes):
+        """Find what has changed that is relevant to each subscribed endpoint,
+        with the matching part of the path stripped off
+
+        Returns:
+            OrderedDict: endpoint -> (subscriptions, [filtered_change])
+        """
+        endpoint_changes = OrderedDict()
+        for change in changes:
+            for endpoint, subscriptions, filtered_change in \
+                    self._subscriptions.filter_change(change):
+                endpoint_changes.setdefault(
+                    endpoint, (subscriptions, []))[1].append(filtered_change)
+        return endpoint_changes
+
+    def _without_rows(self, changes):
+        """Replace each change to rows of a table with the value of the table
+        now that changes have been applied to the cache
+
+        Returns:
+            list: The changes with no rows in, or None if there were none
+        """
+        if not any(is_row_change(change) for change in changes):
+            return None
+        whole = []
+        for change in changes:
+            if is_row_change(change):
+                path = change[0]
+                change = [path, self._block_state_cache.walk_path(path)]
+            whole.append(change)
+        return whole
+
+    def _record_history(self, block_name, changes):
+        """Give the next seq for a block to a set of changes and store them
+
+        Returns:
+            str: The seq given to changes
+        """
+        seq = self._block_seqs.get(block_name, 0) + 1
+        self._block_seqs[block_name] = seq
+        history = self._block_history.get(block_name)
+        if history is None:
+            history = deque(maxlen=self.history_depth)
+            self._block_history[block_name] = history
+        history.append((seq, changes))
+        return "%s:%d" % (self.epoch, seq)
+
+    def _seq_for(self, endpoint):
+        """Return the seq of the block that endpoint is in, if there is one.
+        It is "epoch:count", where count is the number of BlockChanges"""
+        if endpoint:
+            seq = self._block_seqs.get(endpoint[0])
+            if seq is not None:
+                return "%s:%d" % (self.epoch, seq)
+
+    def _missed_changes(self, request):
+        """Find the changes to request.endpoint since request.seq
+
+        Returns:
+            list: The changes relative to the endpoint, or None if they are no
+                longer in the history, or request.seq was given by another
+                Process or an earlier run of this one
+        """
+        seq = self._block_seqs.get(request.endpoint[0])
+        epoch, _, since = str(request.seq).rpartition(":")
+        if seq is None or epoch != self.epoch or not since.isdigit():
+            return None
+        since = int(since)
+        if since > seq:
+            return None
+        history = self._block_history.get(request.endpoint[0], ())
+        missed = [changes for s, changes in history if s > since]
+        if len(missed) != seq - since:
+            # Some have been evicted
+            return None
+        if not request.rows and any(
+                is_row_change(c) for changes in missed for c in changes):
+            # The values of the tables they applied to are gone
+            return None
+        trie = SubscriptionTrie()
+        trie.add(request.endpoint, request)
+        filtered = []
+        for changes in missed:
+            for change in changes:
+                for _, _, filtered_change in trie.filter_change(change):
+                    filtered.append(filtered_change)
+        return filtered
+
+    def _conflate(self, subscription, changes):
+        """Merge changes into those held back for a subscription, sending
+        them straight away if its min_period has already passed"""
+        conflation = self._conflations[subscription]
+        for change in changes:
+            path = tuple(change[0])
+            if is_row_change(change):
+                # Applies to the rows left by what is already held back, so
+                # is kept after it, below path so a write there supersedes it
+                conflation.changes[path + (object(),)] = change
+                continue
+            # Writes below a changed path are superseded by it
+            for pending in list(conflation.changes):
+                if pending[:len(path)] == path:
+                    conflation.changes.pop(pending)
+            conflation.changes[path] = change
+        self._conflated_pending[subscription] = None
+        now = time.time()
+        if now - conflation.last_sent >= subscription.min_period:
+            self._send_conflated(subscription, now)
+
+    def _send_conflated(self, subscription, now):
+        """Send the merged changes held back for a subscription"""
+        conflation = self._conflations[subscription]
+        self._conflated_pending.pop(subscription)
+        conflation.last_sent = now
+        self.process.stats.record_fanout(1)
+        seq = self._seq_for(subscription.endpoint)
+        if subscription.delta:
+            changes = list(conflation.changes.values())
+            conflation.changes.clear()
+            subscription.respond_with_delta(changes, seq)
+        else:
+            conflation.changes.clear()
+            subscription.respond_with_update(
+                self._block_state_cache.walk_path(subscription.endpoint), seq)
+
+    def _flush_conflated(self):
+        """Send the conflated subscriptions whose min_period has passed
+
+        Returns:
+            float: Time in seconds until the next one is due, or None if there
+                are none waiting
+        """
+        if not self._conflated_pending:
+            return None
+        now = time.time()
+        timeout = None
+        for subscription in list(self._conflated_pending):
+            due = self._conflations[subscription].last_sent + \
+                subscription.min_period - now
+            if due <= 0:
+                self._send_conflated(subscription, now)
+            elif timeout is None or due < timeout:
+                timeout = due
+        return timeout
+
+    def _remove_subscription(self, subscription):
+        """Stop sending changes to a subscription"""
+        self._subscriptions.remove(subscription.endpoint, subscription)
+        self._conflations.pop(subscription, None)
+        self._conflated_pending.pop(subscription, None)
+
+    def _handle_block_add(self, request):
+        """Cache the initial structure of a block"""
+        block = request.block
+        self._block_state_cache[block.name] = block.to_dict()
+        # Anything resuming from before this has to start again
+        self._block_seqs[block.name] = self._block_seqs.get(block.name, 0) + 1
+        self._block_history[block.name] = deque(maxlen=self.history_depth)
+
+    def _handle_subscribe(self, request):
+        """Add a new subscriber and respond with the current
+        sub-structure state"""
+        d = self._block_state_cache.walk_path(request.endpoint)
+        owner = (request.response_queue, request.context)
+        owned = self._owned_subscriptions.setdefault(owner, OrderedDict())
+        # A reused id replaces the old subscription
+        old = owned.pop(request.id_, None)
+        if old is not None:
+            self._remove_subscription(old)
+        owned[request.id_] = request
+        self._subscriptions.add(request.endpoint, request)
+        if request.min_period:
+            self._conflations[request] = _Conflation(time.time())
+        self.process.update_subscription_count()
+        seq = self._seq_for(request.endpoint)
+        if request.delta and request.seq is not None:
+            missed = self._missed_changes(request)
+            if missed is not None:
+                self.log_debug("Resuming subscription with %s", missed)
+                request.respond_with_delta(missed, seq)
+                return
+        self.log_debug("Initial subscription value %s", d)
+        if request.delta:
+            request.respond_with_delta([[[], d]], seq)
+        else:
+            request.respond_with_update(d, seq)
+
+    def _handle_unsubscribe(self, request):
+        """Remove the subscriber with the same id, response_queue and context
+        and respond with a Return to say it has been cancelled"""
+        owner = (request.response_queue, request.context)
+        owned = self._owned_subscriptions.get(owner, {})
+        subscription = owned.pop(request.id_, None)
+        if subscription is None:
+            request.respond_with_error(
+                "No subscription with id %s" % request.id_)
+            return
+        if not owned:
+            self._owned_subscriptions.pop(owner)
+        self._remove_subscription(subscription)
+        self.process.update_subscription_count()
+        request.respond_with_return()
+
+    def _handle_unsubscribe_all(self, request):
+        """Remove all subscribers with the given response_queue and context"""
+        owner = (request.response_queue, request.context)
+        owned = self._owned_subscriptions.pop(owner, {})
+        for subscription in owned.values():
+            self._remove_subscription(subscription)
+        if owned:
+            self.log_debug("Removed %d subscriptions", len(owned))
+            self.process.update_subscription_count()
+
+    def _handle_get(self, request):
+        """Respond with the current sub-structure state, including the
+        changes already notified for its block, so a Get can't overtake
+        them"""
+        if request.endpoint:
+            self._publish_notified(request.endpoint[0])
+        d = self._block_state_cache.walk_path(request.endpoint)
+        response = Return(request.id_, request.context, d)
+        request.response_queue.put(response)
+
+
+class Process(ProcessShard):
+    """Hosts a number of Blocks, distributing requests between them
+
+    By default a Process is a single ProcessShard that services everything
+    from one recv_loop. If shards > 1 then Blocks are hashed onto that many
+    ProcessShards, each with their own recv_loop, and this recv_loop routes
+    the requests for a Block onto the queue of its shard. Everything for a
+    Block goes through this recv_loop first, so ordering is kept per Block.
+    Each recv_loop is a QueueLoop, so SyncFactory runs it outside the pool
+    that Block requests are handled on.
+
+    Messages are put in lanes of the Process queue by message_lane(), so
+    Posts and Puts are handled before Gets and subscription requests, which
+    are handled before BlockChanges. A message in a lower lane is only
+    overtaken by a bounded number of later messages in higher lanes. A
+    response from a Block goes in the highest lane, and publishes the changes
+    that Block has made before it is sent, so it waits for those but not for
+    changes to other Blocks. A Get does the same, so it never answers with a
+    structure older than one its subscribers have been notified of.
+
+    Posts and Puts are queued on a BlockExecutor for their Block, and are
+    rejected with an Error if more than block_queue_depth are waiting.
+
+    Each BlockChanges is given the next seq for its Block, and the last
+    history_depth of them are kept so a delta Subscribe with a seq can be sent
+    just the changes it missed rather than the whole structure. A seq
+    includes an epoch made when the Process is created, so one from another
+    Process or an earlier run is sent the whole structure. Changes to rows of
+    a table are only sent to delta subscribers that ask for rows, the rest
+    are sent the whole table.
+
+    Counts of the messages handled, how long they took and how many responses
+    were sent to subscribers can be published on the process block every
+    stats_period seconds, along with queue depth and SyncFactory usage. They
+    are not published by default: pass a stats_period to turn them on.
+    """
+
+    def __init__(self, name, sync_factory, shards=1, block_queue_depth=100,
+                 history_depth=100, stats_period=0):
+        super(Process, self).__init__(
+            name, sync_factory, history_depth=history_depth)
+        self.block_queue_depth = block_queue_depth
+        self.stats = ProcessStats(self.create_lock())
+        self.stats_period = stats_period
+        self._stats_published = time.time()
+        self._blocks = OrderedDict()  # block name -> block
+        self._executors = OrderedDict()  # block name -> BlockExecutor
         self._recv_spawned = None
         self._other_spawned = []
-        self._subscriptions = OrderedDict()  # block name -> list of subs
-        self._last_changes = OrderedDict()  # block name -> list of changes
         self._client_comms = OrderedDict()  # client comms -> list of blocks
-        self._handle_functions = {
+        self._shards = []
+        self._shard_spawned = []
+        # (response_queue, context) -> {id: shard} when sharded
+        self._subscription_shards = OrderedDict()
+        # heap of (due, seq, function, args) for call_later
+        self._timers = []
+        self._timer_seq = 0
+        if shards > 1:
+            for i in range(shards):
+                self._shards.append(ProcessShard(
+                    "%s.shard%d" % (name, i), sync_factory, self,
+                    history_depth))
+            for typ in (Get, BlockChanges):
+                self._handle_functions[typ] = self._forward_to_shard
+            self._handle_functions.update({
+                Subscribe: self._forward_subscribe,
+                Unsubscribe: self._forward_unsubscribe,
+                UnsubscribeAll: self._forward_unsubscribe_all,
+                BlockRespond: self._forward_block_respond,
+            })
+        self._handle_functions.update({
             Post: self._forward_block_request,
             Put: self._forward_block_request,
-            Get: self._handle_get,
-            Subscribe: self._handle_subscribe,
-            BlockNotify: self._handle_block_notify,
-            BlockChanged: self._handle_block_changed,
-            BlockRespond: self._handle_block_respond,
             BlockAdd: self._handle_block_add,
             BlockList: self._handle_block_list,
-        }
+            CallLater: self._handle_call_later,
+        })
         self.create_process_block()
 
-    def recv_loop(self):
-        """Service self.q, distributing the requests to the right block"""
-        while True:
-            request = self.q.get()
-            self.log_debug("Received request %s", request)
-            if request is PROCESS_STOP:
-                # Got the sentinel, stop immediately
-                break
-            try:
-                self._handle_functions[type(request)](request)
-            except Exception:
-                self.log_exception("Exception while handling %s", request)
-
     def start(self):
         """Start the process going"""
+        for shard in self._shards:
+            self._shard_spawned.append(
+                self.sync_factory.spawn(shard.recv_loop))
         self._recv_spawned = self.sync_factory.spawn(self.recv_loop)
 
     def stop(self, timeout=None):
@@ -76,42 +764,90 @@ class Process(Loggable):
         self.q.put(PROCESS_STOP)
         # Wait for recv_loop to complete first
         self._recv_spawned.wait(timeout=timeout)
+        # Then the shards, which will have everything it routed to them
+        for shard in self._shards:
+            shard.q.put(PROCESS_STOP)
+        for s in self._shard_spawned:
+            s.wait(timeout=timeout)
+        self._shard_spawned = []
+        # Now wait for any requests being handled by blocks
+        for executor in self._executors.values():
+            executor.wait(timeout=timeout)
         # Now wait for anything it spawned to complete
         for s in self._other_spawned:
             s.wait(timeout=timeout)
 
-    def _forward_block_request(self, request):
-        """Lookup target Block and spawn block.handle_request(request)
+    def shard_for(self, block_name):
+        """Find the ProcessShard that owns the state of the given block
 
         Args:
-            request (Request): The message that should be passed to the Block
-        """
-        block_name = request.endpoint[0]
-        block = self._blocks[block_name]
-        self._other_spawned.append(
-            self.sync_factory.spawn(block.handle_request, request))
-
-    def create_queue(self):
-        """
-        Create a queue using sync_factory object
+            block_name (str): The name of the block
 
         Returns:
-            Queue: New queue
+            ProcessShard: The shard, which is this Process if not sharded
         """
+        if self._shards:
+            return self._shards[hash(block_name) % len(self._shards)]
+        else:
+            return self
 
-        return self.sync_factory.create_queue()
+    def _forward_to_shard(self, request):
+        """Put a request onto the queue of the shard that owns its block"""
+        if isinstance(request, BlockChanges):
+            block_name = request.name
+        elif isinstance(request, BlockAdd):
+            block_name = request.block.name
+        else:
+            block_name = request.endpoint[0]
+        self.shard_for(block_name).q.put(request)
 
-    def create_lock(self):
-        """
-        Create a lock using sync_factory object
+    def _forward_subscribe(self, request):
+        """Remember which shard a subscription went to, then forward it"""
+        shard = self.shard_for(request.endpoint[0])
+        owner = (request.response_queue, request.context)
+        self._subscription_shards.setdefault(owner, {})[request.id_] = shard
+        shard.q.put(request)
 
-        Returns:
-            Lock: New lock
+    def _forward_unsubscribe(self, request):
+        """Forward an Unsubscribe to the shard its subscription went to"""
+        owner = (request.response_queue, request.context)
+        shards = self._subscription_shards.get(owner, {})
+        shard = shards.pop(request.id_, None)
+        if shard is None:
+            request.respond_with_error(
+                "No subscription with id %s" % request.id_)
+        else:
+            if not shards:
+                self._subscription_shards.pop(owner)
+            shard.q.put(request)
+
+    def _forward_unsubscribe_all(self, request):
+        """Forward an UnsubscribeAll to every shard the owner subscribed to"""
+        owner = (request.response_queue, request.context)
+        shards = self._subscription_shards.pop(owner, {})
+        for shard in set(shards.values()):
+            shard.q.put(request)
+
+    def _forward_block_request(self, request):
+        """Lookup target Block and queue block.handle_request(request) on its
+        executor, responding with an Error if the Block is too busy
+
+        Args:
+            request (Request): The message that should be passed to the Block
         """
-        return self.sync_factory.create_lock()
+        block_name = request.endpoint[0]
+        executor = self._executors[block_name]
+        if not executor.submit(request):
+            self.log_warning(
+                "Block %s busy, rejecting %s", block_name, request)
+            request.respond_with_error(
+                "Block %s busy: %d requests already queued" %
+                (block_name, executor.max_queue))
 
     def spawn(self, function, *args, **kwargs):
         """Calls SyncFactory.spawn()"""
+        # Forget about anything that has already finished
+        self._other_spawned = [s for s in self._other_spawned if not s.ready()]
         spawned = self.sync_factory.spawn(function, *args, **kwargs)
         self._other_spawned.append(spawned)
         return spawned
@@ -129,8 +865,130 @@ class Process(Loggable):
         a = Attribute(StringArrayMeta(
                 description="Blocks reachable via ClientComms"))
         self.process_block.add_attribute("remoteBlocks", a)
+        a = Attribute(NumberMeta(
+            "uint32", description="Live subscriptions to Blocks"))
+        a.set_value(0)
+        self.process_block.add_attribute("subscriptions", a)
+        a = Attribute(NumberMeta(
+            "uint32", description="Requests waiting in the Process queues"))
+        a.set_value(0)
+        self.process_block.add_attribute("queueDepth", a)
+        a = Attribute(self._create_handled_meta())
+        a.set_value(Table(a.meta))
+        self.process_block.add_attribute("handled", a)
+        a = Attribute(NumberMeta(
+            "uint64", description="Responses sent to subscriptions"))
+        a.set_value(0)
+        self.process_block.add_attribute("fanout", a)
+        a = Attribute(NumberMeta(
+            "uint32", description="SyncFactory threads"))
+        a.set_value(0)
+        self.process_block.add_attribute("poolSize", a)
+        a = Attribute(NumberMeta(
+            "uint32",
+            description="Spawned functions running or waiting for a thread"))
+        a.set_value(0)
+        self.process_block.add_attribute("poolBusy", a)
         self.add_block(self.name, self.process_block)
 
+    def _create_handled_meta(self):
+        meta = TableMeta(
+            description="Messages handled by type, with a histogram of how "
+                        "long they took")
+        elements = OrderedDict()
+        elements["type"] = StringArrayMeta(description="Message type")
+        elements["count"] = NumberArrayMeta(
+            "uint64", description="Messages handled")
+        for column, heading in zip(LATENCY_COLUMNS, LATENCY_HEADINGS):
+            elements[column] = NumberArrayMeta(
+                "uint64", description="Handled in %s" % heading)
+        meta.set_elements(elements)
+        meta.set_headings(["Type", "Count"] + list(LATENCY_HEADINGS))
+        return meta
+
+    def call_later(self, delay, function, *args):
+        """Call function(*args) from recv_loop after delay seconds. It must
+        not block, so should usually queue or spawn the real work
+
+        Args:
+            delay (float): Time in seconds to wait
+            function (callable): The function to call
+            args: Positional arguments to call it with
+        """
+        self.q.put(CallLater(time.time() + delay, function, args))
+
+    def _handle_call_later(self, request):
+        self._timer_seq += 1
+        heapq.heappush(self._timers, (
+            request.due, self._timer_seq, request.function, request.args))
+
+    def _service_timers(self):
+        timeout = super(Process, self)._service_timers()
+        while self._timers:
+            due = self._timers[0][0] - time.time()
+            if due > 0:
+                if timeout is None or due < timeout:
+                    timeout = due
+                break
+            _, _, function, args = heapq.heappop(self._timers)
+            try:
+                function(*args)
+            except Exception:
+                self.log_exception("Exception while calling %s", function)
+        if self.stats_period:
+            due = self._stats_published + self.stats_period - time.time()
+            if due <= 0:
+                try:
+                    self._publish_stats()
+                except Exception:
+                    self.log_exception("Exception while publishing stats")
+                due = self.stats_period
+            if timeout is None or due < timeout:
+                timeout = due
+        return timeout
+
+    def publish_stats(self):
+        """Set the instrumentation attributes of the process block from the
+        current counters, notifying subscribers once. They are set from
+        recv_loop, so only it changes the process block"""
+        self.call_later(0, self._publish_stats)
+
+    def _publish_stats(self):
+        self._stats_published = time.time()
+        block = self.process_block
+        depth = self.q.qsize() + sum(s.q.qsize() for s in self._shards)
+        block.queueDepth.set_value(depth, notify=False)
+        handled = self.stats.handled()
+        columns = [list(handled)] + [list(c) for c in zip(*handled.values())]
+        d = OrderedDict(zip(block.handled.meta.elements, columns))
+        block.handled.set_value(Table(block.handled.meta, d), notify=False)
+        block.fanout.set_value(self.stats.fanout, notify=False)
+        block.poolSize.set_value(self.sync_factory.pool_size, notify=False)
+        block.poolBusy.set_value(self.sync_factory.busy, notify=False)
+        block.notify_subscribers()
+
+    def update_subscription_count(self):
+        """Publish the number of live subscriptions across all shards. Called
+        from the shards' threads, so it is set from recv_loop, which is the
+        only thread that changes the process block"""
+        self.call_later(0, self._publish_subscription_count)
+
+    def _publish_subscription_count(self):
+        count = sum(len(shard._subscriptions)
+                    for shard in self._shards or [self])
+        self.process_block.subscriptions.set_value(count)
+
+    def unsubscribe_all(self, response_queue, context=None):
+        """Remove every subscription made with the given response_queue and
+        context, without responding. Used when a client goes away
+
+        Args:
+            response_queue (Queue): The queue the subscriptions respond to
+            context: The context the subscriptions were made with
+        """
+        self.q.put(UnsubscribeAll(
+            response_queue=response_queue, context=context))
+
     def update_block_list(self, client_comms, blocks):
         self.q.put(BlockList(client_comms=client_comms, blocks=blocks))
 
@@ -142,68 +1000,49 @@ class Process(Loggable):
         self.process_block.remoteBlocks.set_value(remotes)
 
     def notify_subscribers(self, block_name):
-        self.q.put(BlockNotify(name=block_name))
-
-    def _handle_block_notify(self, request):
-        """Update subscribers with changes and applies stored changes to the
-        cached structure"""
-        # update cached dict
-        for delta in self._last_changes.setdefault(request.name, []):
-            self._block_state_cache.delta_update(delta)
+        """Flush the changes made to a block since the last notify as a single
+        message to be sent to subscribers
 
-        for subscription in self._subscriptions.setdefault(request.name, []):
-            endpoint = subscription.endpoint
-            # find stuff that's changed that is relevant to this subscriber
-            changes = []
-            for change in self._last_changes[request.name]:
-                change_path = change[0]
-                # look for a change_path where the beginning matches the
-                # endpoint path, then strip away the matching part and add
-                # to the change set
-                i = 0
-                for (cp_element, ep_element) in zip(change_path, endpoint):
-                    if cp_element != ep_element:
-                        break
-                    i += 1
-                else:
-                    # change has matching path, so keep it
-                    # but strip off the end point path
-                    filtered_change = [change_path[i:]] + change[1:]
-                    changes.append(filtered_change)
-            if len(changes) > 0:
-                if subscription.delta:
-                    # respond with the filtered changes
-                    response = Delta(
-                        subscription.id_, subscription.context, changes)
-                else:
-                    # respond with the structure of everything
-                    # below the endpoint
-                    d = self._block_state_cache.walk_path(endpoint)
-                    response = Update(
-                        subscription.id_, subscription.context, d)
-                self.log_debug("Responding to subscription %s", response)
-                subscription.response_queue.put(response)
-        self._last_changes[request.name] = []
+        Args:
+            block_name (str): The name of the block that has changed
+        """
+        if self.shard_for(block_name).queue_changes(block_name):
+            self.q.put(BlockChanges.reuse(block_name, None))
 
     def on_changed(self, change, notify=True):
-        self.q.put(BlockChanged(change=change))
+        """Record a change to a block, collapsing repeated writes to the same
+        path until the next notify
+
+        Args:
+            change (list): [path, value] for an addition or change, or [path]
+                for a deletion. path[0] is the block name
+            notify (bool): Whether to flush the changes to subscribers now
+        """
+        block_name = change[0][0]
+        self.shard_for(block_name).record_change(change)
         if notify:
-            block_name = change[0][0]
             self.notify_subscribers(block_name)
 
-    def _handle_block_changed(self, request):
-        """Record changes to made to a block"""
-        # update changes
-        path = request.change[0]
-        block_changes = self._last_changes.setdefault(path[0], [])
-        block_changes.append(request.change)
+    def block_respond(self, response, response_queue, block_name=None):
+        """Queue a response to be put on response_queue
 
-    def block_respond(self, response, response_queue):
-        self.q.put(BlockRespond(response, response_queue))
+        Args:
+            response (Response): The response to send
+            response_queue (Queue): Where to send it
+            block_name (str): If given, the changes made to this block so far
+                are sent to subscribers before the response is sent
+        """
+        tracer.instant("respond", response)
+        if block_name is not None:
+            self.notify_subscribers(block_name)
+        self.q.put(BlockRespond.reuse(response, response_queue, block_name))
 
-    def _handle_block_respond(self, request):
-        """Push the response to the required queue"""
-        request.response_queue.put(request.response)
+    def _forward_block_respond(self, request):
+        """Respond from the shard that has the block's changes to publish"""
+        if request.block_name is None:
+            self._handle_block_respond(request)
+        else:
+            self.shard_for(request.block_name).q.put(request)
 
     def add_block(self, name, block):
         """Add a block to be hosted by this process
@@ -222,24 +1061,13 @@ class Process(Loggable):
         assert block.name not in self._blocks, \
             "There is already a block called %s" % block.name
         self._blocks[block.name] = block
-        self._block_state_cache[block.name] = block.to_dict()
+        if self._shards:
+            self._forward_to_shard(request)
+        else:
+            super(Process, self)._handle_block_add(request)
         block.lock = self.create_lock()
+        self._executors[block.name] = BlockExecutor(
+            "%s.%s.executor" % (self.name, block.name), self.sync_factory,
+            block, self.block_queue_depth, call_later=self.call_later)
         # Regenerate list of blocks
         self.process_block.blocks.set_value(list(self._blocks))
-
-    def _handle_subscribe(self, request):
-        """Add a new subscriber and respond with the current
-        sub-structure state"""
-        subs = self._subscriptions.setdefault(request.endpoint[0], [])
-        subs.append(request)
-        d = self._block_state_cache.walk_path(request.endpoint)
-        self.log_debug("Initial subscription value %s", d)
-        if request.delta:
-            request.respond_with_delta([[[], d]])
-        else:
-            request.respond_with_update(d)
-
-    def _handle_get(self, request):
-        d = self._block_state_cache.walk_path(request.endpoint)
-        response = Return(request.id_, request.context, d)
-        request.response_queue.put(response)
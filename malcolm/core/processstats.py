@@ -0,0 +1,63 @@
+from bisect import bisect_right
+from collections import OrderedDict
+
+
+# Upper bounds in seconds of the handler latency histogram buckets. There is
+# one more bucket for anything slower than the last of these
+LATENCY_BUCKETS = (1e-5, 1e-4, 1e-3, 1e-2, 1e-1, 1.0)
+LATENCY_COLUMNS = (
+    "lt10us", "lt100us", "lt1ms", "lt10ms", "lt100ms", "lt1s", "ge1s")
+LATENCY_HEADINGS = (
+    "<10us", "<100us", "<1ms", "<10ms", "<100ms", "<1s", ">=1s")
+
+
+class ProcessStats(object):
+    """Counts the messages handled by a Process and its shards, how long the
+    handlers took, and how many responses were sent to subscribers"""
+
+    def __init__(self, lock):
+        """
+        Args:
+            lock (Lock): Protects the counters from concurrent shards
+        """
+        self._lock = lock
+        # message type name -> [count, histogram bucket counts...]
+        self._handled = OrderedDict()
+        # responses sent to subscriptions
+        self.fanout = 0
+
+    def record_handled(self, typ, duration):
+        """Count a message that was handled
+
+        Args:
+            typ (type): The type of the message
+            duration (float): Time in seconds the handler took
+        """
+        bucket = bisect_right(LATENCY_BUCKETS, duration) + 1
+        with self._lock:
+            counts = self._handled.get(typ.__name__)
+            if counts is None:
+                counts = [0] * (len(LATENCY_COLUMNS) + 1)
+                self._handled[typ.__name__] = counts
+            counts[0] += 1
+            counts[bucket] += 1
+
+    def record_fanout(self, responses):
+        """Count the responses sent to subscriptions
+
+        Args:
+            responses (int): The number of responses sent
+        """
+        with self._lock:
+            self.fanout += responses
+
+    def handled(self):
+        """Take a copy of the handled message counts
+
+        Returns:
+            OrderedDict: message type name -> [count, histogram bucket
+            counts...] where the buckets are given by LATENCY_COLUMNS
+        """
+        with self._lock:
+            return OrderedDict(
+                (name, list(counts)) for name, counts in self._handled.items())
@@ -2,10 +2,45 @@ from malcolm.core.serializable import Serializable
 from malcolm.core.response import Return, Error, Update, Delta
 
 
+class Deferred(object):
+    """Part of a received request that is only decoded when it is first used,
+    so that routing a request doesn't pay for decoding a large payload. If it
+    is malformed the error is raised there, and whatever uses it must respond
+    to the request with an Error"""
+
+    __slots__ = ("decode",)
+
+    def __init__(self, decode):
+        """
+        Args:
+            decode (callable): Called with no arguments to decode the value
+        """
+        self.decode = decode
+
+
+def _deferred_property(slot, doc):
+    """Make a property that stores its value in slot, decoding it the first
+    time it is got if it is Deferred"""
+    def get(self):
+        value = getattr(self, slot)
+        if isinstance(value, Deferred):
+            value = value.decode()
+            setattr(self, slot, value)
+        return value
+
+    def set(self, value):
+        setattr(self, slot, value)
+
+    return property(get, set, doc=doc)
+
+
 class Request(Serializable):
     """An object to interact with the attributes of a Block"""
 
+    __slots__ = ("id_", "context", "response_queue")
+
     endpoints = ["id"]
+    endpoint_attributes = dict(id="id_")
 
     def __init__(self, context=None, response_queue=None):
         """
@@ -61,6 +96,8 @@ class Request(Serializable):
 class Get(Request):
     """Create a Get Request object"""
 
+    __slots__ = ("endpoint",)
+
     endpoints = ["id", "endpoint"]
 
     def __init__(self, context=None, response_queue=None, endpoint=None):
@@ -82,8 +119,12 @@ class Get(Request):
 class Put(Request):
     """Create a Put Request object"""
 
+    __slots__ = ("endpoint", "_value")
+
     endpoints = ["id", "endpoint", "value"]
 
+    value = _deferred_property("_value", "Value to put to endpoint")
+
     def __init__(self, context=None, response_queue=None,
                  endpoint=None, value=None):
         """
@@ -109,10 +150,17 @@ class Put(Request):
 class Post(Request):
     """Create a Post Request object"""
 
-    endpoints = ["id", "endpoint", "parameters"]
+    __slots__ = ("endpoint", "_parameters", "stream")
+
+    endpoints = ["id", "endpoint", "parameters", "stream"]
+
+    endpoint_defaults = dict(stream=False)
+
+    parameters = _deferred_property(
+        "_parameters", "Parameters to post to an endpoint")
 
     def __init__(self, context=None, response_queue=None,
-                 endpoint=None, parameters=None):
+                 endpoint=None, parameters=None, stream=False):
         """
         Args:
             context(): Context of Post
@@ -120,11 +168,14 @@ class Post(Request):
             endpoint(list[str]): Path to target Block substructure
             parameters(dict): List of parameters to post to an endpoint
                 e.g. arguments for a Method
+            stream(bool): Respond with a Delta for each partial result a
+                generator Method yields before the Return (default False)
         """
 
         super(Post, self).__init__(context, response_queue)
         self.endpoint = endpoint
         self.parameters = parameters
+        self.stream = stream
 
     def set_endpoint(self, endpoint):
         self.endpoint = endpoint
@@ -132,44 +183,66 @@ class Post(Request):
     def set_parameters(self, parameters):
         self.parameters = parameters
 
+    def set_stream(self, stream):
+        self.stream = stream
+
 
 @Serializable.register_subclass("malcolm:core/Subscribe:1.0")
 class Subscribe(Request):
     """Create a Subscribe Request object"""
 
-    endpoints = ["id", "endpoint", "delta"]
+    __slots__ = ("endpoint", "delta", "min_period", "seq", "rows")
 
-    def __init__(self, context=None, response_queue=None, endpoint=None, delta=False):
+    endpoints = ["id", "endpoint", "delta", "min_period", "seq", "rows"]
+
+    endpoint_defaults = dict(min_period=0, seq=None, rows=False)
+
+    def __init__(self, context=None, response_queue=None, endpoint=None,
+                 delta=False, min_period=0, seq=None, rows=False):
         """
         Args:
             context: Context of Subscribe
             response_queue (Queue): Queue to return to
             endpoint (list[str]): Path to target
             delta (bool): Notify of differences only (default False)
+            min_period (float): Minimum time in seconds between responses.
+                Changes within this period are merged and the latest value is
+                sent when it expires. 0 means respond to every change
+            seq (str): If delta, the seq of the last response received by a
+                previous subscription. The first response will only contain
+                the changes since then if the Process still has them
+            rows (bool): If delta, changes to rows of a table may be sent as
+                [path, "rows", start, stop, columns] rather than the whole
+                table (default False)
         """
 
         super(Subscribe, self).__init__(context, response_queue)
         self.endpoint = endpoint
         self.delta = delta
+        self.min_period = min_period
+        self.seq = seq
+        self.rows = rows
 
-    def respond_with_update(self, value):
+    def respond_with_update(self, value, seq=None):
         """
         Create an Update Response object to handle the request
 
         Args:
             value (dict): Dictionary describing the new structure
+            seq (str): Sequence number of the last Block change in value
         """
-        response = Update(self.id_, self.context, value=value)
+        response = Update(self.id_, self.context, value=value, seq=seq)
         self.response_queue.put(response)
 
-    def respond_with_delta(self, changes):
+    def respond_with_delta(self, changes, seq=None):
         """
         Create a Delta Response object to handle the request
 
         Args:
             changes (list): list of [[path], value] pairs for changed values
+            seq (str): Sequence number of the last Block change in changes
         """
-        response = Delta(self.id_, self.context, changes=changes)
+        response = Delta(self.id_, self.context, changes=changes, seq=seq)
         self.response_queue.put(response)
 
     def set_endpoint(self, endpoint):
@@ -178,8 +251,18 @@ class Subscribe(Request):
     def set_delta(self, delta):
         self.delta = delta
 
+    def set_min_period(self, min_period):
+        self.min_period = min_period
+
+    def set_seq(self, seq):
+        self.seq = seq
+
+    def set_rows(self, rows):
+        self.rows = rows
+
 
 @Serializable.register_subclass("malcolm:core/Unsubscribe:1.0")
 class Unsubscribe(Request):
     """Create a Unsubscribe Request object"""
-    pass
+
+    __slots__ = ()
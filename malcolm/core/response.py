@@ -4,11 +4,18 @@ from malcolm.core.serializable import Serializable
 class Response(Serializable):
     """Represents a response to a message"""
 
+    __slots__ = ("id_", "context", "encoding_key")
+
     endpoints = ["id"]
+    endpoint_attributes = dict(id="id_")
 
-    def __init__(self, id_=None, context=None):
+    def __init__(self, id_=None, context=None, encoding_key=None):
         self.id_ = id_
         self.context = context
+        # Responses that differ only by id and context can share an
+        # encoding_key, meaning comms can serialize everything but the id
+        # once for all of them
+        self.encoding_key = encoding_key
 
     def __repr__(self):
         return self.to_dict().__repr__()
@@ -23,6 +30,8 @@ class Response(Serializable):
 @Serializable.register_subclass("malcolm:core/Return:1.0")
 class Return(Response):
 
+    __slots__ = ("value",)
+
     endpoints = ["id", "value"]
 
     def __init__(self, id_=None, context=None, value=None):
@@ -37,6 +46,8 @@ class Return(Response):
 class Error(Response):
     """Create an Error Response object with the provided parameters"""
 
+    __slots__ = ("message",)
+
     endpoints = ["id", "message"]
 
     def __init__(self, id_=None, context=None, message=None):
@@ -57,39 +68,61 @@ class Error(Response):
 class Update(Response):
     """Create an Update Response object with the provided parameters"""
 
-    endpoints = ["id", "value"]
+    __slots__ = ("value", "seq")
 
-    def __init__(self, id_=None, context=None, value=None):
+    endpoints = ["id", "value", "seq"]
+
+    endpoint_defaults = dict(seq=None)
+
+    def __init__(self, id_=None, context=None, value=None, encoding_key=None,
+                 seq=None):
         """
         Args:
             id_ (int): id from initial message
             context: Context associated with id
             value (dict): Serialized state of update object
+            encoding_key: Shared by Updates with the same value
+            seq (str): Sequence number of the last Block change in value
         """
 
-        super(Update, self).__init__(id_, context)
+        super(Update, self).__init__(id_, context, encoding_key)
         self.value = value
+        self.seq = seq
 
     def set_value(self, value):
         self.value = value
 
+    def set_seq(self, seq):
+        self.seq = seq
+
 
 @Serializable.register_subclass("malcolm:core/Delta:1.0")
 class Delta(Response):
     """Create a Delta Response object with the provided parameters"""
 
-    endpoints = ["id", "changes"]
+    __slots__ = ("changes", "seq")
+
+    endpoints = ["id", "changes", "seq"]
 
-    def __init__(self, id_=None, context=None, changes=None):
+    endpoint_defaults = dict(seq=None)
+
+    def __init__(self, id_=None, context=None, changes=None,
+                 encoding_key=None, seq=None):
         """
         Args:
             id_ (int): id from initial message
             context: Context associated with id
             changes (list): list of [[path], value] pairs for changed values
+            encoding_key: Shared by Deltas with the same changes
+            seq (str): Sequence number of the last Block change in changes
         """
 
-        super(Delta, self).__init__(id_, context)
+        super(Delta, self).__init__(id_, context, encoding_key)
         self.changes = changes
+        self.seq = seq
 
     def set_changes(self, changes):
         self.changes = changes
+
+    def set_seq(self, seq):
+        self.seq = seq
@@ -1,4 +1,5 @@
 from collections import OrderedDict
+import functools
 
 
 def serialize_object(o):
@@ -16,18 +17,80 @@ def serialize_object(o):
         return o
 
 
+def serialize_hook(o):
+    """Serialize objects that json doesn't know about, like numpy numbers and
+    arrays. Suitable for json.dumps(default=serialize_hook)"""
+    if hasattr(o, "tolist"):
+        return o.tolist()
+    raise TypeError("%r is not JSON serializable" % (o,))
+
+
+def _set_endpoints(inst, d, setters):
+    """Call the setter of each endpoint in d, then new_endpoint() for anything
+    else in d other than the typeid
+
+    Args:
+        inst: The instance to set endpoints on
+        d (dict): The serialized instance
+        setters (list): [(endpoint, setter)] where setter is called with
+            (inst, value)
+    """
+    found = "typeid" in d
+    for endpoint, setter in setters:
+        if endpoint in d:
+            setter(inst, d[endpoint])
+            found += 1
+    if found != len(d):
+        endpoints = [endpoint for endpoint, _ in setters]
+        for k, v in d.items():
+            if k != "typeid" and k not in endpoints:
+                inst.new_endpoint(k, v)
+
+
+def _call_setter(endpoint):
+    def setter(inst, value):
+        getattr(inst, "set_%s" % endpoint)(value)
+    return setter
+
+
+def _decode_dynamic(cls, d):
+    # Decoder for classes whose endpoints depend on the instance
+    inst = cls()
+    setters = [(e, _call_setter(e)) for e in inst.endpoints or []]
+    _set_endpoints(inst, d, setters)
+    return inst
+
+
 class Serializable(object):
     """Mixin class for serializable objects"""
 
+    # No instance dict here, so subclasses can use __slots__
+    __slots__ = ()
+
     # This will be set by subclasses calling cls.register_subclass()
     typeid = None
 
     # List of endpoint strings for to_dict()
     endpoints = None
 
+    # dict mapping endpoint -> default value for endpoints that to_dict()
+    # leaves out when they have their default, so peers that don't know
+    # about them see the same dict as before they were added
+    endpoint_defaults = {}
+
+    # dict mapping endpoint -> attribute name for classes whose setters just
+    # store their argument in an attribute, so from_dict() sets the attributes
+    # directly. Endpoints not in it are stored under their own name. None
+    # means from_dict() calls the setters
+    endpoint_attributes = None
+
     # dict mapping typeid name -> cls
     _subcls_lookup = {}
 
+    # dict mapping typeid name -> function making an instance of cls from a
+    # dict, made by cls._make_decoder() when it is registered
+    _decoder_lookup = {}
+
     def to_dict(self, **overrides):
         """
         Create a dictionary representation of object attributes
@@ -40,11 +103,15 @@ class Serializable(object):
         d["typeid"] = self.typeid
 
         if self.endpoints is not None:
+            defaults = self.endpoint_defaults
             for endpoint in self.endpoints:
                 if endpoint in overrides:
                     value = overrides[endpoint]
                 else:
                     value = getattr(self, endpoint)
+                if defaults and endpoint in defaults and \
+                        value == defaults[endpoint]:
+                    continue
                 d[endpoint] = serialize_object(value)
 
         return d
@@ -55,31 +122,81 @@ class Serializable(object):
         Base method to create a serializable instance from a dictionary
 
         Args:
-            d(dict): Class instance attributes to set
+            d(dict): Class instance attributes to set. It may be the shared
+                result of a to_dict(), so is only read from
 
         Returns:
             Instance of subclass given in d
+
+        Raises:
+            ValueError: If the typeid in d is not registered, or is not for
+                a subclass of cls
         """
-        subcls = cls.lookup_subclass(d)
-        inst = subcls()
-
-        # Update the instance with any values in the dictionary that are known
-        # endpoints
-        if inst.endpoints:
-            updates = [e for e in inst.endpoints if e in d]
-            for endpoint in updates:
-                setter = getattr(inst, "set_%s" % endpoint)
-                setter(d.pop(endpoint))
-
-        # For anything that is not a known endpoint it must be a typeid or a
-        # new endpoint
-        for k, v in d.items():
-            if k == "typeid":
-                assert v == inst.typeid, \
-                    "Dict has typeid %s but Class has %s" % (v, inst.typeid)
-            else:
-                self.new_endpoint(k, v)
-        return inst
+        typeid = d["typeid"]
+        try:
+            decoder = cls._decoder_lookup[typeid]
+        except KeyError:
+            raise ValueError("No class registered for typeid %r" % (typeid,))
+        if not issubclass(cls._subcls_lookup[typeid], cls):
+            raise ValueError("Dict has typeid %s but %s expected" % (
+                typeid, cls.__name__))
+        return decoder(d)
+
+    @classmethod
+    def _make_decoder(cls):
+        """Make the function that from_dict() uses to create an instance of
+        cls from a dict. The setter for each endpoint is looked up once here
+        rather than for every dict
+
+        Returns:
+            callable: Function taking a dict and returning an instance
+        """
+        if not isinstance(cls.endpoints, list):
+            # endpoints depend on the instance, so look them up each time
+            return functools.partial(_decode_dynamic, cls)
+        if cls.endpoint_attributes is not None:
+            return cls._make_attribute_decoder()
+        setters = cls._endpoint_setters()
+
+        def decode(d):
+            inst = cls()
+            _set_endpoints(inst, d, setters)
+            return inst
+
+        return decode
+
+    @classmethod
+    def _make_attribute_decoder(cls):
+        """Make a decoder that sets the attributes in cls.endpoint_attributes
+        directly rather than calling the setters
+
+        Returns:
+            callable: Function taking a dict and returning an instance
+        """
+        attributes = cls.endpoint_attributes
+        pairs = [(endpoint, attributes.get(endpoint, endpoint))
+                 for endpoint in cls.endpoints]
+        known = set(cls.endpoints)
+        known.add("typeid")
+
+        def decode(d):
+            inst = cls()
+            for endpoint, attribute in pairs:
+                if endpoint in d:
+                    setattr(inst, attribute, d[endpoint])
+            for k in d:
+                if k not in known:
+                    inst.new_endpoint(k, d[k])
+            return inst
+
+        return decode
+
+    @classmethod
+    def _endpoint_setters(cls):
+        """Return [(endpoint, setter)] for cls.endpoints, where setter is the
+        unbound set_<endpoint> method"""
+        return [(endpoint, getattr(cls, "set_%s" % endpoint))
+                for endpoint in cls.endpoints]
 
     def new_endpoint(self, endpoint, value):
         raise NotImplementedError(
@@ -95,6 +212,7 @@ class Serializable(object):
         def decorator(subcls):
             cls._subcls_lookup[typeid] = subcls
             subcls.typeid = typeid
+            cls._decoder_lookup[typeid] = subcls._make_decoder()
             return subcls
         return decorator
 
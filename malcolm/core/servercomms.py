@@ -1,5 +1,7 @@
 from malcolm.core.loggable import Loggable
 from malcolm.core.spawnable import Spawnable
+from malcolm.core.syncfactory import QueueLoop
+from malcolm.core.tracer import tracer
 
 
 class ServerComms(Loggable, Spawnable):
@@ -10,20 +12,30 @@ class ServerComms(Loggable, Spawnable):
         self.set_logger_name(name)
         self.process = process
         self.q = self.process.create_queue()
+        # Service self.q, sending responses to client
+        self.send_loop = QueueLoop(self.q, self.handle_response)
         self.add_spawn_function(self.send_loop,
                                 self.make_default_stop_func(self.q))
 
-    def send_loop(self):
-        """Service self.q, sending responses to client"""
-        while True:
-            response = self.q.get()
-            if response is Spawnable.STOP:
-                break
-            try:
-                self.send_to_client(response)
-            except Exception:
-                self.log_exception(
-                    "Exception sending response %s", response.to_dict())
+    def handle_response(self, response):
+        """Send a single response from self.q to the client
+
+        Args:
+            response (Response): The response to send
+
+        Returns:
+            bool: False if it was Spawnable.STOP, and send_loop should stop
+        """
+        if response is Spawnable.STOP:
+            return False
+        try:
+            start = tracer.now()
+            self.send_to_client(response)
+            tracer.complete("write", response, start)
+        except Exception:
+            self.log_exception(
+                "Exception sending response %s", response.to_dict())
+        return True
 
     def send_to_client(self, response):
         """Abstract method to dispatch response to a client
@@ -36,4 +48,5 @@ class ServerComms(Loggable, Spawnable):
 
     def send_to_process(self, request):
         """Send request to process"""
+        tracer.instant("enqueue", request)
         self.process.q.put(request)
@@ -0,0 +1,143 @@
+from collections import OrderedDict
+
+from malcolm.core.cache import is_row_change
+
+
+class _Node(object):
+    """A single level of the SubscriptionTrie"""
+
+    __slots__ = ("children", "subscriptions")
+
+    def __init__(self):
+        self.children = {}  # endpoint segment -> _Node
+        self.subscriptions = OrderedDict()  # subscription -> None
+
+
+class SubscriptionTrie(object):
+    """Stores subscriptions in a tree keyed on their endpoint segments so that
+    a change only visits subscribers whose endpoint is a prefix of, or sits
+    below, the changed path"""
+
+    def __init__(self):
+        self._root = _Node()
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    def add(self, endpoint, subscription):
+        """Add a subscription to the trie
+
+        Args:
+            endpoint (list[str]): Path that the subscription is interested in
+            subscription (Subscribe): The subscription to store
+        """
+        node = self._root
+        for segment in endpoint:
+            node = node.children.setdefault(segment, _Node())
+        if subscription not in node.subscriptions:
+            node.subscriptions[subscription] = None
+            self._count += 1
+
+    def remove(self, endpoint, subscription):
+        """Remove a subscription from the trie, pruning empty branches
+
+        Args:
+            endpoint (list[str]): Path the subscription was added with
+            subscription (Subscribe): The subscription to remove
+
+        Returns:
+            bool: True if the subscription was found and removed
+        """
+        nodes = [self._root]
+        for segment in endpoint:
+            node = nodes[-1].children.get(segment)
+            if node is None:
+                return False
+            nodes.append(node)
+        if subscription not in nodes[-1].subscriptions:
+            return False
+        del nodes[-1].subscriptions[subscription]
+        self._count -= 1
+        # walk back up removing nodes that no longer lead anywhere
+        for i in reversed(range(len(endpoint))):
+            node = nodes[i + 1]
+            if node.children or node.subscriptions:
+                break
+            del nodes[i].children[endpoint[i]]
+        return True
+
+    def subscriptions(self, endpoint=()):
+        """Iterate over every subscription at or below endpoint
+
+        Args:
+            endpoint (list[str]): Path to start from (default everything)
+
+        Yields:
+            Subscribe: Each subscription in insertion order per level
+        """
+        node = self._root
+        for segment in endpoint:
+            node = node.children.get(segment)
+            if node is None:
+                return
+        for _, node in self._walk_below(node, ()):
+            for subscription in node.subscriptions:
+                yield subscription
+
+    def filter_change(self, change):
+        """Find the endpoints with subscribers interested in a change, and the
+        change as they should see it relative to that endpoint
+
+        Args:
+            change (list): [path, value] for an addition or change, or [path]
+                for a deletion
+
+        Yields:
+            tuple: (endpoint, subscriptions, filtered_change) where endpoint
+                is a tuple, and subscriptions an iterable of every
+                subscription to that endpoint
+        """
+        path = change[0]
+        node = self._root
+        for i, segment in enumerate(path):
+            node = node.children.get(segment)
+            if node is None:
+                return
+            if node.subscriptions:
+                # endpoint is a prefix of the change path, so strip it off
+                filtered_change = [path[i + 1:]] + change[1:]
+                yield tuple(path[:i + 1]), node.subscriptions, filtered_change
+        # anything left sits below the change path, so give it the part of
+        # the new value that it is subscribed to
+        for suffix, node in self._walk_below(node, (), strict=True):
+            filtered_change = self._narrow_change(change, suffix)
+            if filtered_change is not None:
+                yield tuple(path) + suffix, node.subscriptions, \
+                    filtered_change
+
+    def _walk_below(self, node, suffix, strict=False):
+        if node.subscriptions and not strict:
+            yield suffix, node
+        for segment, child in node.children.items():
+            for item in self._walk_below(child, suffix + (segment,)):
+                yield item
+
+    @staticmethod
+    def _narrow_change(change, suffix):
+        if len(change) == 1:
+            return [[]]
+        if is_row_change(change):
+            # Only the columns of a table have rows
+            _, _, start, stop, columns = change
+            if len(suffix) == 1 and suffix[0] in columns:
+                return [[], "rows", start, stop, columns[suffix[0]]]
+            return None
+        value = change[1]
+        try:
+            for segment in suffix:
+                value = value[segment]
+        except (KeyError, TypeError, IndexError):
+            # the subscribed structure no longer exists
+            return [[]]
+        return [[], value]
@@ -1,23 +1,121 @@
-from threading import Lock
+import functools
+from threading import Lock, Thread
+from multiprocessing import cpu_count, TimeoutError
 from multiprocessing.pool import ThreadPool
 
 from malcolm.compat import queue
 from malcolm.core.loggable import Loggable
+from malcolm.core.lanequeue import LaneQueue
+
+
+class QueueLoop(object):
+    """Services a queue, passing each item to a handler until it returns
+    False. Calling it runs the loop in the calling thread, but it can also be
+    passed to spawn() so a SyncFactory can run it however suits it best"""
+
+    def __init__(self, q, handle, service_timers=None):
+        """
+        Args:
+            q (Queue): The queue to service
+            handle (callable): Called with each item from q. Returns False to
+                stop the loop
+            service_timers (callable): If given, called before waiting for
+                each item. Returns the time in seconds until it should next be
+                called, or None if it doesn't need calling until the next item
+        """
+        self.q = q
+        self.handle = handle
+        self.service_timers = service_timers
+
+    def next_timeout(self):
+        """Service the timers, returning how long to wait for the next item"""
+        if self.service_timers is not None:
+            return self.service_timers()
+
+    def __call__(self):
+        while True:
+            timeout = self.next_timeout()
+            try:
+                if timeout is None:
+                    item = self.q.get()
+                else:
+                    item = self.q.get(timeout=timeout)
+            except queue.Empty:
+                # A timer is due
+                continue
+            if not self.handle(item):
+                break
+
+
+class SpawnedThread(object):
+    """The result of SyncFactory.spawn() for a QueueLoop, which runs on a
+    thread of its own"""
+
+    def __init__(self, function):
+        """
+        Args:
+            function (callable): Run on a new daemon thread straight away
+        """
+        self._result = None
+        self._exception = None
+        self._thread = Thread(target=self._run, args=(function,))
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _run(self, function):
+        try:
+            self._result = function()
+        except Exception as e:
+            self._exception = e
+
+    def wait(self, timeout=None):
+        """Wait for the function to finish
+
+        Args:
+            timeout (float): Maximum time in seconds to wait, or None forever
+        """
+        self._thread.join(timeout)
+
+    def ready(self):
+        return not self._thread.is_alive()
+
+    def get(self, timeout=None):
+        """Wait for the function to finish and return its result"""
+        self.wait(timeout)
+        if self._thread.is_alive():
+            raise TimeoutError()
+        if self._exception is not None:
+            raise self._exception
+        return self._result
 
 
 class SyncFactory(Loggable):
-    """Create thread primitives and schedule tasks"""
+    """Create thread primitives and schedule tasks
 
-    def __init__(self, name):
+    A QueueLoop that is spawned runs on a thread of its own, as it holds it
+    until it is stopped. Anything else runs on the pool, so a pool of any size
+    can't be filled up by queue loops and leave nothing to service them.
+    """
+
+    def __init__(self, name, pool_size=None):
         """
         Args:
             name(str): Logger name e.g. "Sync"
+            pool_size(int): Number of threads in the pool, default is the
+                number of CPUs
         """
         self.set_logger_name(name)
-        self.pool = ThreadPool()
+        if pool_size is None:
+            pool_size = cpu_count()
+        self.pool_size = pool_size
+        self.pool = ThreadPool(pool_size)
+        # Number of spawned functions that are running or waiting for a thread
+        self.busy = 0
+        self._busy_lock = Lock()
 
     def spawn(self, function, *args, **kwargs):
-        """Runs the function in a worker thread, returning a Result object
+        """Runs the function in a worker thread, or a thread of its own if
+        it is a QueueLoop, returning a Result object
 
         Args:
             function: Function to run
@@ -28,12 +126,33 @@ class SyncFactory(Loggable):
             object: Something you can call wait(timeout) on to see when it's
             finished executing
         """
-        return self.pool.apply_async(function, args, kwargs)
+        if isinstance(function, QueueLoop):
+            return SpawnedThread(functools.partial(function, *args, **kwargs))
+        with self._busy_lock:
+            self.busy += 1
+        return self.pool.apply_async(self._run, (function, args, kwargs))
+
+    def _run(self, function, args, kwargs):
+        try:
+            return function(*args, **kwargs)
+        finally:
+            with self._busy_lock:
+                self.busy -= 1
 
     def create_queue(self):
         """Creates a new Queue object"""
         return queue.Queue()
 
+    def create_lane_queue(self, lane_for, lanes):
+        """Creates a new LaneQueue object
+
+        Args:
+            lane_for (callable): Returns the lane for an item, 0 is highest
+            lanes (int): The number of lanes
+        """
+        return LaneQueue(self.create_queue(), self.create_lock(), lane_for,
+                         lanes)
+
     def create_lock(self):
         """Creates a new simple Lock object"""
         return Lock()
@@ -1,78 +1,437 @@
+from collections import OrderedDict
+from operator import itemgetter
+
 import numpy as np
 
 from malcolm.core.serializable import Serializable
 
+# Rows allocated for a numpy column the first time it grows
+MIN_CAPACITY = 16
+
 
 @Serializable.register_subclass("malcolm:core/Table:1.0")
 class Table(Serializable):
-    # real data stored as attributes
-    # getitem supported for row by row operations
+    """Columns of values validated by the elements of a TableMeta, accessible
+    as attributes, with getitem and setitem for row by row operations
+
+    Columns that validate to numpy arrays are kept in buffers with spare
+    capacity that grow geometrically. Getting one returns a view of the
+    filled part of its buffer, not a copy. Other columns are kept as lists.
+    Rows given to append() are queued, and validated and added a column at a
+    time the next time the Table is used, so appending a row costs little
+    more than appending to a list.
+
+    Rows that are inserted, changed or deleted are recorded, so that
+    take_row_changes() can say what has changed since it was last called.
+    Changes made through a column are not. A slice of rows is a new Table
+    whose numpy columns are read-only views of this one's. Both Tables then
+    copy their columns before they are next changed, so neither sees the
+    other's changes. A single row is a list of its values, which are
+    scalars, so there is nothing to share. Once serialized by to_dict() the
+    columns are shared with the result in the same way.
+    """
+
+    __slots__ = ("meta", "_names", "_columns", "_lengths", "_shared",
+                 "_row_changes", "_recorded", "_appended")
 
     def __init__(self, meta, d={}):
         if d is None:
             d = {}
-        self.meta = meta
-        for e in meta.elements:
+        object.__setattr__(self, "meta", meta)
+        # Column names in the order of meta.elements
+        object.__setattr__(self, "_names", list(meta.elements))
+        # column name -> numpy buffer or list
+        object.__setattr__(self, "_columns", {})
+        # column name -> rows filled, for numpy buffers only
+        object.__setattr__(self, "_lengths", {})
+        # True if the columns must be copied before they are changed
+        object.__setattr__(self, "_shared", False)
+        # Rows queued by append() that haven't been validated and added yet
+        object.__setattr__(self, "_appended", [])
+        for e in self._names:
             v = d[e] if e in d else []
             setattr(self, e, v)
+        self._clear_row_changes()
+
+    def _clear_row_changes(self):
+        # [start, stop, count, [[chunk of values] for each column]] for each
+        # change in order, where count is the number of rows of values, or
+        # None if rows can't describe what has changed
+        object.__setattr__(self, "_row_changes", [])
+        # Number of rows of values in _row_changes
+        object.__setattr__(self, "_recorded", 0)
+
+    @classmethod
+    def from_columns(cls, meta, columns):
+        """Make a Table from whole columns, validating each of them once. A
+        numpy array of the right dtype is used without copying
+
+        Args:
+            meta (TableMeta): The meta with the column elements
+            columns (dict or list): Column name -> values, or a list of
+                values for each element of meta in order
+
+        Returns:
+            Table: The new Table
+        """
+        if not hasattr(columns, "items"):
+            names = list(meta.elements)
+            if len(columns) != len(names):
+                raise ValueError(
+                    "Expected %d columns, got %d" % (len(names), len(columns)))
+            columns = dict(zip(names, columns))
+        table = cls(meta, columns)
+        table.verify_column_lengths()
+        return table
 
     @property
     def endpoints(self):
-        return [e for e in self.meta.elements]
+        return self._names
+
+    def to_dict(self, **overrides):
+        d = super(Table, self).to_dict(**overrides)
+        object.__setattr__(self, "_shared", True)
+        return d
+
+    def _length(self, name):
+        try:
+            return self._lengths[name]
+        except KeyError:
+            return len(self._columns[name])
 
     def verify_column_lengths(self):
-        if len(self.meta.elements) == 0:
-            return True
-        l = len(getattr(self, list(self.meta.elements)[0]))
-        for e in self.meta.elements:
-            column = getattr(self, e)
-            if l != len(column):
+        """Add any rows queued by append(), then check all the columns have
+        the same number of rows
+
+        Returns:
+            int: The number of rows
+        """
+        if self._appended:
+            self._flush()
+        return self._verify_lengths()
+
+    def _verify_lengths(self):
+        if len(self._names) == 0:
+            return 0
+        l = self._length(self._names[0])
+        for e in self._names:
+            if l != self._length(e):
                 raise AssertionError("Column lengths do not match")
+        return l
+
+    def __len__(self):
+        return self.verify_column_lengths()
 
     def __getitem__(self, idx):
-        """Get row"""
-        self.verify_column_lengths()
-        columns = len(self.meta.elements)
-        row = [None] * columns
-        for i in range(0, columns):
-            row[i] = getattr(self, list(self.meta.elements)[i])[idx]
-        return row
+        """Get a row as a list of its values, or a Table of a slice of rows
+        whose numpy columns are read-only views of this Table's"""
+        n = self.verify_column_lengths()
+        if isinstance(idx, slice):
+            return self._slice(idx)
+        idx = _row_index(idx, n)
+        columns = self._columns
+        return [columns[e][idx] for e in self._names]
+
+    def _slice(self, idx):
+        table = Table.__new__(Table)
+        object.__setattr__(table, "meta", self.meta)
+        object.__setattr__(table, "_names", self._names)
+        object.__setattr__(table, "_columns", {})
+        object.__setattr__(table, "_lengths", {})
+        # Its numpy columns are views of ours, so it copies them to change
+        object.__setattr__(table, "_shared", True)
+        object.__setattr__(table, "_appended", [])
+        table._clear_row_changes()
+        for e in self._names:
+            # Slicing a list copies it, but slicing an array makes a view
+            column = getattr(self, e)[idx]
+            if e in self._lengths:
+                column.flags.writeable = False
+                table._lengths[e] = len(column)
+            table._columns[e] = column
+        if self._lengths:
+            # and we copy ours before changing them
+            object.__setattr__(self, "_shared", True)
+        return table
 
     def __setitem__(self, idx, row):
         """Set row"""
-        self.verify_column_lengths()
-        if len(row) != len(self.meta.elements):
+        n = self.verify_column_lengths()
+        if len(row) != len(self._names):
             raise ValueError(
                 "Row %s does not specify correct number of values" % row)
-        for e, v in zip(self.meta.elements, row):
-            column = getattr(self, e)
-            column[idx] = v
+        idx = _row_index(idx, n)
+        self._unshare()
+        columns = self._columns
+        for e, v in zip(self._names, row):
+            columns[e][idx] = v
+        self._record(n, idx, idx + 1, 1,
+                     [[columns[e][idx]] for e in self._names])
+
+    def __delitem__(self, idx):
+        """Delete a row, or a slice of rows"""
+        n = self.verify_column_lengths()
+        if isinstance(idx, slice):
+            start, stop, step = idx.indices(n)
+            if step != 1:
+                raise ValueError("Can only delete contiguous rows")
+            stop = max(start, stop)
+        else:
+            start = _row_index(idx, n)
+            stop = start + 1
+        self._replace(n, start, stop, [[] for _ in self._names])
+
+    def __getattr__(self, attr):
+        """Get column"""
+        # Only called if attr is not a slot, method or property
+        if attr in Table.__slots__:
+            raise AttributeError(attr)
+        if self._appended:
+            self._flush()
+        try:
+            column = self._columns[attr]
+        except KeyError:
+            raise AttributeError(attr)
+        n = self._lengths.get(attr)
+        if n is not None and n != len(column):
+            column = column[:n]
+        return column
 
     def __setattr__(self, attr, value):
         """Set column"""
-        if hasattr(self, "meta"):
-            column_meta = self.meta.elements[attr]
-            value = column_meta.validate(value)
-        object.__setattr__(self, attr, value)
+        if self._appended:
+            self._flush()
+        column_meta = self.meta.elements[attr]
+        value = column_meta.validate(value)
+        self._columns[attr] = value
+        if isinstance(value, np.ndarray):
+            self._lengths[attr] = len(value)
+            if not value.flags.writeable:
+                # Like a decoded message, so copy it before changing it
+                object.__setattr__(self, "_shared", True)
+        else:
+            self._lengths.pop(attr, None)
+        # Can't describe a whole column changing as rows
+        object.__setattr__(self, "_row_changes", None)
+
+    def _unshare(self):
+        """Copy the columns if they are shared with the result of to_dict()"""
+        if not self._shared:
+            return
+        for e in self._names:
+            column = self._columns[e]
+            if e in self._lengths:
+                self._columns[e] = column.copy()
+            else:
+                self._columns[e] = list(column)
+        object.__setattr__(self, "_shared", False)
+
+    def _reserve(self, name, rows):
+        """Make sure the buffer of a numpy column can hold rows rows"""
+        buf = self._columns[name]
+        if len(buf) < rows:
+            n = self._lengths[name]
+            new = np.empty(max(rows, 2 * len(buf), MIN_CAPACITY), buf.dtype)
+            new[:n] = buf[:n]
+            self._columns[name] = new
+            buf = new
+        return buf
+
+    def _record(self, n, start, stop, count, values):
+        """Record that rows start:stop were replaced by count rows of values,
+        a list of the new values of each column that won't be changed,
+        leaving n rows. Consecutive inserts are merged"""
+        changes = self._row_changes
+        if changes is None:
+            return
+        recorded = self._recorded + count
+        if recorded > max(n, MIN_CAPACITY):
+            # Cheaper to send the whole table
+            object.__setattr__(self, "_row_changes", None)
+            return
+        object.__setattr__(self, "_recorded", recorded)
+        if changes and start == stop:
+            last = changes[-1]
+            if start == last[0] + last[2]:
+                last[2] += count
+                for chunks, column in zip(last[3], values):
+                    if isinstance(column, list) and \
+                            isinstance(chunks[-1], list):
+                        chunks[-1].extend(column)
+                    else:
+                        chunks.append(column)
+                return
+        changes.append([start, stop, count, [[column] for column in values]])
+
+    def take_row_changes(self):
+        """Return the rows that have changed since the last call, and forget
+        them
+
+        Returns:
+            list: [[start, stop, columns]] for each change in the order they
+            were made, where rows start:stop were replaced by the rows in
+            columns, an OrderedDict of column name -> values. None if a whole
+            column was set or too many rows changed to be worth describing
+        """
+        if self._appended:
+            self._flush()
+        changes = self._row_changes
+        self._clear_row_changes()
+        if changes is None:
+            return None
+        taken = []
+        for start, stop, _, values in changes:
+            columns = OrderedDict()
+            for e, chunks in zip(self._names, values):
+                if e in self._lengths:
+                    dtype = self._columns[e].dtype
+                    columns[e] = np.concatenate(
+                        [np.asarray(c, dtype) for c in chunks])
+                else:
+                    columns[e] = [v for chunk in chunks for v in chunk]
+            taken.append([start, stop, columns])
+        return taken
 
     def append(self, row):
-        self.verify_column_lengths()
-        if len(row) != len(self.meta.elements):
+        """Queue a row to be added the next time the Table is used. Its
+        values are validated then, along with any other rows queued, and a
+        ValueError is raised there for any that are invalid
+
+        Args:
+            row (list): A value for every column
+        """
+        if len(row) != len(self._names):
             raise ValueError(
                 "Row %s does not specify correct number of values" % row)
-        for e, v in zip(self.meta.elements, row):
-            column = getattr(self, e)
+        self._appended.append(list(row))
+
+    def _flush(self):
+        """Validate the rows queued by append() a column at a time and add
+        them. If any are invalid, the rest are added and the invalid ones
+        are dropped, raising a ValueError for them"""
+        n = self._verify_lengths()
+        rows = self._appended
+        object.__setattr__(self, "_appended", [])
+        try:
+            self._replace(n, n, n, self._validate_rows(rows))
+            return
+        except (TypeError, ValueError):
+            pass
+        # Find the rows that are invalid
+        valid = []
+        errors = []
+        for row in rows:
             try:
-                column.append(v)
-            except:
-                # numpy arrays have no append, so make an array of the right
-                # validated type, and use np.append
-                v = self.meta.elements[e].validate([v])
-                new_column = np.append(column, v)
-                setattr(self, e, new_column)
+                self._validate_rows([row])
+            except (TypeError, ValueError) as e:
+                errors.append("%s: %s" % (row, e))
+            else:
+                valid.append(row)
+        if valid:
+            self._replace(n, n, n, self._validate_rows(valid))
+        raise ValueError(
+            "Dropped invalid appended rows: %s" % "; ".join(errors))
+
+    def _validate_rows(self, rows):
+        """Validate each column of rows at once
+
+        Returns:
+            list: The validated values of each column
+        """
+        validated = []
+        for i, e in enumerate(self._names):
+            column = list(map(itemgetter(i), rows))
+            validated.append(self.meta.elements[e].validate(column))
+        return validated
+
+    def extend(self, rows):
+        """Append rows, validating each column of them at once
+
+        Args:
+            rows (list): Rows, each with a value for every column
+        """
+        self.insert(self.verify_column_lengths(), rows)
+
+    def insert(self, index, rows):
+        """Insert rows before index, validating each column of them at once
+
+        Args:
+            index (int): The row to insert them before, or the number of rows
+                to append them
+            rows (list): Rows, each with a value for every column
+        """
+        n = self.verify_column_lengths()
+        rows = list(rows)
+        if not rows:
+            return
+        if set(map(len, rows)) != set([len(self._names)]):
+            for row in rows:
+                if len(row) != len(self._names):
+                    raise ValueError(
+                        "Row %s does not specify correct number of values"
+                        % row)
+        if index != n:
+            index = _row_index(index, n)
+        # Validate everything before changing anything
+        self._replace(n, index, index, self._validate_rows(rows))
+
+    def splice(self, start, stop, columns):
+        """Replace rows start:stop with new rows given as columns. This is
+        how a change from take_row_changes() is applied to another Table
+
+        Args:
+            start (int): The first row to replace
+            stop (int): The row after the last to replace, or start to insert
+            columns (dict): Column name -> values for every column, all the
+                same length
+        """
+        n = self.verify_column_lengths()
+        if not 0 <= start <= stop <= n:
+            raise IndexError(
+                "Rows %s:%s out of range for %d rows" % (start, stop, n))
+        validated = []
+        for e in self._names:
+            column = columns[e]
+            if e not in self._lengths and isinstance(column, np.ndarray):
+                column = column.tolist()
+            validated.append(self.meta.elements[e].validate(column))
+        if len(set(len(column) for column in validated)) > 1:
+            raise AssertionError("Column lengths do not match")
+        self._replace(n, start, stop, validated)
+
+    def _replace(self, n, start, stop, validated):
+        """Replace rows start:stop of the n rows with validated columns"""
+        self._unshare()
+        count = len(validated[0]) if validated else 0
+        new_n = n - (stop - start) + count
+        for e, column in zip(self._names, validated):
+            if e in self._lengths:
+                buf = self._reserve(e, new_n)
+                if count != stop - start:
+                    # numpy copes with the source and destination overlapping
+                    buf[start + count:new_n] = buf[stop:n]
+                buf[start:start + count] = column
+                self._lengths[e] = new_n
+            else:
+                self._columns[e][start:stop] = column
+        # Copies, as validate() may have returned what it was given
+        self._record(new_n, start, stop, count, [
+            c.copy() if isinstance(c, np.ndarray) else list(c)
+            for c in validated])
 
     @classmethod
     def from_dict(cls, d, meta):
-        d.pop("typeid")
+        # d may be shared, so leave the typeid in it for __init__ to ignore
         t = cls(meta, d)
         return t
+
+
+def _row_index(idx, n):
+    """Return idx as a non-negative row index, raising IndexError if it is
+    not one of the n rows. Numpy buffers may have more rows than are filled,
+    so can't be relied on to raise it"""
+    if idx < 0:
+        idx += n
+    if not 0 <= idx < n:
+        raise IndexError("Row %s out of range for %d rows" % (idx, n))
+    return idx
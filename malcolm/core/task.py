@@ -10,7 +10,6 @@ class Task(Loggable):
         attributes on blocks. Note that queue handling is executed in the
         caller's thread (by calling wait_all). Hence this module is not
         thread safe"""
-    # TODO: when Task object is destroyed  we need to cancel all subscriptions
     # Sentinel object that when received stops the recv_loop
     TASK_STOP = object()
 
@@ -166,6 +165,15 @@ class Task(Loggable):
         request.set_id(id_)
         self.process.q.put(request)
 
+    def unsubscribe_all(self):
+        """Terminates all subscriptions made by this task"""
+        self._subscriptions.clear()
+        self.process.unsubscribe_all(self.q)
+
+    def __del__(self):
+        # Don't leave subscriptions behind in the process when dropped
+        if getattr(self, "_subscriptions", None):
+            self.unsubscribe_all()
 
     def stop(self):
         """Puts an abort on the queue"""
@@ -0,0 +1,94 @@
+from collections import deque
+import json
+import os
+import threading
+import time
+
+
+class Tracer(object):
+    """Records timestamped events for Requests and Responses in a bounded
+    buffer, and exports them in the Chrome trace event format
+
+    A Response is matched to the Request it answers by its context and id, so
+    they are shown on the same track in the trace viewer. Recording does
+    nothing until enable() is called, so callers only need to check enabled
+    before building any arguments.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self._events = deque()
+        self._pid = os.getpid()
+
+    def enable(self, max_events=100000):
+        """Start recording events, discarding any previously recorded
+
+        Args:
+            max_events (int): Number of events to keep. When full the oldest
+                are dropped
+        """
+        self._events = deque(maxlen=max_events)
+        self.enabled = True
+
+    def disable(self):
+        """Stop recording events, keeping those already recorded"""
+        self.enabled = False
+
+    @staticmethod
+    def now():
+        """Return a timestamp suitable for passing to complete()"""
+        return time.time()
+
+    def _event(self, ph, name, message, ts, **kwargs):
+        event = dict(
+            name=name, cat="request", ph=ph, ts=ts * 1e6, pid=self._pid,
+            tid=threading.current_thread().ident, **kwargs)
+        if message is not None:
+            event["args"] = dict(
+                id=message.id_, typeid=message.typeid,
+                context="%x" % id(message.context))
+        self._events.append(event)
+
+    def instant(self, name, message):
+        """Record that message passed a point now
+
+        Args:
+            name (str): Name of the point, like "enqueue"
+            message (Request or Response): The message passing the point
+        """
+        if self.enabled:
+            self._event("n", name, message, time.time(),
+                        id="%x:%s" % (id(message.context), message.id_))
+
+    def complete(self, name, message, start):
+        """Record a span of time on this thread that started at start and
+        ends now
+
+        Args:
+            name (str): Name of the span, like "write"
+            message (Request or Response): The message the span was for, or
+                None if not known
+            start (float): The result of now() at the start of the span
+        """
+        if self.enabled:
+            self._event("X", name, message, start,
+                        dur=(time.time() - start) * 1e6)
+
+    def events(self):
+        """Return a list of the events currently recorded"""
+        return list(self._events)
+
+    def export(self, filename):
+        """Write the recorded events to a file that can be loaded into
+        chrome://tracing
+
+        Args:
+            filename (str): The file to write
+        """
+        with open(filename, "w") as f:
+            json.dump(dict(traceEvents=self.events(),
+                           displayTimeUnit="ms"), f)
+
+
+# The Tracer that all of malcolm records to
+tracer = Tracer()
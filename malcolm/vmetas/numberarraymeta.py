@@ -15,6 +15,18 @@ class NumberArrayMeta(NumberMeta, VArrayMeta):
             return None
 
         elif type(value) == list:
+            original = np.array(value)
+            if original.dtype.kind in "biuf":
+                # All numbers, so cast and check them at once. np.isclose is
+                # slow, so only used where the cast is not exact
+                casted_array = original.astype(self.dtype)
+                lost = casted_array != original
+                if lost.any() and not np.isclose(
+                        casted_array[lost], original[lost]).all():
+                    i = np.flatnonzero(~np.isclose(casted_array, original))[0]
+                    raise ValueError("Lost information converting %s to %s"
+                                     % (value, casted_array[i]))
+                return casted_array
             casted_array = np.array(value, dtype=self.dtype)
             for i, number in enumerate(value):
                 if number is None:
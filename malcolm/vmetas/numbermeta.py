@@ -28,7 +28,8 @@ class NumberMeta(VMeta):
         if value is None:
             return None
         cast = getattr(np, self.dtype)(value)
-        if not isinstance(value, base_string):
+        if not isinstance(value, base_string) and cast != value:
+            # np.isclose is slow, so only used if the cast is not exact
             if not np.isclose(cast, value):
                 raise ValueError("Lost information converting %s to %s"
                                  % (value, cast))
@@ -0,0 +1,445 @@
+"""Encoding of serialized messages in a binary format based on msgpack
+
+A message is an 8 byte header holding the length of a msgpack body, the body,
+then the raw data of any numpy arrays in the message as attachments, each
+starting on an 8 byte boundary. An array in the body is an ext type holding
+[dtype, shape, offset of its attachment], so arrays are sent from their own
+buffers and arrive as typed arrays that are views of the message, rather than
+lists. Only the parts of msgpack that serialized messages need are supported,
+and maps are decoded into OrderedDicts to keep their order.
+"""
+from collections import OrderedDict
+import functools
+import struct
+
+import numpy as np
+
+# Websocket subprotocol a client asks for to have its messages in this format
+BINARY_SUBPROTOCOL = "malcolm.msgpack"
+
+# msgpack ext type code for numpy arrays
+NDARRAY_EXT = 1
+
+# Header holding the body length, padded so attachments can be aligned
+HEADER = struct.Struct(">I4x")
+ALIGNMENT = 8
+
+try:
+    # python 2
+    text_type = unicode
+    integer_types = (int, long)
+except NameError:
+    # python 3
+    text_type = str
+    integer_types = (int,)
+
+
+def _pack_length(n, fix_code, fix_limit, code8, code16, code32):
+    if n < fix_limit:
+        return struct.pack(">B", fix_code | n)
+    elif code8 is not None and n < 0x100:
+        return struct.pack(">BB", code8, n)
+    elif n < 0x10000:
+        return struct.pack(">BH", code16, n)
+    else:
+        return struct.pack(">BI", code32, n)
+
+
+def pack_map_header(n):
+    """Return the header for a map of n key, value pairs. The encoded keys and
+    values should follow it"""
+    return _pack_length(n, 0x80, 16, None, 0xde, 0xdf)
+
+
+def _pack_int(o):
+    if 0 <= o < 0x80:
+        return struct.pack(">B", o)
+    elif -32 <= o < 0:
+        return struct.pack(">b", o)
+    elif o >= 0:
+        if o < 0x100:
+            return struct.pack(">BB", 0xcc, o)
+        elif o < 0x10000:
+            return struct.pack(">BH", 0xcd, o)
+        elif o < 0x100000000:
+            return struct.pack(">BI", 0xce, o)
+        else:
+            return struct.pack(">BQ", 0xcf, o)
+    elif o >= -0x80:
+        return struct.pack(">Bb", 0xd0, o)
+    elif o >= -0x8000:
+        return struct.pack(">Bh", 0xd1, o)
+    elif o >= -0x80000000:
+        return struct.pack(">Bi", 0xd2, o)
+    else:
+        return struct.pack(">Bq", 0xd3, o)
+
+
+def _pack_bin(data):
+    return _pack_length(len(data), 0, 0, 0xc4, 0xc5, 0xc6) + data
+
+
+def _pack_ext(code, data):
+    n = len(data)
+    if n < 0x100:
+        header = struct.pack(">BBb", 0xc7, n, code)
+    elif n < 0x10000:
+        header = struct.pack(">BHb", 0xc8, n, code)
+    else:
+        header = struct.pack(">BIb", 0xc9, n, code)
+    return header + data
+
+
+def _padding(n):
+    return b"\0" * (-n % ALIGNMENT)
+
+
+try:
+    b"".join([memoryview(b"")])
+except TypeError:
+    # python 2 can only join strs, so take a copy
+    def _buffer(array):
+        return array.tobytes()
+else:
+    def _buffer(array):
+        return memoryview(array.reshape(-1).view(np.uint8))
+
+
+class Attachments(object):
+    """The numpy arrays to send after the body of a message"""
+
+    def __init__(self):
+        self.arrays = []
+        # Size of the attachments including padding
+        self.size = 0
+
+    def add(self, array):
+        """Add a C contiguous array, returning the offset of its attachment"""
+        offset = self.size
+        self.arrays.append(array)
+        self.size += array.nbytes + len(_padding(array.nbytes))
+        return offset
+
+
+def _pack_ndarray(o, chunks, attachments):
+    if o.dtype.hasobject:
+        _pack(o.tolist(), chunks, attachments)
+    else:
+        o = np.ascontiguousarray(o)
+        offset = attachments.add(o)
+        header = []
+        _pack([o.dtype.str, list(o.shape), offset], header, attachments)
+        chunks.append(_pack_ext(NDARRAY_EXT, b"".join(header)))
+
+
+def _pack(o, chunks, attachments):
+    if o is None:
+        chunks.append(b"\xc0")
+    elif o is True or o is False:
+        chunks.append(b"\xc3" if o else b"\xc2")
+    elif isinstance(o, integer_types):
+        chunks.append(_pack_int(o))
+    elif isinstance(o, float):
+        chunks.append(struct.pack(">Bd", 0xcb, o))
+    elif isinstance(o, text_type):
+        data = o.encode("utf-8")
+        chunks.append(_pack_length(len(data), 0xa0, 32, 0xd9, 0xda, 0xdb))
+        chunks.append(data)
+    elif isinstance(o, str):
+        # python 2 str, which we treat as text like json does
+        chunks.append(_pack_length(len(o), 0xa0, 32, 0xd9, 0xda, 0xdb))
+        chunks.append(o)
+    elif isinstance(o, (bytes, bytearray)):
+        chunks.append(_pack_bin(bytes(o)))
+    elif isinstance(o, dict):
+        chunks.append(pack_map_header(len(o)))
+        for k, v in o.items():
+            _pack(k, chunks, attachments)
+            _pack(v, chunks, attachments)
+    elif isinstance(o, (list, tuple)):
+        chunks.append(_pack_length(len(o), 0x90, 16, None, 0xdc, 0xdd))
+        for v in o:
+            _pack(v, chunks, attachments)
+    elif isinstance(o, np.ndarray):
+        _pack_ndarray(o, chunks, attachments)
+    elif isinstance(o, np.bool_):
+        _pack(bool(o), chunks, attachments)
+    elif isinstance(o, np.integer):
+        _pack(int(o), chunks, attachments)
+    elif isinstance(o, np.floating):
+        _pack(float(o), chunks, attachments)
+    elif hasattr(o, "to_dict"):
+        _pack(o.to_dict(), chunks, attachments)
+    else:
+        raise TypeError("%r is not msgpack serializable" % (o,))
+
+
+def pack(o, attachments):
+    """Encode an object made of dicts, lists, strings, numbers, numpy arrays
+    and Serializables as a msgpack body, adding any arrays to attachments
+
+    Args:
+        o: The object to encode
+        attachments (Attachments): Where to put the arrays
+
+    Returns:
+        bytes: The msgpack body
+    """
+    chunks = []
+    _pack(o, chunks, attachments)
+    return b"".join(chunks)
+
+
+def frame(body, attachments):
+    """Make a message from a body and the attachments it refers to. The
+    array data is copied once, straight from each array into the message
+
+    Args:
+        body (bytes): The msgpack body from pack()
+        attachments (Attachments): The arrays added by pack()
+
+    Returns:
+        bytes: The message
+    """
+    chunks = [HEADER.pack(len(body)), body]
+    if attachments.arrays:
+        chunks.append(_padding(len(body)))
+    for array in attachments.arrays:
+        chunks.append(_buffer(array))
+        chunks.append(_padding(array.nbytes))
+    return b"".join(chunks)
+
+
+def dumps(o):
+    """Encode an object as a message with pack() and frame()
+
+    Args:
+        o: The object to encode
+
+    Returns:
+        bytes: The message
+    """
+    attachments = Attachments()
+    body = pack(o, attachments)
+    return frame(body, attachments)
+
+
+class _Unpacker(object):
+    """Decodes msgpack from a bytearray, keeping track of the position"""
+
+    def __init__(self, data, message, base):
+        """
+        Args:
+            data (bytearray): The msgpack body
+            message (bytes): The whole message
+            base (int): Position in message of the first attachment
+        """
+        self.data = data
+        self.message = message
+        self.base = base
+        self.pos = 0
+
+    def take(self, n):
+        start = self.pos
+        self.pos += n
+        return bytes(self.data[start:self.pos])
+
+    def unpack_from(self, fmt, size):
+        value = struct.unpack_from(fmt, self.data, self.pos)[0]
+        self.pos += size
+        return value
+
+    def text(self, n):
+        return self.take(n).decode("utf-8")
+
+    def array(self, n):
+        return [self.unpack() for _ in range(n)]
+
+    def map(self, n):
+        d = OrderedDict()
+        for _ in range(n):
+            k = self.unpack()
+            d[k] = self.unpack()
+        return d
+
+    def ext(self, n):
+        code = self.unpack_from(">b", 1)
+        if code != NDARRAY_EXT:
+            raise ValueError("Unknown msgpack ext type %d" % code)
+        dtype, shape, offset = self.unpack()
+        dtype = np.dtype(dtype)
+        count = int(np.prod(shape))
+        if count:
+            # A read only view of the message rather than a copy
+            array = np.frombuffer(
+                self.message, dtype, count, self.base + offset)
+        else:
+            array = np.zeros(0, dtype)
+        return array.reshape(shape)
+
+    def skip(self):
+        """Move past the next value without decoding it"""
+        code = self.data[self.pos]
+        self.pos += 1
+        if code < 0x80 or code >= 0xe0 or code in (0xc0, 0xc2, 0xc3):
+            return
+        elif code < 0x90:
+            n = 2 * (code & 0x0f)
+        elif code < 0xa0:
+            n = code & 0x0f
+        elif code < 0xc0:
+            self.pos += code & 0x1f
+            return
+        else:
+            try:
+                fmt, size, handler = _CODES[code]
+            except KeyError:
+                raise ValueError("Unsupported msgpack type 0x%02x" % code)
+            if fmt is None:
+                value = size
+            else:
+                value = self.unpack_from(fmt, size)
+            if handler is None:
+                return
+            elif handler is _Unpacker.map:
+                n = 2 * value
+            elif handler is _Unpacker.array:
+                n = value
+            elif handler is _Unpacker.ext:
+                # the type code then the payload
+                self.pos += 1 + value
+                return
+            else:
+                self.pos += value
+                return
+        for _ in range(n):
+            self.skip()
+
+    def map_length(self):
+        """Decode the header of a map, returning its number of pairs"""
+        code = self.data[self.pos]
+        self.pos += 1
+        if 0x80 <= code < 0x90:
+            return code & 0x0f
+        elif code == 0xde:
+            return self.unpack_from(">H", 2)
+        elif code == 0xdf:
+            return self.unpack_from(">I", 4)
+        else:
+            raise ValueError("Expected a msgpack map, got 0x%02x" % code)
+
+    def unpack_at(self, pos):
+        """Decode the value at pos, leaving the position alone"""
+        unpacker = _Unpacker(self.data, self.message, self.base)
+        unpacker.pos = pos
+        return unpacker.unpack()
+
+    def unpack(self):
+        code = self.data[self.pos]
+        self.pos += 1
+        if code < 0x80:
+            return code
+        elif code < 0x90:
+            return self.map(code & 0x0f)
+        elif code < 0xa0:
+            return self.array(code & 0x0f)
+        elif code < 0xc0:
+            return self.text(code & 0x1f)
+        elif code >= 0xe0:
+            return code - 0x100
+        elif code == 0xc0:
+            return None
+        elif code == 0xc2:
+            return False
+        elif code == 0xc3:
+            return True
+        try:
+            fmt, size, handler = _CODES[code]
+        except KeyError:
+            raise ValueError("Unsupported msgpack type 0x%02x" % code)
+        if fmt is None:
+            # The value is given by the code
+            value = size
+        else:
+            value = self.unpack_from(fmt, size)
+        if handler is None:
+            return value
+        else:
+            return handler(self, value)
+
+
+# code -> (struct format or None if size is the value, size, handler called
+# with the value or None to return the value)
+_CODES = {
+    0xc4: (">B", 1, _Unpacker.take),
+    0xc5: (">H", 2, _Unpacker.take),
+    0xc6: (">I", 4, _Unpacker.take),
+    0xc7: (">B", 1, _Unpacker.ext),
+    0xc8: (">H", 2, _Unpacker.ext),
+    0xc9: (">I", 4, _Unpacker.ext),
+    0xca: (">f", 4, None),
+    0xcb: (">d", 8, None),
+    0xcc: (">B", 1, None),
+    0xcd: (">H", 2, None),
+    0xce: (">I", 4, None),
+    0xcf: (">Q", 8, None),
+    0xd0: (">b", 1, None),
+    0xd1: (">h", 2, None),
+    0xd2: (">i", 4, None),
+    0xd3: (">q", 8, None),
+    0xd9: (">B", 1, _Unpacker.text),
+    0xda: (">H", 2, _Unpacker.text),
+    0xdb: (">I", 4, _Unpacker.text),
+    0xdc: (">H", 2, _Unpacker.array),
+    0xdd: (">I", 4, _Unpacker.array),
+    0xde: (">H", 2, _Unpacker.map),
+    0xdf: (">I", 4, _Unpacker.map),
+}
+# fixext 1, 2, 4, 8 and 16 have the length in the code
+for _i, _code in enumerate(range(0xd4, 0xd9)):
+    _CODES[_code] = (None, 1 << _i, _Unpacker.ext)
+
+
+def _unpacker(message):
+    length = HEADER.unpack_from(message)[0]
+    end = HEADER.size + length
+    body = bytearray(message[HEADER.size:end])
+    base = end + len(_padding(end))
+    return _Unpacker(body, message, base)
+
+
+def loads(message):
+    """Decode a message made by dumps() or frame()
+
+    Args:
+        message (bytes): The encoded message
+
+    Returns:
+        The decoded object, with OrderedDicts for maps and read only numpy
+        arrays that share memory with message for typed arrays
+    """
+    return _unpacker(message).unpack()
+
+
+def loads_lazy(message, lazy_keys):
+    """Decode a message made by dumps() or frame() whose top level is a map,
+    except for the values of lazy_keys, which are skipped over
+
+    Args:
+        message (bytes): The encoded message
+        lazy_keys (container): Keys of the map whose values are not decoded
+
+    Returns:
+        OrderedDict: The decoded map, where the value of each of lazy_keys is
+        a function that decodes it when called
+    """
+    unpacker = _unpacker(message)
+    d = OrderedDict()
+    for _ in range(unpacker.map_length()):
+        k = unpacker.unpack()
+        if k in lazy_keys:
+            d[k] = functools.partial(unpacker.unpack_at, unpacker.pos)
+            unpacker.skip()
+        else:
+            d[k] = unpacker.unpack()
+    return d
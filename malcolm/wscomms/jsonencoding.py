@@ -0,0 +1,86 @@
+"""Decoding of JSON messages that leaves large values until they are needed
+
+The top level object of a message is decoded key by key. The values of lazy
+keys are skipped by matching just the strings and brackets in them, which is
+much cheaper than building them, and decoded in place later if they are used.
+"""
+from collections import OrderedDict
+import functools
+import json
+import re
+
+_decoder = json.JSONDecoder(object_pairs_hook=OrderedDict)
+
+# Whitespace allowed between JSON tokens
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+
+# Anything up to and including the next bracket that nests values, skipping
+# over strings as they may contain brackets. Written so that there is only
+# one way to match, as backtracking would make a bad message slow to reject
+_NESTING = re.compile(
+    r'[^"\[\]{}]*(?:"[^"\\]*(?:\\.[^"\\]*)*"[^"\[\]{}]*)*[\[\]{}]')
+
+
+def _skip_whitespace(s, pos):
+    return _WHITESPACE.match(s, pos).end()
+
+
+def _expect(s, pos, chars):
+    pos = _skip_whitespace(s, pos)
+    if pos == len(s) or s[pos] not in chars:
+        raise ValueError("Expected one of %r at %d" % (chars, pos))
+    return s[pos], pos + 1
+
+
+def _skip_value(s, pos):
+    """Return the position after the JSON value at pos"""
+    if s[pos:pos + 1] not in ("[", "{"):
+        return _decoder.raw_decode(s, pos)[1]
+    depth = 0
+    while True:
+        match = _NESTING.match(s, pos)
+        if match is None:
+            raise ValueError("Unterminated value at %d" % pos)
+        pos = match.end()
+        if s[pos - 1] in "[{":
+            depth += 1
+        else:
+            depth -= 1
+            if depth == 0:
+                return pos
+
+
+def _loads_at(s, pos):
+    return _decoder.raw_decode(s, pos)[0]
+
+
+def loads_lazy(s, lazy_keys):
+    """Decode a JSON object, except for the values of lazy_keys, which are
+    skipped over
+
+    Args:
+        s (str): The JSON text of an object
+        lazy_keys (container): Keys of the object whose values are not decoded
+
+    Returns:
+        OrderedDict: The decoded object, where the value of each of lazy_keys
+        is a function that decodes it when called
+    """
+    d = OrderedDict()
+    _, pos = _expect(s, 0, "{")
+    char, after = _expect(s, pos, '"}')
+    while char != "}":
+        k, pos = _decoder.raw_decode(s, after - 1)
+        _, pos = _expect(s, pos, ":")
+        pos = _skip_whitespace(s, pos)
+        if k in lazy_keys:
+            d[k] = functools.partial(_loads_at, s, pos)
+            pos = _skip_value(s, pos)
+        else:
+            d[k], pos = _decoder.raw_decode(s, pos)
+        char, after = _expect(s, pos, ",}")
+        if char == ",":
+            _, after = _expect(s, after, '"')
+    if _skip_whitespace(s, after) != len(s):
+        raise ValueError("Extra data at %d" % after)
+    return d
@@ -1,16 +1,26 @@
 from collections import OrderedDict
 import json
 
+from tornado.httpclient import HTTPRequest
 from tornado.ioloop import IOLoop
 from tornado.websocket import websocket_connect
 
 from malcolm.core.clientcomms import ClientComms
 from malcolm.core.request import Request, Subscribe
-from malcolm.core.serializable import Serializable
+from malcolm.core.serializable import Serializable, serialize_hook
+from malcolm.wscomms import binaryencoding
+from malcolm.wscomms.binaryencoding import BINARY_SUBPROTOCOL
 
 
 class WSClientComms(ClientComms):
-    """A class for a client to communicate with the server"""
+    """A class for a client to communicate with the server
+
+    Binary messages are asked for when connecting, and used if the server
+    agrees, otherwise messages are JSON.
+    """
+
+    # True if the server agreed to binary messages
+    binary = False
 
     def __init__(self, name, process, url):
         """
@@ -23,8 +33,12 @@ class WSClientComms(ClientComms):
         self.url = url
         # TODO: Are we starting one or more IOLoops here?
         self.loop = IOLoop.current()
+        # Ask for binary messages with a header, which works with every
+        # version of tornado
+        request = HTTPRequest(
+            url, headers={"Sec-WebSocket-Protocol": BINARY_SUBPROTOCOL})
         self.conn = websocket_connect(
-            url, callback=self.subscribe_server_blocks,
+            request, callback=self.subscribe_server_blocks,
             on_message_callback=self.on_message)
         self.add_spawn_function(self.loop.start, self.stop_recv_loop)
 
@@ -33,11 +47,14 @@ class WSClientComms(ClientComms):
         Pass response from server to process receive queue
 
         Args:
-            message(str): Received message
+            message(str or bytes): Received JSON text or binary message
         """
         try:
             self.log_debug("Got message %s", message)
-            d = json.loads(message, object_pairs_hook=OrderedDict)
+            if isinstance(message, bytes):
+                d = binaryencoding.loads(message)
+            else:
+                d = json.loads(message, object_pairs_hook=OrderedDict)
             response = Serializable.from_dict(d)
             self.send_to_caller(response)
         except Exception as e:
@@ -51,16 +68,28 @@ class WSClientComms(ClientComms):
         Args:
             request(Request): The message to pass to the server
         """
-        message = json.dumps(request.to_dict())
-        self.conn.result().write_message(message)
+        if self.binary:
+            message = binaryencoding.dumps(request.to_dict())
+        else:
+            message = json.dumps(request.to_dict(), default=serialize_hook)
+        self.conn.result().write_message(message, binary=self.binary)
 
     def stop_recv_loop(self):
         # This is the only thing that is safe to do from outside the IOLoop
         # thread
         self.loop.add_callback(self.loop.stop)
 
-    def subscribe_server_blocks(self, _):
-        """Subscribe to process blocks"""
+    def subscribe_server_blocks(self, conn):
+        """Use the encoding the server agreed to, then subscribe to process
+        blocks
+
+        Args:
+            conn (Future): The connection that has completed
+        """
+        protocol = conn.result().headers.get("Sec-WebSocket-Protocol")
+        self.binary = protocol == BINARY_SUBPROTOCOL
+        # A server that agrees to binary messages also sends rows
+        self.rows = self.binary
         request = Subscribe(None, None, [".", "blocks", "value"])
         request.set_id(self.SERVER_BLOCKS_ID)
         self.loop.add_callback(self.send_to_server, request)
@@ -7,36 +7,81 @@ from tornado.web import Application
 from tornado.httpserver import HTTPServer
 
 from malcolm.core.servercomms import ServerComms
-from malcolm.core.serializable import Serializable
-from malcolm.core.request import Request
+from malcolm.core.serializable import Serializable, serialize_hook
+from malcolm.core.request import Request, Deferred
+from malcolm.core.tracer import tracer
+from malcolm.wscomms import binaryencoding, jsonencoding
+from malcolm.wscomms.binaryencoding import BINARY_SUBPROTOCOL
+
+# Endpoints of a request that hold its payload, decoded when first used
+LAZY_KEYS = ("value", "parameters")
 
 
 class MalcolmWebSocketHandler(WebSocketHandler):
 
     servercomms = None
+    # True if the client asked for binary messages when it connected
+    binary = False
+
+    def select_subprotocol(self, subprotocols):
+        """Use binary messages if the client asks for them, otherwise JSON"""
+        if BINARY_SUBPROTOCOL in subprotocols:
+            self.binary = True
+            return BINARY_SUBPROTOCOL
 
     def on_message(self, message):
         """
         Pass on received message to Process
 
         Args:
-            message(str): Received message
+            message(str or bytes): Received JSON text or binary message
         """
 
-        d = json.loads(message, object_pairs_hook=OrderedDict)
+        start = tracer.now()
+        if self.servercomms.lazy:
+            # Only decode what is needed to route the request, leaving any
+            # payload until the Block uses it
+            if isinstance(message, bytes):
+                d = binaryencoding.loads_lazy(message, LAZY_KEYS)
+            else:
+                d = jsonencoding.loads_lazy(message, LAZY_KEYS)
+            for k in LAZY_KEYS:
+                if k in d:
+                    d[k] = Deferred(d[k])
+        elif isinstance(message, bytes):
+            d = binaryencoding.loads(message)
+        else:
+            d = json.loads(message, object_pairs_hook=OrderedDict)
         request = Serializable.from_dict(d)
         request.context = self
+        tracer.complete("decode", request, start)
         self.servercomms.on_request(request)
 
+    def on_close(self):
+        """Tell the server that this client has gone away"""
+        self.servercomms.on_close(self)
+
 
 class WSServerComms(ServerComms):
     """A class for communication between browser and server"""
 
-    def __init__(self, name, process, port):
+    def __init__(self, name, process, port, lazy=True):
+        """
+        Args:
+            name (str): Logger name
+            process (Process): The Process to send requests to
+            port (int): The port to listen for websocket connections on
+            lazy (bool): If True then the value of a Put and the parameters
+                of a Post are only decoded when the Block uses them
+        """
         super(WSServerComms, self).__init__(name, process)
 
         self.name = name
         self.process = process
+        self.lazy = lazy
+        # binary -> (encoding_key, prefix, suffix, attachments) of the last
+        # shared response encoded that way
+        self._last_frames = {}
 
         MalcolmWebSocketHandler.servercomms = self
 
@@ -53,9 +98,59 @@ class WSServerComms(ServerComms):
             response(Response): The message to pass to the client
         """
 
-        message = json.dumps(response.to_dict())
+        binary = response.context.binary
+        message = self.encode_response(response, binary)
         self.log_debug("Sending to client %s", message)
-        response.context.write_message(message)
+        response.context.write_message(message, binary=binary)
+
+    def encode_response(self, response, binary=False):
+        """Serialize a response to JSON, or msgpack if binary. If it shares an
+        encoding_key with the last response encoded the same way then only
+        its id is encoded, and is spliced into the frame made for that
+        response
+
+        Args:
+            response(Response): The message to encode
+            binary(bool): Whether to make a binary message
+
+        Returns:
+            str or bytes: The JSON or binary message
+        """
+        key = response.encoding_key
+        if key is None:
+            if binary:
+                return binaryencoding.dumps(response.to_dict())
+            else:
+                return self._json_dumps(response.to_dict())
+        last_key, prefix, suffix, attachments = self._last_frames.get(
+            binary, (None, None, None, None))
+        if key is not last_key:
+            # to_dict gives typeid, id, then the rest of the endpoints
+            d = response.to_dict()
+            d.pop("typeid")
+            d.pop("id")
+            if binary:
+                attachments = binaryencoding.Attachments()
+                pack = binaryencoding.pack
+                map_header = binaryencoding.pack_map_header
+                prefix = map_header(len(d) + 2) + pack("typeid", attachments) \
+                    + pack(response.typeid, attachments) \
+                    + pack("id", attachments)
+                suffix = pack(d, attachments)[len(map_header(len(d))):]
+            else:
+                prefix = '{"typeid": %s, "id": ' % json.dumps(response.typeid)
+                suffix = ', ' + self._json_dumps(d)[1:]
+            self._last_frames[binary] = (key, prefix, suffix, attachments)
+        if binary:
+            body = prefix + binaryencoding.pack(response.id_, attachments) + \
+                suffix
+            return binaryencoding.frame(body, attachments)
+        else:
+            return prefix + json.dumps(response.id_) + suffix
+
+    @staticmethod
+    def _json_dumps(o):
+        return json.dumps(o, default=serialize_hook)
 
     def on_request(self, request):
         """
@@ -70,8 +165,18 @@ class WSServerComms(ServerComms):
                 request.endpoint[0] == ".":
             # We're talking about the process block, so fill in the right name
             request.endpoint[0] = self.process.name
+        tracer.instant("enqueue", request)
         self.process.q.put(request)
 
+    def on_close(self, context):
+        """
+        Remove any subscriptions made by a client that has gone away
+
+        Args:
+            context (MalcolmWebSocketHandler): The closed connection
+        """
+        self.process.unsubscribe_all(self.q, context)
+
     def stop_recv_loop(self):
         # This is the only thing that is safe to do from outside the IOLoop
         # thread
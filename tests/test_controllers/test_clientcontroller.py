@@ -14,8 +14,11 @@ from mock import MagicMock, patch, call
 
 # module imports
 from malcolm.controllers import ClientController, HelloController
+from malcolm.core.attribute import Attribute
 from malcolm.core.block import Block
-from malcolm.vmetas import StringMeta
+from malcolm.core.table import Table
+from malcolm.vmetas import StringMeta, StringArrayMeta, NumberArrayMeta, \
+    TableMeta
 from malcolm.compat import queue
 
 class TestClientController(unittest.TestCase):
@@ -29,7 +32,7 @@ class TestClientController(unittest.TestCase):
         self.b = Block()
         self.b.name = "blockname"
         self.p = MagicMock()
-        self.comms = MagicMock()
+        self.comms = MagicMock(rows=True)
         self.cc = ClientController(self.p, self.b, "blockname")
         # get process to give us comms
         self.p.get_client_comms.return_value = self.comms
@@ -37,7 +40,8 @@ class TestClientController(unittest.TestCase):
         response = MagicMock(id_=self.cc.REMOTE_BLOCKS_ID, value=["blockname"])
         self.cc.put(response)
         # tell our controller the serialized state of the block
-        response = MagicMock(id_=self.cc.BLOCK_ID, changes=[[[], self.serialized]])
+        response = MagicMock(
+            id_=self.cc.BLOCK_ID, changes=[[[], self.serialized]], seq=None)
         self.cc.put(response)
 
     def test_init(self):
@@ -53,6 +57,29 @@ class TestClientController(unittest.TestCase):
         self.assertEqual(req.delta, True)
         self.assertEqual(req.response_queue, self.cc)
         self.assertEqual(req.endpoint, ["blockname"])
+        self.assertEqual(req.seq, None)
+        self.assertEqual(req.rows, True)
+
+    def test_subscribe_to_older_server(self):
+        self.comms.rows = False
+        response = MagicMock(id_=self.cc.REMOTE_BLOCKS_ID, value=["blockname"])
+        self.cc.put(response)
+        req = self.comms.q.put.call_args[0][0]
+        self.assertEqual(req.rows, False)
+        d = req.to_dict()
+        self.assertNotIn("rows", d)
+        self.assertNotIn("seq", d)
+
+    def test_resubscribe_resumes_from_seq(self):
+        response = MagicMock(
+            id_=self.cc.BLOCK_ID, changes=[[["substructure"], "change"]],
+            seq=5)
+        self.b.update = MagicMock()
+        self.cc.put(response)
+        response = MagicMock(id_=self.cc.REMOTE_BLOCKS_ID, value=["blockname"])
+        self.cc.put(response)
+        req = self.comms.q.put.call_args[0][0]
+        self.assertEqual(req.seq, 5)
 
     def test_methods_created(self):
         self.assertEqual(list(self.b.methods), ["disable", "reset", "say_hello"])
@@ -81,6 +108,28 @@ class TestClientController(unittest.TestCase):
         self.cc.put(response)
         self.b.update.assert_called_once_with([["substructure"], "change"])
 
+    def test_put_rows_response(self):
+        meta = TableMeta()
+        elements = OrderedDict()
+        elements["e1"] = NumberArrayMeta("int32")
+        elements["e2"] = StringArrayMeta()
+        meta.set_elements(elements)
+        attr = Attribute(meta)
+        attr.set_value(Table.from_columns(meta, [[0, 1], ["a", "b"]]))
+        self.b.add_attribute("table", attr)
+        attr.on_changed = MagicMock()
+        response = MagicMock(
+            id_=self.cc.BLOCK_ID,
+            changes=[[["table", "value"], "rows", 2, 2,
+                      OrderedDict([("e1", [2]), ("e2", ["c"])])]])
+        self.b.update = MagicMock()
+        self.cc.put(response)
+        self.b.update.assert_not_called()
+        self.assertEqual(list(attr.value.e1), [0, 1, 2])
+        self.assertEqual(attr.value.e2, ["a", "b", "c"])
+        change = attr.on_changed.call_args[0][0]
+        self.assertEqual(change[:4], [["value"], "rows", 2, 2])
+
     def test_put_root_update_response(self):
         attr1 = StringMeta("dummy")
         attr2 = StringMeta("dummy2")
@@ -56,8 +56,7 @@ class TestScanPointTickerController(unittest.TestCase):
         self.assertEqual(params.exposure, sptc.exposure.value)
         block.notify_subscribers.assert_called_once_with()
 
-    @patch("time.sleep")
-    def test_run(self, sleep_mock):
+    def test_run(self):
         points = [MagicMock(positions=dict(x=i)) for i in range(3)]
         params = MagicMock()
         with patch("malcolm.vmetas.pointgeneratormeta.CompoundGenerator",
@@ -72,13 +71,45 @@ class TestScanPointTickerController(unittest.TestCase):
 
         sptc.configure(params)
         block.reset_mock()
-        sptc.run()
+        delays = list(sptc.run.Method.func())
 
         self.assertEquals([call(i) for i in range(3)],
                           sptc.value.set_value.call_args_list)
-        self.assertEquals([call(params.exposure)] * len(points),
-                          sleep_mock.call_args_list)
+        self.assertEquals([params.exposure] * len(points), delays)
         self.assertEqual([call()] * 3, block.notify_subscribers.call_args_list)
 
+    @patch("time.sleep")
+    def test_run_called_directly_sleeps(self, sleep_mock):
+        points = [MagicMock(positions=dict(x=i)) for i in range(3)]
+        block = MagicMock()
+        sptc = ScanPointTickerController(MagicMock(), block, 'block')
+        sptc.generator.value = MagicMock()
+        sptc.generator.value.iterator.return_value = points
+        sptc.axis_name.set_value("x")
+        sptc.exposure.set_value(0.1)
+
+        sptc.run()
+
+        self.assertEquals(2, sptc.value.value)
+        self.assertEquals([call(0.1)] * len(points),
+                          sleep_mock.call_args_list)
+
+    @patch("time.sleep")
+    def test_run_method_sleeps(self, sleep_mock):
+        points = [MagicMock(positions=dict(x=i)) for i in range(3)]
+        block = MagicMock()
+        sptc = ScanPointTickerController(MagicMock(), block, 'block')
+        sptc.generator.value = MagicMock()
+        sptc.generator.value.iterator.return_value = points
+        sptc.axis_name.set_value("x")
+        sptc.exposure.set_value(0.1)
+
+        sptc.run.Method.call_function({})
+
+        self.assertEquals(2, sptc.value.value)
+        self.assertEquals([call(0.1)] * len(points),
+                          sleep_mock.call_args_list)
+
+
 if __name__ == "__main__":
     unittest.main(verbosity=2)
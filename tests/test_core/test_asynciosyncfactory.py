@@ -0,0 +1,108 @@
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+import setup_malcolm_paths
+
+import threading
+import time
+import unittest
+from mock import MagicMock
+
+from malcolm.compat import queue
+from malcolm.core.syncfactory import QueueLoop
+
+if sys.version_info >= (3, 5):
+    import asyncio
+    # module imports
+    from malcolm.core.asynciosyncfactory import AsyncioSyncFactory
+    from malcolm.core.process import Process, BlockAdd
+    from malcolm.core.request import Post
+
+
+@unittest.skipIf(sys.version_info < (3, 5), "asyncio needs python 3.5")
+class TestAsyncioSyncFactory(unittest.TestCase):
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.s = AsyncioSyncFactory("sched", loop=self.loop, pool_size=2)
+        self.thread = threading.Thread(target=self.loop.run_forever)
+        self.thread.start()
+
+    def tearDown(self):
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+        self.s.executor.shutdown()
+
+    def test_in_loop(self):
+        self.assertFalse(self.s.in_loop())
+
+    def test_spawn_coroutine(self):
+        f = self.s.spawn(asyncio.sleep, 0.01, "result")
+        f.wait(timeout=1)
+        self.assertTrue(f.ready())
+        self.assertEqual(f.get(), "result")
+
+    def test_spawn_blocking(self):
+        f = self.s.spawn(time.sleep, 0.01)
+        self.assertEqual(self.s.busy, 1)
+        f.wait(timeout=1)
+        self.assertTrue(f.ready())
+        self.assertEqual(self.s.busy, 0)
+
+    def test_queue_get(self):
+        q = self.s.create_queue()
+        q.put(32)
+        self.assertEqual(q.get(timeout=1), 32)
+        self.assertRaises(queue.Empty, q.get, timeout=0.01)
+
+    def test_queue_get_nowait_from_thread(self):
+        q = self.s.create_queue()
+        self.assertRaises(queue.Empty, q.get, block=False)
+        q.put(32)
+        self.assertEqual(q.get(block=False), 32)
+        self.assertRaises(queue.Empty, q.get_nowait)
+
+    def test_queue_loop(self):
+        q = self.s.create_queue()
+        handled = []
+        threads = []
+
+        def handle(item):
+            handled.append(item)
+            threads.append(self.s.in_loop())
+            return item is not None
+
+        f = self.s.spawn(QueueLoop(q, handle))
+        for i in range(250):
+            q.put(i)
+        q.put(None)
+        f.wait(timeout=1)
+        self.assertTrue(f.ready())
+        self.assertEqual(handled, list(range(250)) + [None])
+        self.assertTrue(all(threads))
+
+    def test_queue_loop_services_timers(self):
+        q = self.s.create_queue()
+        timers = MagicMock(side_effect=[0.01, None])
+        f = self.s.spawn(QueueLoop(q, lambda item: False, timers))
+        time.sleep(0.05)
+        q.put(None)
+        f.wait(timeout=1)
+        self.assertTrue(f.ready())
+        self.assertEqual(timers.call_count, 2)
+
+    def test_process(self):
+        p = Process("proc", self.s)
+        b = MagicMock()
+        b.name = "myblock"
+        p._handle_block_add(BlockAdd(b))
+        p.start()
+        request = Post(MagicMock(), MagicMock(), ["myblock", "foo"])
+        p.q.put(request)
+        p.stop(timeout=1)
+        b.handle_request.assert_called_once_with(request)
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
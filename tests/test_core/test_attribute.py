@@ -10,7 +10,9 @@ from mock import Mock, patch
 
 from malcolm.core.attribute import Attribute
 from malcolm.core.serializable import Serializable
-from malcolm.vmetas import StringMeta
+from malcolm.core.table import Table
+from malcolm.vmetas import StringMeta, StringArrayMeta, NumberArrayMeta, \
+    TableMeta
 
 
 class TestAttribute(unittest.TestCase):
@@ -39,6 +41,48 @@ class TestAttribute(unittest.TestCase):
         self.assertEquals(a.value, value)
         a.on_changed.assert_called_once_with([['value'], value], True)
 
+    def test_set_table_value_reports_rows(self):
+        meta = TableMeta()
+        elements = OrderedDict()
+        elements["e1"] = NumberArrayMeta("int32")
+        elements["e2"] = StringArrayMeta()
+        meta.set_elements(elements)
+        a = Attribute(meta)
+        t = Table.from_columns(meta, [[0, 1], ["a", "b"]])
+        a.set_value(t)
+        a.on_changed = Mock(wrap=a.on_changed)
+        # nothing changed
+        a.set_value(t)
+        a.on_changed.assert_not_called()
+        t[0] = [5, "x"]
+        t.append([2, "c"])
+        a.set_value(t, notify=False)
+        self.assertEqual(a.on_changed.call_count, 2)
+        (path, rows, start, stop, columns), notify = \
+            a.on_changed.call_args_list[0][0]
+        self.assertEqual([path, rows, start, stop, notify],
+                         [["value"], "rows", 0, 1, False])
+        self.assertEqual(list(columns["e1"]), [5])
+        self.assertEqual(columns["e2"], ["x"])
+        change, notify = a.on_changed.call_args_list[1][0]
+        self.assertEqual(change[:4], [["value"], "rows", 2, 2])
+        self.assertFalse(notify)
+        self.assertEqual(a.to_dict()["value"]["e2"], ["x", "b", "c"])
+        # a new Table is reported whole
+        a.on_changed.reset_mock()
+        t2 = Table.from_columns(meta, [[3], ["d"]])
+        t2.append([4, "e"])
+        a.set_value(t2)
+        self.assertEqual(a.on_changed.call_count, 1)
+        (path, value), notify = a.on_changed.call_args[0]
+        self.assertEqual([path, list(value["e1"]), notify],
+                         [["value"], [3, 4], True])
+        # as is one with a column set
+        t2.e1 = [6, 7]
+        a.set_value(t2)
+        self.assertEqual(a.on_changed.call_args[0][0][1]["typeid"],
+                         "malcolm:core/Table:1.0")
+
     def test_put(self):
         func = Mock()
         value = "test_value"
@@ -67,5 +111,16 @@ class TestSerialization(unittest.TestCase):
         self.assertEquals(a.meta.to_dict(), StringMeta("desc").to_dict())
         self.assertEquals(a.value, "some string")
 
+    @patch("malcolm.core.monitorable.serialize_object")
+    def test_from_dict_does_not_report_changes(self, serialize_mock):
+        a = Serializable.from_dict(self.serialized)
+        serialize_mock.assert_not_called()
+        self.assertEquals(a.to_dict(), self.serialized)
+        # but changes made afterwards are
+        a.on_changed = Mock()
+        a.set_value("other")
+        a.on_changed.assert_called_once_with(
+            [["value"], serialize_mock.return_value], True)
+
 if __name__ == "__main__":
     unittest.main(verbosity=2)
@@ -4,6 +4,7 @@ sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
 import setup_malcolm_paths
 
 from collections import OrderedDict
+import json
 
 import unittest
 from mock import MagicMock, call, patch
@@ -12,8 +13,8 @@ from mock import MagicMock, call, patch
 from malcolm.core.block import Block
 from malcolm.core.attribute import Attribute
 from malcolm.vmetas import StringMeta
-from malcolm.core.method import Method
-from malcolm.core.request import Post, Put
+from malcolm.core.method import Method, SteppedCall
+from malcolm.core.request import Post, Put, Deferred
 
 
 class TestBlock(unittest.TestCase):
@@ -138,6 +139,43 @@ class TestToDict(unittest.TestCase):
         m2.to_dict.assert_called_once_with()
         self.assertEqual(expected_dict, response)
 
+    def make_block(self):
+        block = Block()
+        block.set_parent(MagicMock(), "block")
+        for name in ("attr_one", "attr_two"):
+            block.add_attribute(name, Attribute(StringMeta()))
+        return block
+
+    def test_dict_reused_until_changed(self):
+        block = self.make_block()
+        d = block.to_dict()
+        self.assertIs(block.to_dict(), d)
+        block.attr_one.set_value("new")
+        new = block.to_dict()
+        self.assertIsNot(new, d)
+        self.assertEqual(new["attr_one"]["value"], "new")
+        self.assertEqual(d["attr_one"]["value"], None)
+        # only the changed branch was rebuilt
+        self.assertIsNot(new["attr_one"], d["attr_one"])
+        self.assertIs(new["attr_one"]["meta"], d["attr_one"]["meta"])
+        self.assertIs(new["attr_two"], d["attr_two"])
+
+    def test_dict_rebuilt_when_children_change(self):
+        block = self.make_block()
+        d = block.to_dict()
+        block.add_attribute("attr_three", Attribute(StringMeta()))
+        self.assertIn("attr_three", block.to_dict())
+        block.replace_children(OrderedDict())
+        self.assertEqual(list(block.to_dict()), ["typeid"])
+        self.assertNotIn("attr_three", d)
+
+    def test_overrides_not_cached(self):
+        block = self.make_block()
+        attr = block.attr_one
+        d = attr.to_dict(value="override")
+        self.assertEqual(d["value"], "override")
+        self.assertEqual(attr.to_dict()["value"], None)
+
 
 class TestHandleRequest(unittest.TestCase):
 
@@ -159,7 +197,7 @@ class TestHandleRequest(unittest.TestCase):
         self.method.get_response.assert_called_once_with(request)
         response = self.method.get_response.return_value
         self.block.parent.block_respond.assert_called_once_with(
-            response, request.response_queue)
+            response, request.response_queue, "TestBlock")
 
     def test_given_put_then_update_attribute(self):
         endpoint = ["TestBlock", "test_attribute", "value"]
@@ -176,6 +214,81 @@ class TestHandleRequest(unittest.TestCase):
         response_queue = self.block.parent.block_respond.call_args[0][1]
         self.assertEqual(request.response_queue, response_queue)
 
+    def test_stepped_call_responds_when_finished(self):
+        endpoint = ["TestBlock", "get_things"]
+        request = Post(MagicMock(), MagicMock(), endpoint)
+        call = MagicMock(
+            spec=SteppedCall, request=request, response="r", progress=None)
+        call.step.side_effect = [False, True]
+        self.method.get_response.return_value = call
+        self.block.lock = MagicMock()
+
+        self.assertIs(self.block.handle_request(request), call)
+        self.block.parent.block_respond.assert_not_called()
+        self.assertEqual(self.block.lock.__exit__.call_count, 1)
+
+        self.assertIsNone(self.block.resume(call))
+        self.block.parent.block_respond.assert_called_once_with(
+            call.response, request.response_queue, "TestBlock")
+        self.assertEqual(self.block.lock.__exit__.call_count, 2)
+
+    def test_stepped_call_progress_sent_before_return(self):
+        endpoint = ["TestBlock", "get_things"]
+        request = Post(MagicMock(), MagicMock(), endpoint, stream=True)
+        stepped = MagicMock(
+            spec=SteppedCall, request=request, response="r", progress="p")
+        stepped.step.return_value = True
+        self.method.get_response.return_value = stepped
+
+        self.assertIsNone(self.block.handle_request(request))
+        self.assertEqual(self.block.parent.block_respond.call_args_list, [
+            call("p", request.response_queue, "TestBlock"),
+            call("r", request.response_queue, "TestBlock")])
+
+    def test_put_malformed_value_responds_with_error(self):
+        endpoint = ["TestBlock", "test_attribute", "value"]
+        malformed = Deferred(lambda: json.loads('{"a" 1}'))
+        request = Put(MagicMock(), MagicMock(), endpoint, malformed)
+        request.set_id(5)
+
+        self.block.handle_request(request)
+
+        self.attribute.put.assert_not_called()
+        self.attribute.set_value.assert_not_called()
+        response, response_queue, name = \
+            self.block.parent.block_respond.call_args[0]
+        self.assertEqual("malcolm:core/Error:1.0", response.typeid)
+        self.assertEqual(response.id_, 5)
+        self.assertIn("Could not decode Put value", response.message)
+        self.assertEqual(request.response_queue, response_queue)
+
+    def test_post_malformed_parameters_responds_with_error(self):
+        method = Method("say_hello")
+        method.set_function(MagicMock())
+        self.block.add_method("say_hello", method)
+        endpoint = ["TestBlock", "say_hello"]
+        malformed = Deferred(lambda: json.loads('{"a" 1}'))
+        request = Post(MagicMock(), MagicMock(), endpoint, malformed)
+        request.set_id(6)
+
+        self.block.handle_request(request)
+
+        method.func.assert_not_called()
+        response = self.block.parent.block_respond.call_args[0][0]
+        self.assertEqual("malcolm:core/Error:1.0", response.typeid)
+        self.assertEqual(response.id_, 6)
+
+    @patch("malcolm.core.block.tracer")
+    def test_lock_traced(self, tracer_mock):
+        endpoint = ["TestBlock", "get_things"]
+        request = Post(MagicMock(), MagicMock(), endpoint)
+
+        self.block.handle_request(request)
+
+        tracer_mock.complete.assert_has_calls([
+            call("lock wait", request, tracer_mock.now.return_value),
+            call("lock held", request, tracer_mock.now.return_value)])
+
     def test_invalid_request_fails(self):
         request = MagicMock()
         request.type_ = "Get"
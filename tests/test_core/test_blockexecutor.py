@@ -0,0 +1,108 @@
+import os
+import sys
+import unittest
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+# import logging
+# logging.basicConfig(level=logging.DEBUG)
+
+import setup_malcolm_paths
+from mock import MagicMock
+
+# module imports
+from malcolm.core.blockexecutor import BlockExecutor
+from malcolm.core.method import SteppedCall
+
+
+class TestBlockExecutor(unittest.TestCase):
+
+    def setUp(self):
+        self.s = MagicMock()
+        self.block = MagicMock()
+        self.e = BlockExecutor("executor", self.s, self.block, max_queue=2)
+
+    def test_submit_spawns_one_worker(self):
+        self.assertTrue(self.e.submit("r1"))
+        self.assertTrue(self.e.submit("r2"))
+        self.s.spawn.assert_called_once_with(self.e._work)
+        self.assertEqual(self.e._workers, [self.s.spawn.return_value])
+
+    def test_submit_rejects_when_full(self):
+        self.assertTrue(self.e.submit("r1"))
+        self.assertTrue(self.e.submit("r2"))
+        self.assertFalse(self.e.submit("r3"))
+        self.assertEqual(list(self.e._requests), ["r1", "r2"])
+
+    def test_work_drains_queue(self):
+        self.e.submit("r1")
+        self.e.submit("r2")
+        self.e._work()
+        self.assertEqual(
+            [c[0][0] for c in self.block.handle_request.call_args_list],
+            ["r1", "r2"])
+        self.assertEqual(self.e._running, 0)
+        # next submit needs a new worker
+        self.e.submit("r3")
+        self.assertEqual(self.s.spawn.call_count, 2)
+
+    def test_work_logs_exceptions(self):
+        self.e.log_exception = MagicMock()
+        self.block.handle_request.side_effect = [ValueError("bad"), None]
+        self.e.submit("r1")
+        self.e.submit("r2")
+        self.e._work()
+        self.e.log_exception.assert_called_once_with(
+            "Exception while handling %s", "r1")
+        self.assertEqual(self.block.handle_request.call_count, 2)
+
+    def test_finished_workers_reaped(self):
+        finished = MagicMock()
+        finished.ready.return_value = True
+        self.s.spawn.return_value = finished
+        self.e.submit("r1")
+        self.e._work()
+        running = MagicMock()
+        running.ready.return_value = False
+        self.s.spawn.return_value = running
+        self.e.submit("r2")
+        self.assertEqual(self.e._workers, [running])
+
+    def test_stepped_call_requeued_behind_requests(self):
+        call = MagicMock(spec=SteppedCall, delay=None)
+        self.block.handle_request.side_effect = [call, None]
+        self.block.resume.return_value = None
+        self.e.submit("r1")
+        self.e.submit("r2")
+        self.e._work()
+        self.assertEqual(
+            [c[0][0] for c in self.block.handle_request.call_args_list],
+            ["r1", "r2"])
+        self.block.resume.assert_called_once_with(call)
+        self.assertEqual(self.e._running, 0)
+
+    def test_stepped_call_waits_on_call_later(self):
+        call_later = MagicMock()
+        self.e = BlockExecutor("executor", self.s, self.block, max_queue=2,
+                               call_later=call_later)
+        call = MagicMock(spec=SteppedCall, delay=0.5)
+        self.block.handle_request.return_value = call
+        self.e.submit("r1")
+        self.e._work()
+        call_later.assert_called_once_with(0.5, self.e.resume, call)
+        self.block.resume.assert_not_called()
+        self.assertEqual(self.e._running, 0)
+        # resume queues it even if the queue is full
+        self.e.submit("r2")
+        self.e.submit("r3")
+        self.e.resume(call)
+        self.assertEqual(list(self.e._requests), ["r2", "r3", call])
+
+    def test_wait(self):
+        self.e.submit("r1")
+        self.e.wait(timeout=1)
+        self.s.spawn.return_value.wait.assert_called_once_with(timeout=1)
+        self.assertEqual(self.e._workers, [])
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
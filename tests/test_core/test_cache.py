@@ -10,6 +10,8 @@ sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
 import setup_malcolm_paths
 from mock import MagicMock
 
+import numpy as np
+
 # module imports
 from malcolm.core.cache import Cache
 
@@ -43,5 +45,61 @@ class TestProcess(unittest.TestCase):
         walked = c.walk_path([1, 2, 3])
         self.assertEqual(walked, "end")
 
+    def test_update_does_not_modify_walked_structure(self):
+        c = Cache()
+        c.delta_update([["block"], {"a": {"value": 1}, "b": {"value": 2}}])
+        block = c.walk_path(["block"])
+        a = c.walk_path(["block", "a"])
+        c.delta_update([["block", "a", "value"], 3])
+        c.delta_update([["block", "b"]])
+        self.assertEqual(block, {"a": {"value": 1}, "b": {"value": 2}})
+        self.assertEqual(a, {"value": 1})
+        self.assertEqual(c["block"], {"a": {"value": 3}})
+
+    def test_update_shares_untouched_structure(self):
+        c = Cache()
+        c.delta_update([["block"], {"a": {"value": 1}, "b": {"value": 2}}])
+        b = c.walk_path(["block", "b"])
+        c.delta_update([["block", "a", "value"], 3])
+        self.assertIs(c.walk_path(["block", "b"]), b)
+        self.assertIsInstance(c["block"], dict)
+
+    def test_rows(self):
+        c = Cache()
+        table = OrderedDict(typeid="malcolm:core/Table:1.0")
+        table["e1"] = np.array([0, 1, 2], dtype=np.int32)
+        table["e2"] = ["a", "b", "c"]
+        c.delta_update([["block"], {"t": {"value": table}}])
+        walked = c.walk_path(["block", "t", "value"])
+        c.delta_update([["block", "t", "value"], "rows", 1, 2,
+                        {"e1": [7, 8], "e2": ["x", "y"]}])
+        c.delta_update([["block", "t", "value"], "rows", 0, 1,
+                        {"e1": [], "e2": []}])
+        value = c.walk_path(["block", "t", "value"])
+        self.assertEqual(value["typeid"], "malcolm:core/Table:1.0")
+        self.assertEqual(value["e1"].dtype, np.int32)
+        self.assertEqual(list(value["e1"]), [7, 8, 2])
+        self.assertEqual(value["e2"], ["x", "y", "c"])
+        self.assertEqual(list(walked["e1"]), [0, 1, 2])
+        self.assertEqual(walked["e2"], ["a", "b", "c"])
+        self.assertRaises(IndexError, c.delta_update, [
+            ["block", "t", "value"], "rows", 2, 4, {"e1": [], "e2": []}])
+
+    def test_rows_of_column(self):
+        c = Cache()
+        c.delta_update([["e2"], ["a", "b"]])
+        c.delta_update([["e2"], "rows", 2, 2, ["c"]])
+        self.assertEqual(c["e2"], ["a", "b", "c"])
+
+    def test_snapshot(self):
+        c = Cache()
+        c["block"] = {"value": 1}
+        snapshot = c.walk_path([])
+        self.assertEqual(snapshot, c.snapshot())
+        c.delta_update([["block", "value"], 2])
+        c.delta_update([["other"], {}])
+        self.assertEqual(snapshot, {"block": {"value": 1}})
+        self.assertEqual(list(c), ["block", "other"])
+
 if __name__ == "__main__":
     unittest.main()
@@ -69,10 +69,13 @@ class TestController(unittest.TestCase):
 
     def test_transition(self):
         self.c.reset()
-        self.b.busy.set_value.assert_has_calls([call(True), call(False)])
-        self.b.state.set_value.assert_has_calls([call("Resetting"), call("Ready")])
+        self.b.busy.set_value.assert_has_calls([
+            call(True, notify=False), call(False, notify=False)])
+        self.b.state.set_value.assert_has_calls([
+            call("Resetting", notify=False), call("Ready", notify=False)])
         self.b.status.set_value.assert_has_calls([
-            call("Resetting"), call("Done resetting")])
+            call("Resetting", notify=False),
+            call("Done resetting", notify=False)])
         self.c.disable()
         self.assertEqual(self.c.state.value, "Disabled")
 
@@ -87,10 +90,12 @@ class TestController(unittest.TestCase):
         self.c.Resetting = MagicMock()
         self.c.Resetting.run.side_effect = ValueError("boom")
         self.c.reset()
-        self.b.busy.set_value.assert_has_calls([call(True), call(False)])
-        self.b.state.set_value.assert_has_calls([call("Resetting"), call("Fault")])
+        self.b.busy.set_value.assert_has_calls([
+            call(True, notify=False), call(False, notify=False)])
+        self.b.state.set_value.assert_has_calls([
+            call("Resetting", notify=False), call("Fault", notify=False)])
         self.b.status.set_value.assert_has_calls([
-            call("Resetting"), call("boom")])
+            call("Resetting", notify=False), call("boom", notify=False)])
 
 
     def test_set_writeable_methods(self):
@@ -0,0 +1,73 @@
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+import setup_malcolm_paths
+
+import unittest
+from mock import MagicMock
+
+# module imports
+from malcolm.core.lanequeue import LaneQueue
+from malcolm.compat import queue
+
+
+class TestLaneQueue(unittest.TestCase):
+
+    def setUp(self):
+        # items are (lane, name)
+        self.q = LaneQueue(
+            queue.Queue(), MagicMock(), lambda item: item[0], 3, max_wait=3)
+
+    def get_all(self):
+        items = []
+        while self.q.qsize():
+            items.append(self.q.get(timeout=0)[1])
+        return items
+
+    def test_lanes_in_priority_order(self):
+        for item in [(2, "c1"), (1, "b1"), (2, "c2"), (0, "a1"), (1, "b2")]:
+            self.q.put(item)
+        self.assertEqual(self.q.qsize(), 5)
+        self.assertEqual(self.q.lane_sizes(), [1, 2, 2])
+        self.assertEqual(self.get_all(), ["a1", "b1", "b2", "c1", "c2"])
+
+    def test_doorbell_rung_per_put(self):
+        doorbell = MagicMock()
+        q = LaneQueue(doorbell, MagicMock(), lambda item: 0, 1)
+        q.put("item")
+        doorbell.put.assert_called_once_with(None)
+        self.assertEqual(q.get(timeout=0.1), "item")
+        doorbell.get.assert_called_once_with(True, 0.1)
+
+    def test_empty(self):
+        self.assertRaises(queue.Empty, self.q.get, timeout=0)
+        self.assertRaises(queue.Empty, self.q.get_nowait)
+
+    def test_lower_lane_not_starved(self):
+        self.q.put((2, "c1"))
+        for i in range(6):
+            self.q.put((0, "a%d" % i))
+        # c1 overtaken by max_wait newer items from a higher lane, then taken
+        self.assertEqual(
+            self.get_all(), ["a0", "a1", "a2", "c1", "a3", "a4", "a5"])
+
+    def test_starved_item_does_not_overtake_older(self):
+        for i in range(5):
+            self.q.put((0, "a%d" % i))
+        self.q.put((2, "c1"))
+        self.q.put((0, "a5"))
+        # c1 has been waiting max_wait gets, but only overtakes newer items
+        self.assertEqual(
+            self.get_all(), ["a0", "a1", "a2", "a3", "a4", "c1", "a5"])
+
+    def test_oldest_starved_lane_first(self):
+        self.q.put((2, "c1"))
+        self.q.put((1, "b1"))
+        for i in range(4):
+            self.q.put((0, "a%d" % i))
+        self.assertEqual(
+            self.get_all(), ["a0", "a1", "a2", "c1", "b1", "a3"])
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
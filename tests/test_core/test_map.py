@@ -207,5 +207,41 @@ class TestMap(unittest.TestCase):
         m.a = 1
         self.assertEqual({("a", 1), ("b", 2)}, set(m.items()))
 
+    def test_iteration_in_meta_order(self):
+        meta = Meta()
+        meta.elements = OrderedDict((k, StringMeta()) for k in "dcba")
+        m = Map(meta)
+        for k in "abc":
+            m[k] = k
+        self.assertEqual(["c", "b", "a"], list(m))
+        self.assertEqual([("c", "c"), ("b", "b"), ("a", "a")], m.items())
+        del m["b"]
+        self.assertEqual(["c", "a"], m.keys())
+        self.assertEqual(2, len(m))
+
+    def test_values_not_validated_again(self):
+        meta = MagicMock()
+        meta.elements = {"a": Mock(), "b": Mock()}
+        meta.elements["a"].validate.side_effect = lambda v: v
+        meta.elements["b"].validate.side_effect = lambda v: v
+        value = object()
+        m = Map(meta, {"a": value, "b": 2})
+        m["a"] = value
+        m.update(dict(a=value))
+        self.assertEqual(1, meta.elements["a"].validate.call_count)
+        # a Map for the same meta is copied as is
+        copied = Map(meta, m)
+        self.assertIs(value, copied.a)
+        self.assertEqual(1, meta.elements["a"].validate.call_count)
+        self.assertEqual(1, meta.elements["b"].validate.call_count)
+
+    def test_delattr(self):
+        m = Map(self.meta, {"a": "test"})
+        del m.a
+        self.assertNotIn("a", m)
+        with self.assertRaises(AttributeError):
+            del m.a
+
+
 if __name__ == "__main__":
     unittest.main(verbosity=2)
@@ -7,7 +7,8 @@ from collections import OrderedDict
 
 import unittest
 
-from malcolm.vmetas import StringArrayMeta
+from malcolm.vmetas import StringArrayMeta, NumberMeta, StringMeta
+from malcolm.core.map import Map
 from malcolm.core.mapmeta import MapMeta
 
 
@@ -59,5 +60,54 @@ class TestSerialization(unittest.TestCase):
         self.assertEquals(tm.required, ["c1"])
 
 
+class TestValidate(unittest.TestCase):
+
+    def setUp(self):
+        self.mm = MapMeta()
+        self.mm.set_elements(OrderedDict(
+            (("name", StringMeta()), ("sleep", NumberMeta("float64")))))
+        self.mm.set_required(["name"])
+
+    def test_casts_values(self):
+        m = self.mm.validate(dict(name="me", sleep=1))
+        self.assertIsInstance(m, Map)
+        self.assertIs(m.meta, self.mm)
+        self.assertEqual(m.keys(), ["name", "sleep"])
+        self.assertEqual(m.sleep, 1.0)
+        self.assertIsInstance(m.sleep, float)
+
+    def test_fills_defaults(self):
+        m = self.mm.validate(dict(name="me"), dict(sleep=2.0))
+        self.assertEqual(m, dict(name="me", sleep=2.0))
+        m = self.mm.validate(dict(name="me", sleep=1), dict(sleep=2.0))
+        self.assertEqual(m.sleep, 1.0)
+
+    def test_takes_validated_map(self):
+        m = Map(self.mm, dict(name="me"))
+        validated = self.mm.validate(m, dict(sleep=2.0))
+        self.assertEqual(validated, dict(name="me", sleep=2.0))
+        self.assertNotIn("sleep", m)
+
+    def test_raises_on_unknown_key(self):
+        with self.assertRaises(ValueError):
+            self.mm.validate(dict(name="me", bad=1))
+
+    def test_raises_on_missing_required(self):
+        with self.assertRaises(KeyError):
+            self.mm.validate(dict(sleep=1))
+
+    def test_remade_after_set_elements_and_required(self):
+        self.mm.validate(dict(name="me"))
+        self.mm.set_elements(dict(count=NumberMeta("int32")))
+        self.mm.set_required([])
+        m = self.mm.validate(dict(count=3))
+        self.assertEqual(m.count, 3)
+        with self.assertRaises(ValueError):
+            self.mm.validate(dict(name="me"))
+        self.mm.set_required(["count"])
+        with self.assertRaises(KeyError):
+            self.mm.validate(dict())
+
+
 if __name__ == "__main__":
     unittest.main(verbosity=2)
@@ -5,13 +5,14 @@ sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
 from collections import OrderedDict
 
 import unittest
-from mock import Mock, patch, MagicMock
+from mock import Mock, patch, MagicMock, call
 
-from malcolm.core.method import Method, takes, returns, only_in, OPTIONAL, \
-    REQUIRED
+from malcolm.core.method import Method, SteppedCall, takes, returns, \
+    only_in, OPTIONAL, REQUIRED
 
-from malcolm.vmetas import StringMeta
+from malcolm.vmetas import StringMeta, NumberMeta
 from malcolm.core.mapmeta import MapMeta
+from malcolm.core.request import Post
 
 
 class TestMethod(unittest.TestCase):
@@ -168,6 +169,111 @@ class TestMethod(unittest.TestCase):
         call_function_mock.assert_called_with({"first": 2})
         self.assertEquals({"output": 1}, response.value)
 
+    def make_generator_method(self, error=None):
+        @takes("count", NumberMeta("int32"), REQUIRED)
+        @returns("total", NumberMeta("int32"), REQUIRED)
+        def count(params, ret):
+            ret.total = 0
+            for i in range(params.count):
+                ret.total += i
+                yield 0.1
+            if error:
+                raise error
+
+        count.Method.set_function(count.steps)
+        count.Method.set_parent(MagicMock(), "count")
+        return count.Method
+
+    @patch("time.sleep")
+    def test_call_generator_function(self, sleep_mock):
+        m = self.make_generator_method()
+        ret = m.call_function(dict(count=3))
+        self.assertEqual(ret.total, 3)
+        self.assertEqual(sleep_mock.call_count, 3)
+
+    @patch("time.sleep")
+    def test_wrap_generator_function(self, sleep_mock):
+        def count(total):
+            for i in range(total):
+                yield 0.1
+            yield {"total": total}
+
+        wrapped = Method.wrap_method(count)
+        self.assertIs(wrapped.steps, count)
+        self.assertIsInstance(wrapped.Method, Method)
+        self.assertFalse(hasattr(count, "Method"))
+        self.assertEqual(wrapped.__name__, "count")
+        wrapped(2)
+        self.assertEqual(sleep_mock.call_args_list, [call(0.1)] * 2)
+
+    def test_get_response_steps_generator_function(self):
+        m = self.make_generator_method()
+        request = Mock(id_=123, context="ctx", parameters={"count": 2})
+        call = m.get_response(request)
+        self.assertIsInstance(call, SteppedCall)
+        self.assertFalse(call.step())
+        self.assertEqual(call.delay, 0.1)
+        self.assertFalse(call.step())
+        self.assertIsNone(call.response)
+        self.assertTrue(call.step())
+        self.assertEqual(call.response.typeid, "malcolm:core/Return:1.0")
+        self.assertEqual(call.response.id_, 123)
+        self.assertEqual(call.response.value.total, 1)
+
+    def test_stepped_call_error(self):
+        m = self.make_generator_method(error=ValueError("bad"))
+        request = Mock(id_=123, context="ctx", parameters={"count": 1})
+        call = m.get_response(request)
+        self.assertFalse(call.step())
+        self.assertTrue(call.step())
+        self.assertEqual(call.response.typeid, "malcolm:core/Error:1.0")
+        self.assertEqual(
+            call.response.message, "Method count raised an error: bad")
+
+    def make_streaming_method(self):
+        @returns("done", NumberMeta("int32"), REQUIRED,
+                 "total", NumberMeta("int32"), REQUIRED)
+        def count(ret):
+            ret.total = 0
+            for i in range(3):
+                ret.done = i + 1
+                ret.total += i
+                yield ret
+
+        count.Method.set_function(count.steps)
+        count.Method.set_parent(MagicMock(), "count")
+        return count.Method
+
+    def test_stepped_call_streams_deltas(self):
+        m = self.make_streaming_method()
+        request = Post(None, None, ["b", "count"], stream=True)
+        request.set_id(5)
+        call = m.get_response(request)
+        self.assertFalse(call.step())
+        self.assertIsNone(call.delay)
+        self.assertEqual(call.progress.typeid, "malcolm:core/Delta:1.0")
+        self.assertEqual(call.progress.id_, 5)
+        self.assertEqual(call.progress.changes, [[[], OrderedDict(
+            (("typeid", "malcolm:core/Map:1.0"), ("done", 1), ("total", 0)))]])
+        self.assertFalse(call.step())
+        self.assertEqual(call.progress.changes,
+                         [[["done"], 2], [["total"], 1]])
+        self.assertFalse(call.step())
+        self.assertEqual(call.progress.changes,
+                         [[["done"], 3], [["total"], 3]])
+        self.assertTrue(call.step())
+        self.assertIsNone(call.progress)
+        self.assertEqual(call.response.typeid, "malcolm:core/Return:1.0")
+        self.assertEqual(call.response.value, dict(done=3, total=3))
+
+    def test_stepped_call_without_stream_sends_no_deltas(self):
+        m = self.make_streaming_method()
+        request = Post(None, None, ["b", "count"])
+        call = m.get_response(request)
+        while not call.step():
+            self.assertIsNone(call.progress)
+        self.assertEqual(call.response.value, dict(done=3, total=3))
+
     def test_not_writeable_stops_call(self):
         m = Method("test_description")
         m.set_function(Mock())
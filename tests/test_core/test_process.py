@@ -8,15 +8,18 @@ from collections import OrderedDict
 # logging.basicConfig(level=logging.DEBUG)
 
 import unittest
-from mock import MagicMock, call
+from mock import MagicMock, call, patch
 
 # module imports
 from malcolm.core.process import \
-    Process, BlockChanged, BlockNotify, PROCESS_STOP, BlockAdd, BlockRespond, \
-    BlockList
+    Process, BlockChanges, PROCESS_STOP, BlockAdd, BlockRespond, BlockList, \
+    UnsubscribeAll, ProcessShard, CallLater, message_lane, CONTROL_LANE, \
+    REQUEST_LANE, CHANGES_LANE
+from malcolm.core.lanequeue import LaneQueue
+from malcolm.compat import queue
 from malcolm.core.syncfactory import SyncFactory
-from malcolm.core.request import Subscribe, Post, Get
-from malcolm.core.response import Return, Update, Delta
+from malcolm.core.request import Subscribe, Unsubscribe, Post, Get
+from malcolm.core.response import Return, Update, Delta, Error
 from malcolm.core.attribute import Attribute
 from malcolm.vmetas import StringArrayMeta
 
@@ -26,8 +29,30 @@ class TestProcess(unittest.TestCase):
     def test_init(self):
         s = MagicMock()
         p = Process("proc", s)
-        s.create_queue.assert_called_once_with()
-        self.assertEqual(p.q, s.create_queue.return_value)
+        s.create_lane_queue.assert_called_once_with(message_lane, 3)
+        self.assertEqual(p.q, s.create_lane_queue.return_value)
+
+    def test_message_lanes(self):
+        self.assertEqual(message_lane(Post(None, None, ["b"])), CONTROL_LANE)
+        self.assertEqual(message_lane(BlockAdd(None)), CONTROL_LANE)
+        self.assertEqual(message_lane(Get(None, None, ["b"])), REQUEST_LANE)
+        self.assertEqual(
+            message_lane(Subscribe(None, None, ["b"])), REQUEST_LANE)
+        self.assertEqual(message_lane(BlockChanges("b", [])), CHANGES_LANE)
+        self.assertEqual(message_lane(BlockRespond(None, None)), CONTROL_LANE)
+        self.assertEqual(message_lane(PROCESS_STOP), CHANGES_LANE)
+
+    def test_post_overtakes_changes(self):
+        s = SyncFactory("sched")
+        p = Process("proc", s)
+        # the process block
+        self.assertIsInstance(p.q.get(timeout=0), BlockAdd)
+        for i in range(10):
+            p.q.put(BlockChanges("myblock", []))
+        post = Post(MagicMock(), MagicMock(), ["myblock", "foo"])
+        p.q.put(post)
+        self.assertIs(p.q.get(timeout=0), post)
+        self.assertIsInstance(p.q.get(timeout=0), BlockChanges)
 
     def test_add_block(self):
         p = Process("proc", MagicMock())
@@ -83,6 +108,32 @@ class TestProcess(unittest.TestCase):
         self.assertEqual(p._other_spawned, [spawned])
         s.spawn.assert_called_once_with(callable, "fred", a=4)
 
+    def test_spawn_reaps_finished(self):
+        s = MagicMock()
+        p = Process("proc", s)
+        finished = p.spawn(callable)
+        finished.ready.return_value = True
+        s.spawn.return_value = MagicMock()
+        spawned = p.spawn(callable)
+        self.assertEqual(p._other_spawned, [spawned])
+
+    def test_busy_block_errors(self):
+        p = Process("proc", MagicMock(), block_queue_depth=1)
+        b = MagicMock()
+        b.name = "myblock"
+        p._handle_block_add(BlockAdd(b))
+        request_1 = Post(MagicMock(), MagicMock(), ["myblock", "foo"])
+        request_2 = Post(MagicMock(), MagicMock(), ["myblock", "foo"])
+        request_2.set_id(32)
+        p._forward_block_request(request_1)
+        p._forward_block_request(request_2)
+        request_1.response_queue.put.assert_not_called()
+        response = request_2.response_queue.put.call_args[0][0]
+        self.assertIsInstance(response, Error)
+        self.assertEqual(response.id_, 32)
+        self.assertEqual(
+            response.message, "Block myblock busy: 1 requests already queued")
+
     def test_get(self):
         p = Process("proc", MagicMock())
         block = MagicMock()
@@ -120,6 +171,54 @@ class TestProcess(unittest.TestCase):
 
         response_queue.put.assert_called_once_with(response)
 
+    def test_block_respond_reused_after_handling(self):
+        p = Process("proc", MagicMock())
+        response = MagicMock()
+        response_queue = MagicMock()
+        message = BlockRespond.reuse(response, response_queue)
+        p._handle_block_respond(message)
+        response_queue.put.assert_called_once_with(response)
+        self.assertIsNone(message.response)
+        reused = BlockRespond.reuse("response", "queue")
+        self.assertIs(reused, message)
+        self.assertEqual(reused, BlockRespond("response", "queue"))
+
+    def test_block_respond_publishes_block_changes_first(self):
+        p = Process("proc", SyncFactory("sched"))
+        q = MagicMock()
+        for name in ("block", "other"):
+            p._block_state_cache.delta_update([[name], {"attr": 0}])
+            p._subscriptions.add([name], Subscribe(None, q, [name], True))
+        p.on_changed([["other", "attr"], 1])
+        p.on_changed([["block", "attr"], 2])
+        p.block_respond("response", q, "block")
+        p.q.put(PROCESS_STOP)
+        p.recv_loop()
+        responses = [c[0][0] for c in q.put.call_args_list]
+        self.assertEqual(len(responses), 3)
+        self.assertEqual(responses[0].changes, [[["attr"], 2]])
+        # overtakes the changes to other blocks
+        self.assertEqual(responses[1], "response")
+        self.assertEqual(responses[2].changes, [[["attr"], 1]])
+        self.assertNotIn("block", p._notified)
+
+    def test_get_publishes_block_changes_first(self):
+        p = Process("proc", SyncFactory("sched"))
+        q = MagicMock()
+        p._block_state_cache.delta_update([["block"], {"attr": 0}])
+        p._subscriptions.add(["block"], Subscribe(None, q, ["block"], True))
+        p.on_changed([["block", "attr"], 1])
+        p.q.put(Get(None, q, ["block", "attr"]))
+        p.q.put(PROCESS_STOP)
+        p.recv_loop()
+        responses = [c[0][0] for c in q.put.call_args_list]
+        self.assertEqual(len(responses), 2)
+        self.assertEqual(responses[0].changes, [[["attr"], 1]])
+        # sees the change even though it overtook the BlockChanges
+        self.assertIsInstance(responses[1], Return)
+        self.assertEqual(responses[1].value, 1)
+        self.assertNotIn("block", p._notified)
+
     def test_make_process_block(self):
         p = Process("proc", MagicMock())
         p_block = p.process_block
@@ -146,13 +245,19 @@ class TestProcess(unittest.TestCase):
 
 class TestSubscriptions(unittest.TestCase):
 
+    def assertNotified(self, p, block_name, changes):
+        p.q.put.assert_called_once_with(
+            BlockChanges(name=block_name, changes=None))
+        self.assertEqual(list(p._notified[block_name]), [changes])
+
     def test_on_changed(self):
         change = [["path"], "value"]
         s = MagicMock()
         p = Process("proc", s)
         s.reset_mock()
         p.on_changed(change, notify=False)
-        p.q.put.assert_called_once_with(BlockChanged(change=change))
+        p.q.put.assert_not_called()
+        self.assertEqual(list(p._pending_changes["path"].values()), [change])
 
     def test_on_changed_with_notify(self):
         change = [["path"], "value"]
@@ -160,16 +265,98 @@ class TestSubscriptions(unittest.TestCase):
         p = Process("proc", s)
         s.reset_mock()
         p.on_changed(change)
-        p.q.put.assert_has_calls([
-            call(BlockChanged(change=change)),
-            call(BlockNotify(name="path"))])
+        self.assertNotified(p, "path", [change])
+        self.assertEqual(p._pending_changes, {})
+
+    def test_on_changed_collapses_repeated_paths(self):
+        s = MagicMock()
+        p = Process("proc", s)
+        s.reset_mock()
+        p.on_changed([["block", "a", "value"], 1], notify=False)
+        p.on_changed([["block", "b", "value"], 2], notify=False)
+        p.on_changed([["block", "a"], {"value": 3}], notify=False)
+        p.on_changed([["block", "a", "value"], 4], notify=False)
+        p.notify_subscribers("block")
+        self.assertNotified(p, "block", [
+            [["block", "b", "value"], 2],
+            [["block", "a"], {"value": 3}],
+            [["block", "a", "value"], 4]])
+
+    def test_on_changed_keeps_row_changes_in_order(self):
+        s = MagicMock()
+        p = Process("proc", s)
+        s.reset_mock()
+        table = ["block", "t", "value"]
+        p.on_changed([list(table), {"e": [1]}], notify=False)
+        p.on_changed([list(table), "rows", 1, 1, {"e": [2]}], notify=False)
+        p.on_changed([list(table), "rows", 0, 1, {"e": [3]}], notify=False)
+        p.notify_subscribers("block")
+        self.assertNotified(p, "block", [
+            [table, {"e": [1]}],
+            [table, "rows", 1, 1, {"e": [2]}],
+            [table, "rows", 0, 1, {"e": [3]}]])
+
+    def test_on_changed_drops_superseded_row_changes(self):
+        s = MagicMock()
+        p = Process("proc", s)
+        s.reset_mock()
+        table = ["block", "t", "value"]
+        p.on_changed([list(table), {"e": [1]}], notify=False)
+        p.on_changed([list(table), "rows", 1, 1, {"e": [2]}], notify=False)
+        p.on_changed([["block", "a"], 5], notify=False)
+        p.on_changed([list(table), {"e": [4]}], notify=False)
+        p.notify_subscribers("block")
+        self.assertNotified(p, "block", [
+            [["block", "a"], 5],
+            [table, {"e": [4]}]])
+        self.assertEqual(p._pending_rows, {})
+
+    def test_row_changes_sent_to_subscribers_that_asked(self):
+        p = Process("proc", MagicMock())
+        p._block_state_cache.delta_update([["block"], {"t": [0]}])
+        subs = []
+        for rows in (False, True, False):
+            sub = Subscribe(MagicMock(), MagicMock(), ["block"], True,
+                            rows=rows)
+            p._subscriptions.add(["block"], sub)
+            subs.append(sub)
+        p._handle_block_changes(BlockChanges("block", [
+            [["block", "t"], "rows", 1, 1, [1]], [["block", "x"], 2]]))
+        responses = [s.response_queue.put.call_args[0][0] for s in subs]
+        self.assertEqual(responses[0].changes,
+                         [[["t"], [0, 1]], [["x"], 2]])
+        self.assertEqual(responses[1].changes,
+                         [[["t"], "rows", 1, 1, [1]], [["x"], 2]])
+        self.assertIs(responses[0].encoding_key, responses[2].encoding_key)
+        self.assertIsNot(responses[0].encoding_key,
+                         responses[1].encoding_key)
 
     def test_notify(self):
         s = MagicMock()
         p = Process("proc", s)
         s.reset_mock()
         p.notify_subscribers("block")
-        p.q.put.assert_called_once_with(BlockNotify(name="block"))
+        p.q.put.assert_not_called()
+        p.on_changed([["block", "attr"], 1], notify=False)
+        p.on_changed([["other", "attr"], 2], notify=False)
+        p.notify_subscribers("block")
+        self.assertNotified(p, "block", [[["block", "attr"], 1]])
+
+    def test_shared_payloads(self):
+        p = Process("proc", MagicMock())
+        p._block_state_cache.delta_update([["block"], {"attr": 0}])
+        subs = [Subscribe(MagicMock(), MagicMock(), ["block"], delta)
+                for delta in (True, True, False, False)]
+        for sub in subs:
+            p._subscriptions.add(["block"], sub)
+        p._handle_block_changes(BlockChanges(
+            name="block", changes=[[["block", "attr"], 1]]))
+        responses = [s.response_queue.put.call_args[0][0] for s in subs]
+        self.assertIs(responses[0].changes, responses[1].changes)
+        self.assertIs(responses[0].encoding_key, responses[1].encoding_key)
+        self.assertIs(responses[2].value, responses[3].value)
+        self.assertIs(responses[2].encoding_key, responses[3].encoding_key)
+        self.assertIsNot(responses[0].encoding_key, responses[2].encoding_key)
 
     def test_subscribe(self):
         block = MagicMock(
@@ -186,8 +373,8 @@ class TestSubscriptions(unittest.TestCase):
         p._handle_block_add(BlockAdd(block))
         p.recv_loop()
 
-        self.assertEquals(OrderedDict(block=[sub_1, sub_2]),
-                          p._subscriptions)
+        self.assertEquals([sub_1, sub_2],
+                          list(p._subscriptions.subscriptions(["block"])))
         response_1 = sub_1.response_queue.put.call_args[0][0]
         response_2 = sub_2.response_queue.put.call_args[0][0]
         self.assertEquals({"attr": "value", "inner": {"attr2": "other"}},
@@ -201,17 +388,18 @@ class TestSubscriptions(unittest.TestCase):
         sub_1 = MagicMock()
         sub_1.endpoint = ["block"]
         sub_1.delta = False
+        sub_1.min_period = 0
         sub_2 = MagicMock()
         sub_2.endpoint = ["block"]
         sub_2.delta = True
+        sub_2.min_period = 0
         changes_1 = [["block", "attr"]]
-        request_1 = BlockChanged(changes_1)
-        request_2 = BlockNotify(block.name)
+        request_1 = BlockChanges(block.name, [changes_1])
         s = MagicMock()
         p = Process("proc", s)
-        p._subscriptions["block"] = [sub_1, sub_2]
-        p.q.get = MagicMock(
-            side_effect=[request_1, request_2, PROCESS_STOP])
+        p._subscriptions.add(sub_1.endpoint, sub_1)
+        p._subscriptions.add(sub_2.endpoint, sub_2)
+        p.q.get = MagicMock(side_effect=[request_1, PROCESS_STOP])
 
         p._handle_block_add(BlockAdd(block))
         p.recv_loop()
@@ -223,26 +411,26 @@ class TestSubscriptions(unittest.TestCase):
         self.assertEquals({"attr2": "other"}, response_1.value)
         self.assertEquals([[["attr"]]], response_2.changes)
 
-    def test_overlapped_changes(self):
+    def test_multiple_changes(self):
         block = MagicMock(
             to_dict=MagicMock(return_value={"attr": "value", "attr2": "other"}))
         block.name = "block"
         sub_1 = MagicMock()
         sub_1.endpoint = ["block"]
         sub_1.delta = False
+        sub_1.min_period = 0
         sub_2 = MagicMock()
         sub_2.endpoint = ["block"]
         sub_2.delta = True
-        changes_1 = [["block", "attr"], "changing_value"]
-        changes_2 = [["block", "attr"], "final_value"]
-        request_1 = BlockChanged(changes_1)
-        request_2 = BlockChanged(changes_2)
-        request_3 = BlockNotify(block.name)
+        sub_2.min_period = 0
+        changes_1 = [["block", "attr"], "final_value"]
+        changes_2 = [["block", "attr2"], "new_value"]
+        request_1 = BlockChanges(block.name, [changes_1, changes_2])
         s = MagicMock()
         p = Process("proc", s)
-        p._subscriptions["block"] = [sub_1, sub_2]
-        p.q.get = MagicMock(
-            side_effect=[request_1, request_2, request_3, PROCESS_STOP])
+        p._subscriptions.add(sub_1.endpoint, sub_1)
+        p._subscriptions.add(sub_2.endpoint, sub_2)
+        p.q.get = MagicMock(side_effect=[request_1, PROCESS_STOP])
 
         p._handle_block_add(BlockAdd(block))
         p.recv_loop()
@@ -251,10 +439,10 @@ class TestSubscriptions(unittest.TestCase):
         self.assertEqual(sub_2.response_queue.put.call_count, 1)
         response_1 = sub_1.response_queue.put.call_args[0][0]
         response_2 = sub_2.response_queue.put.call_args[0][0]
-        self.assertEquals({"attr": "final_value", "attr2": "other"},
+        self.assertEquals({"attr": "final_value", "attr2": "new_value"},
                           response_1.value)
         self.assertEquals(
-            [[["attr"], "changing_value"], [["attr"], "final_value"]],
+            [[["attr"], "final_value"], [["attr2"], "new_value"]],
             response_2.changes)
 
     def test_partial_structure_subscriptions(self):
@@ -269,23 +457,21 @@ class TestSubscriptions(unittest.TestCase):
         sub_1 = MagicMock()
         sub_1.endpoint = ["block_1", "inner"]
         sub_1.delta = False
+        sub_1.min_period = 0
         sub_2 = MagicMock()
         sub_2.endpoint = ["block_1", "inner"]
         sub_2.delta = True
+        sub_2.min_period = 0
 
         changes_1 = [["block_1", "inner", "attr2"], "new_value"]
         changes_2 = [["block_1", "attr"], "new_value"]
         changes_3 = [["block_2", "attr"], "block_2_value"]
-        request_1 = BlockChanged(changes_1)
-        request_2 = BlockChanged(changes_2)
-        request_3 = BlockChanged(changes_3)
-        request_4 = BlockNotify(block_1.name)
-        request_5 = BlockNotify(block_2.name)
+        request_1 = BlockChanges(block_1.name, [changes_1, changes_2])
+        request_2 = BlockChanges(block_2.name, [changes_3])
         p = Process("proc", MagicMock())
-        p.q.get = MagicMock(side_effect=[
-            request_1, request_2, request_3, request_4, request_5,
-            PROCESS_STOP])
-        p._subscriptions["block_1"] = [sub_1, sub_2]
+        p.q.get = MagicMock(side_effect=[request_1, request_2, PROCESS_STOP])
+        p._subscriptions.add(sub_1.endpoint, sub_1)
+        p._subscriptions.add(sub_2.endpoint, sub_2)
 
         p._handle_block_add(BlockAdd(block_1))
         p._handle_block_add(BlockAdd(block_2))
@@ -306,32 +492,40 @@ class TestSubscriptions(unittest.TestCase):
         sub_1 = MagicMock()
         sub_1.endpoint = ["block_1"]
         sub_1.delta = False
+        sub_1.min_period = 0
         sub_2 = MagicMock()
         sub_2.endpoint = ["block_1"]
         sub_2.delta = True
+        sub_2.min_period = 0
         sub_3 = MagicMock()
         sub_3.endpoint = ["block_2"]
         sub_3.delta = False
+        sub_3.min_period = 0
         sub_4 = MagicMock()
         sub_4.endpoint = ["block_2"]
         sub_4.delta = True
+        sub_4.min_period = 0
         change_1 = [["block_1", "attr"], "final_value"]
         change_2 = [["block_2", "attr2"], "final_value"]
-        request_1 = BlockNotify("block_1")
-        request_2 = BlockChanged(change_1)
-        request_3 = BlockChanged(change_2)
-        request_4 = BlockNotify("block_1")
-        request_5 = BlockNotify("block_1")
-        request_6 = BlockNotify("block_2")
         p = Process("proc", MagicMock())
-        p.q.get = MagicMock(side_effect=[request_1, request_2, request_3,
-                                         request_4, request_5, request_6,
-                                         PROCESS_STOP])
-        p.q.put = MagicMock(side_effect=p.q.put)
-        p._subscriptions["block_1"] = [sub_1, sub_2]
-        p._subscriptions["block_2"] = [sub_3, sub_4]
+        p._subscriptions.add(sub_1.endpoint, sub_1)
+        p._subscriptions.add(sub_2.endpoint, sub_2)
+        p._subscriptions.add(sub_3.endpoint, sub_3)
+        p._subscriptions.add(sub_4.endpoint, sub_4)
         p._handle_block_add(BlockAdd(block_1))
         p._handle_block_add(BlockAdd(block_2))
+        p.q.put.reset_mock()
+        p.notify_subscribers("block_1")
+        p.on_changed(change_1, notify=False)
+        p.on_changed(change_2, notify=False)
+        p.notify_subscribers("block_1")
+        p.notify_subscribers("block_1")
+        p.notify_subscribers("block_2")
+        requests = [c[0][0] for c in p.q.put.call_args_list]
+        self.assertEqual(requests, [
+            BlockChanges("block_1", None),
+            BlockChanges("block_2", None)])
+        p.q.get = MagicMock(side_effect=requests + [PROCESS_STOP])
 
         p.recv_loop()
 
@@ -357,5 +551,547 @@ class TestSubscriptions(unittest.TestCase):
         self.assertEquals([[["attr2"], "final_value"]],
                           call_list[0][0][0].changes)
 
+class TestConflatedSubscriptions(unittest.TestCase):
+
+    def setUp(self):
+        self.p = Process("proc", MagicMock())
+        self.p._block_state_cache.delta_update(
+            [["block"], {"attr": 0, "attr2": 0}])
+        self.time_patcher = patch("malcolm.core.process.time")
+        self.time = self.time_patcher.start()
+        self.time.time.return_value = 10.0
+
+    def tearDown(self):
+        self.time_patcher.stop()
+
+    def subscribe(self, delta, rows=False):
+        sub = Subscribe(MagicMock(), MagicMock(), ["block"], delta, 0.1,
+                        rows=rows)
+        self.p._handle_subscribe(sub)
+        sub.response_queue.reset_mock()
+        return sub
+
+    def change(self, t, *changes):
+        self.time.time.return_value = t
+        self.p._handle_block_changes(BlockChanges("block", list(changes)))
+
+    def test_changes_merged_until_period_expires(self):
+        sub = self.subscribe(True)
+        self.change(10.01, [["block", "attr"], 1])
+        self.change(10.02, [["block", "attr2"], 2], [["block", "attr"], 3])
+        sub.response_queue.put.assert_not_called()
+        self.time.time.return_value = 10.05
+        self.assertAlmostEqual(self.p._flush_conflated(), 0.05)
+        sub.response_queue.put.assert_not_called()
+        self.time.time.return_value = 10.1
+        self.assertEqual(self.p._flush_conflated(), None)
+        response = sub.response_queue.put.call_args[0][0]
+        self.assertIsInstance(response, Delta)
+        self.assertEqual(response.changes, [[["attr2"], 2], [["attr"], 3]])
+
+    def test_change_after_period_sent_immediately(self):
+        sub = self.subscribe(True)
+        self.change(10.5, [["block", "attr"], 1])
+        response = sub.response_queue.put.call_args[0][0]
+        self.assertEqual(response.changes, [[["attr"], 1]])
+        self.assertEqual(self.p._flush_conflated(), None)
+        self.change(10.55, [["block", "attr"], 2])
+        self.assertEqual(sub.response_queue.put.call_count, 1)
+
+    def test_parent_change_supersedes_children(self):
+        sub = self.subscribe(True)
+        self.change(10.01, [["block", "attr"], 1])
+        self.change(10.02, [["block"], {"attr": 5}])
+        self.time.time.return_value = 10.2
+        self.p._flush_conflated()
+        response = sub.response_queue.put.call_args[0][0]
+        self.assertEqual(response.changes, [[[], {"attr": 5}]])
+
+    def test_row_changes_kept_until_superseded(self):
+        sub = self.subscribe(True, rows=True)
+        self.change(10.01, [["block", "attr"], {"e": [1]}])
+        self.change(10.02, [["block", "attr"], "rows", 1, 1, {"e": [2]}])
+        self.change(10.03, [["block", "attr"], "rows", 0, 1, {"e": [3]}])
+        self.time.time.return_value = 10.2
+        self.p._flush_conflated()
+        response = sub.response_queue.put.call_args[0][0]
+        self.assertEqual(response.changes, [
+            [["attr"], {"e": [1]}],
+            [["attr"], "rows", 1, 1, {"e": [2]}],
+            [["attr"], "rows", 0, 1, {"e": [3]}]])
+        self.assertEqual(self.p._block_state_cache["block"]["attr"],
+                         {"e": [3, 2]})
+        self.change(10.31, [["block", "attr"], "rows", 0, 1, {"e": [4]}])
+        self.change(10.32, [["block", "attr"], {"e": [5]}])
+        self.time.time.return_value = 10.5
+        self.p._flush_conflated()
+        response = sub.response_queue.put.call_args[0][0]
+        self.assertEqual(response.changes, [[["attr"], {"e": [5]}]])
+
+    def test_row_changes_sent_whole_unless_asked_for(self):
+        sub = self.subscribe(True)
+        self.change(10.01, [["block", "attr"], {"e": [1]}])
+        self.change(10.02, [["block", "attr"], "rows", 1, 1, {"e": [2]}])
+        self.time.time.return_value = 10.2
+        self.p._flush_conflated()
+        response = sub.response_queue.put.call_args[0][0]
+        self.assertEqual(response.changes, [[["attr"], {"e": [1, 2]}]])
+
+    def test_update_sends_latest_structure(self):
+        sub = self.subscribe(False)
+        self.change(10.01, [["block", "attr"], 1])
+        self.change(10.02, [["block", "attr"], 2])
+        self.time.time.return_value = 10.2
+        self.p._flush_conflated()
+        self.assertEqual(sub.response_queue.put.call_count, 1)
+        response = sub.response_queue.put.call_args[0][0]
+        self.assertIsInstance(response, Update)
+        self.assertEqual(response.value, {"attr": 2, "attr2": 0})
+
+    def test_recv_loop_waits_for_due_subscription(self):
+        sub = self.subscribe(True)
+        self.change(10.02, [["block", "attr"], 1])
+        results = [queue.Empty(), PROCESS_STOP]
+
+        def get(timeout=None):
+            self.time.time.return_value = 10.1
+            result = results.pop(0)
+            if isinstance(result, Exception):
+                raise result
+            return result
+
+        self.p.q.get = MagicMock(side_effect=get)
+        self.p.recv_loop()
+        self.assertAlmostEqual(
+            self.p.q.get.call_args_list[0][1]["timeout"], 0.08)
+        self.assertEqual(self.p.q.get.call_args_list[1], call())
+        response = sub.response_queue.put.call_args[0][0]
+        self.assertEqual(response.changes, [[["attr"], 1]])
+
+    def test_unsubscribe_drops_pending_changes(self):
+        sub = self.subscribe(True)
+        self.change(10.01, [["block", "attr"], 1])
+        unsub = Unsubscribe(sub.context, sub.response_queue)
+        unsub.set_id(sub.id_)
+        self.p._handle_unsubscribe(unsub)
+        self.time.time.return_value = 10.2
+        self.assertEqual(self.p._flush_conflated(), None)
+        self.assertEqual(self.p._conflations, {})
+        response = sub.response_queue.put.call_args[0][0]
+        self.assertIsInstance(response, Return)
+
+
+class TestResumableSubscriptions(unittest.TestCase):
+
+    def setUp(self):
+        self.p = Process("proc", MagicMock(), history_depth=3)
+        block = MagicMock(to_dict=MagicMock(return_value={"attr": 0}))
+        block.name = "block"
+        self.p._handle_block_add(BlockAdd(block))
+        self.block = block
+
+    def change(self, value):
+        self.p._handle_block_changes(
+            BlockChanges("block", [[["block", "attr"], value]]))
+
+    def seq(self, count):
+        return "%s:%d" % (self.p.epoch, count)
+
+    def subscribe(self, seq, endpoint=("block",)):
+        sub = Subscribe(MagicMock(), MagicMock(), list(endpoint), True,
+                        seq=seq)
+        self.p._handle_subscribe(sub)
+        return sub.response_queue.put.call_args[0][0]
+
+    def test_changes_stamped_with_seq(self):
+        sub = MagicMock(endpoint=["block"], delta=True, min_period=0)
+        self.p._subscriptions.add(["block"], sub)
+        self.change(1)
+        self.change(2)
+        responses = [c[0][0] for c in sub.response_queue.put.call_args_list]
+        self.assertEqual([r.seq for r in responses],
+                         [self.seq(2), self.seq(3)])
+        self.assertEqual(self.subscribe(None).seq, self.seq(3))
+
+    def test_resume_sends_missed_changes(self):
+        self.change(1)
+        self.change(2)
+        self.change(3)
+        response = self.subscribe(self.seq(2))
+        self.assertEqual(response.changes, [[["attr"], 2], [["attr"], 3]])
+        self.assertEqual(response.seq, self.seq(4))
+
+    def test_resume_filters_missed_changes(self):
+        self.p._handle_block_changes(
+            BlockChanges("block", [[["block", "other"], 1]]))
+        self.change(1)
+        response = self.subscribe(self.seq(1), ["block", "attr"])
+        self.assertEqual(response.changes, [[[], 1]])
+
+    def test_resume_up_to_date(self):
+        self.change(1)
+        response = self.subscribe(self.seq(2))
+        self.assertEqual(response.changes, [])
+        self.assertEqual(response.seq, self.seq(2))
+
+    def test_resume_evicted_sends_everything(self):
+        for i in range(4):
+            self.change(i)
+        response = self.subscribe(self.seq(1))
+        self.assertEqual(response.changes, [[[], {"attr": 3}]])
+        self.assertEqual(response.seq, self.seq(5))
+        self.assertEqual(len(self.subscribe(self.seq(2)).changes), 3)
+
+    def test_resume_future_seq_sends_everything(self):
+        response = self.subscribe(self.seq(7))
+        self.assertEqual(response.changes, [[[], {"attr": 0}]])
+
+    def test_resume_other_epoch_sends_everything(self):
+        self.change(1)
+        for seq in ("other:1", "1", 1, self.p.epoch + ":x"):
+            response = self.subscribe(seq)
+            self.assertEqual(response.changes, [[[], {"attr": 1}]])
+            self.assertEqual(response.seq, self.seq(2))
+        p = Process("proc", MagicMock())
+        self.assertNotEqual(p.epoch, self.p.epoch)
+
+    def test_resume_past_rows_only_if_asked_for(self):
+        self.p._block_state_cache.delta_update([["block", "attr"], [0]])
+        self.p._handle_block_changes(
+            BlockChanges("block", [[["block", "attr"], "rows", 1, 1, [5]]]))
+        response = self.subscribe(self.seq(1))
+        self.assertEqual(response.changes, [[[], {"attr": [0, 5]}]])
+        sub = Subscribe(MagicMock(), MagicMock(), ["block"], True,
+                        seq=self.seq(1), rows=True)
+        self.p._handle_subscribe(sub)
+        response = sub.response_queue.put.call_args[0][0]
+        self.assertEqual(response.changes, [[["attr"], "rows", 1, 1, [5]]])
+
+    def test_readded_block_sends_everything(self):
+        self.change(1)
+        ProcessShard._handle_block_add(self.p, BlockAdd(self.block))
+        response = self.subscribe(self.seq(2))
+        self.assertEqual(response.changes, [[[], {"attr": 0}]])
+        self.assertEqual(response.seq, self.seq(3))
+
+
+class TestStats(unittest.TestCase):
+
+    def setUp(self):
+        self.s = MagicMock(pool_size=4, busy=2)
+        self.p = Process("proc", self.s, stats_period=0.5)
+        self.p.q.qsize.return_value = 3
+
+    def test_recv_loop_records_handled(self):
+        get = Get(MagicMock(), MagicMock(), ["proc", "blocks"])
+        self.p._handle_block_add(BlockAdd(self.p.process_block))
+        self.p.q.get = MagicMock(side_effect=[get, PROCESS_STOP])
+        self.p.recv_loop()
+        handled = self.p.stats.handled()
+        self.assertEqual(list(handled), ["Get"])
+        self.assertEqual(handled["Get"][0], 1)
+
+    def test_publish_stats(self):
+        self.p.stats.record_handled(Get, 0)
+        self.p.stats.record_handled(Get, 0)
+        self.p.stats.record_fanout(7)
+        self.p.q.reset_mock()
+        self.p._publish_stats()
+        block = self.p.process_block
+        self.assertEqual(block.queueDepth.value, 3)
+        self.assertEqual(block.fanout.value, 7)
+        self.assertEqual(block.poolSize.value, 4)
+        self.assertEqual(block.poolBusy.value, 2)
+        self.assertEqual(block.handled.value.type, ["Get"])
+        self.assertEqual(list(block.handled.value.count), [2])
+        self.assertEqual(list(block.handled.value.lt10us), [2])
+        # All changes go out in one notify
+        self.assertEqual(self.p.q.put.call_count, 1)
+        changes, = self.p._notified["proc"]
+        self.assertEqual(len(changes), 5)
+
+    def test_publish_stats_queued(self):
+        self.p.q.reset_mock()
+        self.p.publish_stats()
+        request = self.p.q.put.call_args[0][0]
+        self.assertIsInstance(request, CallLater)
+        self.assertEqual(request.function, self.p._publish_stats)
+
+    def test_service_timers(self):
+        self.p._publish_stats = MagicMock()
+        with patch("malcolm.core.process.time") as time_mock:
+            time_mock.time.return_value = self.p._stats_published + 0.2
+            self.assertAlmostEqual(self.p._service_timers(), 0.3)
+            self.p._publish_stats.assert_not_called()
+            time_mock.time.return_value += 0.3
+            self.assertEqual(self.p._service_timers(), 0.5)
+            self.p._publish_stats.assert_called_once_with()
+
+    def test_stats_off_by_default(self):
+        p = Process("proc", self.s)
+        p._publish_stats = MagicMock()
+        with patch("malcolm.core.process.time") as time_mock:
+            time_mock.time.return_value = p._stats_published + 10
+            self.assertEqual(p._service_timers(), None)
+        p._publish_stats.assert_not_called()
+
+
+class TestCallLater(unittest.TestCase):
+
+    def setUp(self):
+        self.p = Process("proc", MagicMock())
+
+    def test_call_later_queued(self):
+        f = MagicMock()
+        with patch("malcolm.core.process.time") as time_mock:
+            time_mock.time.return_value = 10.0
+            self.p.call_later(0.5, f, 1, 2)
+        self.p.q.put.assert_called_with(CallLater(10.5, f, (1, 2)))
+        self.assertEqual(message_lane(CallLater(10.5, f, ())), CONTROL_LANE)
+
+    def test_service_timers_calls_due(self):
+        f1, f2 = MagicMock(), MagicMock()
+        with patch("malcolm.core.process.time") as time_mock:
+            time_mock.time.return_value = 10.0
+            self.p._handle_call_later(CallLater(10.5, f2, ("b",)))
+            self.p._handle_call_later(CallLater(10.2, f1, ("a",)))
+            self.assertAlmostEqual(self.p._service_timers(), 0.2)
+            f1.assert_not_called()
+            time_mock.time.return_value = 10.3
+            self.assertAlmostEqual(self.p._service_timers(), 0.2)
+            f1.assert_called_once_with("a")
+            f2.assert_not_called()
+            time_mock.time.return_value = 10.5
+            self.assertEqual(self.p._service_timers(), None)
+            f2.assert_called_once_with("b")
+
+    def test_service_timers_logs_exceptions(self):
+        self.p.log_exception = MagicMock()
+        f = MagicMock(side_effect=ValueError("bad"))
+        self.p._handle_call_later(CallLater(0, f, ()))
+        self.assertEqual(self.p._service_timers(), None)
+        self.p.log_exception.assert_called_once_with(
+            "Exception while calling %s", f)
+
+
+class TestUnsubscribe(unittest.TestCase):
+
+    def setUp(self):
+        self.p = Process("proc", MagicMock())
+        block = MagicMock(to_dict=MagicMock(return_value={"attr": "value"}))
+        block.name = "block"
+        self.p._handle_block_add(BlockAdd(block))
+        self.q = MagicMock()
+
+    def subscribe(self, id_, context=None):
+        request = Subscribe(context, self.q, ["block", "attr"])
+        request.set_id(id_)
+        self.p._handle_subscribe(request)
+        return request
+
+    def subscription_count(self):
+        # it is set by a CallLater from recv_loop
+        for c in self.p.q.put.call_args_list:
+            if isinstance(c[0][0], CallLater):
+                c[0][0].function(*c[0][0].args)
+        self.p.q.put.reset_mock()
+        return self.p.process_block.subscriptions.value
+
+    def test_unsubscribe(self):
+        self.subscribe(1)
+        self.subscribe(1, context="other")
+        # not set from the thread handling the Subscribe
+        self.assertEqual(self.p.process_block.subscriptions.value, 0)
+        self.assertEqual(self.subscription_count(), 2)
+        self.q.reset_mock()
+        request = Unsubscribe(None, self.q)
+        request.set_id(1)
+        self.p._handle_unsubscribe(request)
+        response = self.q.put.call_args[0][0]
+        self.assertIsInstance(response, Return)
+        self.assertEqual(response.id_, 1)
+        self.assertEqual(self.subscription_count(), 1)
+        self.assertEqual(list(self.p._owned_subscriptions),
+                         [(self.q, "other")])
+        # no more updates
+        self.q.reset_mock()
+        self.p._handle_block_changes(
+            BlockChanges("block", [[["block", "attr"], "new"]]))
+        response = self.q.put.call_args[0][0]
+        self.assertEqual(response.context, "other")
+        self.assertEqual(self.q.put.call_count, 1)
+
+    def test_unsubscribe_unknown(self):
+        request = Unsubscribe(None, self.q)
+        request.set_id(3)
+        self.p._handle_unsubscribe(request)
+        response = self.q.put.call_args[0][0]
+        self.assertIsInstance(response, Error)
+        self.assertEqual(response.message, "No subscription with id 3")
+
+    def test_resubscribe_replaces(self):
+        self.subscribe(1)
+        new = self.subscribe(1)
+        self.assertEqual(list(self.p._subscriptions.subscriptions()), [new])
+
+    def test_unsubscribe_all(self):
+        self.subscribe(1)
+        self.subscribe(2)
+        self.subscribe(3, context="other")
+        self.p.q.reset_mock()
+        self.p.unsubscribe_all(self.q)
+        request = self.p.q.put.call_args[0][0]
+        self.assertEqual(request, UnsubscribeAll(self.q, None))
+        self.q.reset_mock()
+        self.p._handle_unsubscribe_all(request)
+        self.q.put.assert_not_called()
+        self.assertEqual(len(self.p._subscriptions), 1)
+        self.assertEqual(self.subscription_count(), 1)
+
+
+class TestShardedProcess(unittest.TestCase):
+
+    def setUp(self):
+        s = MagicMock()
+        s.create_lane_queue.side_effect = \
+            lambda lane_for, lanes: LaneQueue(
+                queue.Queue(), MagicMock(), lane_for, lanes)
+        self.p = Process("proc", s, shards=2)
+
+    def run_loops(self):
+        # run the routing loop, then the shards with what it gave them, then
+        # the routing loop again with what they gave back
+        self.p.q.put(PROCESS_STOP)
+        self.p.recv_loop()
+        for shard in self.p._shards:
+            shard.q.put(PROCESS_STOP)
+            shard.recv_loop()
+        self.p.q.put(PROCESS_STOP)
+        self.p.recv_loop()
+
+    def make_block(self, name):
+        block = MagicMock(to_dict=MagicMock(return_value={"attr": name}))
+        block.name = name
+        self.p.add_block(name, block)
+        return block
+
+    def test_pool_smaller_than_shards(self):
+        p = Process("proc", SyncFactory("s", pool_size=1), shards=2)
+        p.start()
+        try:
+            q = queue.Queue()
+            p.q.put(Get(None, q, ["proc", "blocks", "value"]))
+            response = q.get(timeout=5)
+        finally:
+            p.stop(timeout=5)
+        self.assertEqual(response.value, ["proc"])
+
+    def test_shard_for(self):
+        self.assertEqual(len(self.p._shards), 2)
+        shard = self.p.shard_for("block")
+        self.assertIn(shard, self.p._shards)
+        self.assertIs(shard, self.p.shard_for("block"))
+        p = Process("proc", MagicMock())
+        self.assertIs(p.shard_for("block"), p)
+
+    def test_block_state_owned_by_shard(self):
+        for i in range(4):
+            self.make_block("block%d" % i)
+        self.run_loops()
+        for i in range(4):
+            name = "block%d" % i
+            shard = self.p.shard_for(name)
+            self.assertEqual(shard._block_state_cache[name], {"attr": name})
+            for other in self.p._shards:
+                if other is not shard:
+                    self.assertNotIn(name, other._block_state_cache)
+        self.assertEqual(self.p._block_state_cache, {})
+        self.assertEqual(self.p.process_block.blocks.value,
+                         ["proc", "block0", "block1", "block2", "block3"])
+
+    def test_requests_routed_in_order(self):
+        self.make_block("block")
+        self.run_loops()
+        sub = Subscribe(MagicMock(), MagicMock(), ["block"], True)
+        self.p.q.put(sub)
+        self.p.on_changed([["block", "attr"], "new_value"])
+        get = Get(MagicMock(), MagicMock(), ["block", "attr"])
+        self.p.q.put(get)
+        self.run_loops()
+        shard = self.p.shard_for("block")
+        self.assertEqual(list(shard._subscriptions.subscriptions()), [sub])
+        self.assertEqual(len(self.p._subscriptions), 0)
+        responses = [c[0][0] for c in sub.response_queue.put.call_args_list]
+        self.assertEqual(len(responses), 2)
+        self.assertEqual(responses[0].changes, [[[], {"attr": "block"}]])
+        self.assertEqual(responses[1].changes, [[["attr"], "new_value"]])
+        # the Get overtakes the BlockChanges, which are in a lower lane, but
+        # publishes the changes first
+        response = get.response_queue.put.call_args[0][0]
+        self.assertEqual(response.value, "new_value")
+
+    def test_block_respond_routed(self):
+        self.make_block("block")
+        self.run_loops()
+        q = MagicMock()
+        self.p.q.put(Subscribe(None, q, ["block"], True))
+        self.run_loops()
+        self.p.on_changed([["block", "attr"], "new_value"], notify=False)
+        self.p.block_respond("response", q, "block")
+        # without a block it has no changes to wait for
+        other_q = MagicMock()
+        self.p.block_respond("other", other_q)
+        self.p.q.put(PROCESS_STOP)
+        self.p.recv_loop()
+        other_q.put.assert_called_once_with("other")
+        q.put.assert_called_once()
+        for shard in self.p._shards:
+            shard.q.put(PROCESS_STOP)
+            shard.recv_loop()
+        responses = [c[0][0] for c in q.put.call_args_list]
+        self.assertEqual(len(responses), 3)
+        self.assertEqual(responses[1].changes, [[["attr"], "new_value"]])
+        self.assertEqual(responses[2], "response")
+
+    def test_unsubscribe_routed(self):
+        self.make_block("block")
+        self.run_loops()
+        q = MagicMock()
+        sub = Subscribe(None, q, ["block"])
+        sub.set_id(1)
+        unsub = Unsubscribe(None, q)
+        unsub.set_id(1)
+        self.p.q.put(sub)
+        self.p.q.put(unsub)
+        self.p.q.put(unsub)
+        self.run_loops()
+        responses = [c[0][0] for c in q.put.call_args_list]
+        # the router rejects the second one before the shard runs
+        self.assertEqual([type(r) for r in responses], [Error, Update, Return])
+        self.assertEqual(self.p.process_block.subscriptions.value, 0)
+
+    def test_unsubscribe_all_routed(self):
+        self.make_block("block0")
+        self.make_block("block1")
+        self.run_loops()
+        q = MagicMock()
+        for i in range(2):
+            sub = Subscribe(None, q, ["block%d" % i])
+            sub.set_id(i)
+            self.p.q.put(sub)
+        self.run_loops()
+        self.assertEqual(self.p.process_block.subscriptions.value, 2)
+        self.p.unsubscribe_all(q)
+        self.run_loops()
+        self.assertEqual(self.p.process_block.subscriptions.value, 0)
+        self.assertEqual(self.p._subscription_shards, {})
+
+    def test_pending_changes_owned_by_shard(self):
+        self.p.on_changed([["block", "attr"], "new_value"], notify=False)
+        shard = self.p.shard_for("block")
+        self.assertIn("block", shard._pending_changes)
+        self.assertNotIn("block", self.p._pending_changes)
+
+
 if __name__ == "__main__":
     unittest.main(verbosity=2)
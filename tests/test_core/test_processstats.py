@@ -0,0 +1,41 @@
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+import setup_malcolm_paths
+
+import unittest
+from mock import MagicMock
+
+# module imports
+from malcolm.core.processstats import ProcessStats, LATENCY_COLUMNS
+from malcolm.core.request import Get, Post
+
+
+class TestProcessStats(unittest.TestCase):
+
+    def setUp(self):
+        self.s = ProcessStats(MagicMock())
+
+    def test_record_handled(self):
+        self.s.record_handled(Get, 5e-6)
+        self.s.record_handled(Get, 2e-3)
+        self.s.record_handled(Post, 3.0)
+        handled = self.s.handled()
+        self.assertEqual(list(handled), ["Get", "Post"])
+        self.assertEqual(handled["Get"], [2, 1, 0, 0, 1, 0, 0, 0])
+        self.assertEqual(handled["Post"], [1, 0, 0, 0, 0, 0, 0, 1])
+        self.assertEqual(len(handled["Get"]), len(LATENCY_COLUMNS) + 1)
+
+    def test_handled_is_a_copy(self):
+        self.s.record_handled(Get, 0)
+        handled = self.s.handled()
+        self.s.record_handled(Get, 0)
+        self.assertEqual(handled["Get"][0], 1)
+
+    def test_record_fanout(self):
+        self.s.record_fanout(3)
+        self.s.record_fanout(2)
+        self.assertEqual(self.s.fanout, 5)
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -3,7 +3,8 @@ import sys
 sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
 import setup_malcolm_paths
 
-from malcolm.core.request import Request, Get, Post, Subscribe, Unsubscribe, Put
+from malcolm.core.request import Request, Get, Post, Subscribe, Unsubscribe, \
+    Put, Deferred
 from malcolm.core.response import Return, Error, Update, Delta
 
 import unittest
@@ -21,6 +22,21 @@ class TestRequest(unittest.TestCase):
         self.assertEqual(self.context, self.request.context)
         self.assertEqual(self.response_queue, self.request.response_queue)
 
+    def test_deferred_decoded_once(self):
+        decode = MagicMock(return_value=dict(a=1))
+        put = Put(None, None, ["block", "attr", "value"], Deferred(decode))
+        post = Post(None, None, ["block", "method"], Deferred(decode))
+        self.assertEqual(put.value, dict(a=1))
+        self.assertEqual(put.value, dict(a=1))
+        self.assertEqual(post.parameters, dict(a=1))
+        self.assertEqual(decode.call_count, 2)
+
+    def test_no_instance_dict(self):
+        for request in (self.request, Get(), Put(), Post(), Subscribe(),
+                        Unsubscribe()):
+            self.assertFalse(hasattr(request, "__dict__"))
+            self.assertRaises(AttributeError, setattr, request, "foo", 1)
+
     def test_repr(self):
         r = Request(MagicMock(), MagicMock())
         s = r.__repr__()
@@ -121,6 +137,25 @@ class TestPost(unittest.TestCase):
         self.post.set_parameters(dict(arg1=2, arg2=False))
         self.assertEquals(dict(arg1=2, arg2=False), self.post.parameters)
 
+        self.assertFalse(self.post.stream)
+        self.post.set_stream(True)
+        self.assertTrue(self.post.stream)
+
+    def test_default_to_dict_unchanged(self):
+        self.post.set_id(2)
+        self.assertEqual(list(self.post.to_dict().items()), [
+            ("typeid", "malcolm:core/Post:1.0"), ("id", 2),
+            ("endpoint", self.endpoint), ("parameters", self.parameters)])
+
+    def test_stream_round_trip(self):
+        post = Post(None, None, ["block", "method"], dict(a=1), stream=True)
+        post.set_id(3)
+        d = post.to_dict()
+        self.assertEqual(d["stream"], True)
+        decoded = Post.from_dict(d)
+        self.assertTrue(decoded.stream)
+        self.assertEqual(decoded.id_, 3)
+
 
 class TestSubscribe(unittest.TestCase):
 
@@ -168,6 +203,39 @@ class TestSubscribe(unittest.TestCase):
         self.subscribe.set_delta(False)
         self.assertFalse(self.subscribe.delta)
 
+        self.subscribe.set_min_period(0.1)
+        self.assertEqual(0.1, self.subscribe.min_period)
+
+    def test_default_to_dict_unchanged(self):
+        self.subscribe.set_id(2)
+        self.assertEqual(list(self.subscribe.to_dict().items()), [
+            ("typeid", "malcolm:core/Subscribe:1.0"), ("id", 2),
+            ("endpoint", self.endpoint), ("delta", True)])
+        self.subscribe.set_seq("epoch:3")
+        self.subscribe.set_min_period(0.1)
+        d = self.subscribe.to_dict()
+        self.assertEqual(d["seq"], "epoch:3")
+        self.assertEqual(d["min_period"], 0.1)
+
+    def test_from_dict_min_period(self):
+        d = self.subscribe.to_dict()
+        self.assertNotIn("min_period", d)
+        d["min_period"] = 0.5
+        subscribe = Subscribe.from_dict(d)
+        self.assertEqual(0.5, subscribe.min_period)
+        self.assertEqual(self.endpoint, subscribe.endpoint)
+
+    def test_from_dict_round_trip(self):
+        self.subscribe.set_id(3)
+        self.subscribe.set_seq(20)
+        d = self.subscribe.to_dict()
+        subscribe = Request.from_dict(d)
+        self.assertIsInstance(subscribe, Subscribe)
+        self.assertEqual(3, subscribe.id_)
+        self.assertEqual(d, subscribe.to_dict())
+        d["unknown"] = 1
+        self.assertRaises(NotImplementedError, Request.from_dict, d)
+
 
 class TestUnsubscribe(unittest.TestCase):
 
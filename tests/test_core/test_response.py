@@ -65,6 +65,32 @@ class TestResponse(unittest.TestCase):
         r.set_changes([[["path"], "value2"]])
         self.assertEquals([[["path"], "value2"]], r.changes)
 
+    def test_no_instance_dict(self):
+        for response in (Response(), Return(), Error(), Update(), Delta()):
+            self.assertFalse(hasattr(response, "__dict__"))
+            self.assertIsNone(response.encoding_key)
+
+    def test_from_dict(self):
+        changes = [[["path"], "value"]]
+        d = Delta(123, Mock(), changes, seq=4).to_dict()
+        r = Response.from_dict(d)
+        self.assertIsInstance(r, Delta)
+        self.assertEquals(123, r.id_)
+        self.assertEquals(changes, r.changes)
+        self.assertEquals(4, r.seq)
+        self.assertIsNone(r.context)
+
+    def test_default_to_dict_unchanged(self):
+        self.assertEqual(list(Update(1, Mock(), {"a": 1}).to_dict().items()), [
+            ("typeid", "malcolm:core/Update:1.0"), ("id", 1),
+            ("value", {"a": 1})])
+        changes = [[["path"], "value"]]
+        self.assertEqual(list(Delta(1, Mock(), changes).to_dict().items()), [
+            ("typeid", "malcolm:core/Delta:1.0"), ("id", 1),
+            ("changes", changes)])
+        d = Response.from_dict(Update(1, Mock(), {"a": 1}).to_dict())
+        self.assertIsNone(d.seq)
+
     def test_repr(self):
         r = Response(123, Mock())
         s = r.__repr__()
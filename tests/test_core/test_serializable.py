@@ -7,7 +7,10 @@ from collections import OrderedDict
 import unittest
 from mock import Mock
 
-from malcolm.core.serializable import Serializable
+import json
+import numpy as np
+
+from malcolm.core.serializable import Serializable, serialize_hook
 
 
 class TestSerialization(unittest.TestCase):
@@ -30,6 +33,71 @@ class TestSerialization(unittest.TestCase):
         n = Serializable.from_dict(expected.copy())
         self.assertEqual(n.to_dict(), expected)
 
+        # from_dict must leave the dict alone, as it may be shared
+        d = OrderedDict(expected)
+        n = Serializable.from_dict(d)
+        self.assertEqual(d, expected)
+
+    def test_decoder_made_when_registered(self):
+
+        @Serializable.register_subclass("bar:1.0")
+        class DummySerializable(Serializable):
+            endpoints = ["boo"]
+            boo = 3
+
+            def set_boo(self, boo):
+                self.boo = boo * 2
+
+        self.assertIn("bar:1.0", Serializable._decoder_lookup)
+        n = Serializable.from_dict(dict(typeid="bar:1.0", boo=4))
+        self.assertIsInstance(n, DummySerializable)
+        self.assertEqual(n.boo, 8)
+        self.assertRaises(NotImplementedError, Serializable.from_dict,
+                          dict(typeid="bar:1.0", boo=4, unknown=1))
+
+    def test_decoder_sets_endpoint_attributes(self):
+
+        @Serializable.register_subclass("quux:1.0")
+        class DummySerializable(Serializable):
+            endpoints = ["id", "boo"]
+            endpoint_attributes = dict(id="id_")
+
+            def set_boo(self, boo):
+                raise AssertionError("Setter should not be called")
+
+        n = Serializable.from_dict(dict(typeid="quux:1.0", id=1, boo=4))
+        self.assertIsInstance(n, DummySerializable)
+        self.assertEqual(n.id_, 1)
+        self.assertEqual(n.boo, 4)
+
+    def test_from_dict_unknown_typeid(self):
+        with self.assertRaises(ValueError) as cm:
+            Serializable.from_dict(dict(typeid="unknown:1.0"))
+        self.assertIn("unknown:1.0", str(cm.exception))
+
+    def test_from_dict_wrong_class(self):
+
+        @Serializable.register_subclass("baz:1.0")
+        class Baz(Serializable):
+            endpoints = []
+
+        @Serializable.register_subclass("qux:1.0")
+        class Qux(Serializable):
+            endpoints = []
+
+        self.assertIsInstance(Baz.from_dict(dict(typeid="baz:1.0")), Baz)
+        self.assertRaises(ValueError, Qux.from_dict, dict(typeid="baz:1.0"))
+
+
+class TestSerializeHook(unittest.TestCase):
+
+    def test_numpy(self):
+        d = dict(a=np.uint32(3), b=np.array([1, 2], dtype=np.int64))
+        self.assertEqual(json.dumps(d, default=serialize_hook, sort_keys=True),
+                         '{"a": 3, "b": [1, 2]}')
+
+    def test_unknown_raises(self):
+        self.assertRaises(TypeError, serialize_hook, object())
 
 
 if __name__ == "__main__":
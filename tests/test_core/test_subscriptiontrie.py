@@ -0,0 +1,100 @@
+import os
+import sys
+import unittest
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+# import logging
+# logging.basicConfig(level=logging.DEBUG)
+
+import setup_malcolm_paths
+from mock import MagicMock
+
+# module imports
+from malcolm.core.subscriptiontrie import SubscriptionTrie
+
+
+class TestSubscriptionTrie(unittest.TestCase):
+
+    def filter_change(self, change):
+        ret = []
+        for endpoint, subscriptions, filtered in self.t.filter_change(change):
+            for subscription in subscriptions:
+                ret.append((endpoint, subscription, filtered))
+        return ret
+
+    def setUp(self):
+        self.t = SubscriptionTrie()
+        self.block_sub = MagicMock()
+        self.inner_sub = MagicMock()
+        self.other_sub = MagicMock()
+        self.t.add(["block"], self.block_sub)
+        self.t.add(["block", "inner"], self.inner_sub)
+        self.t.add(["other"], self.other_sub)
+
+    def test_len(self):
+        self.assertEqual(len(self.t), 3)
+        self.t.add(["block"], self.block_sub)
+        self.assertEqual(len(self.t), 3)
+
+    def test_subscriptions(self):
+        self.assertEqual(list(self.t.subscriptions(["block"])),
+                         [self.block_sub, self.inner_sub])
+        self.assertEqual(list(self.t.subscriptions(["missing"])), [])
+        self.assertEqual(len(list(self.t.subscriptions())), 3)
+
+    def test_change_below_endpoints(self):
+        change = [["block", "inner", "attr"], "value"]
+        filtered = self.filter_change(change)
+        self.assertEqual(filtered, [
+            (("block",), self.block_sub, [["inner", "attr"], "value"]),
+            (("block", "inner"), self.inner_sub, [["attr"], "value"])])
+
+    def test_change_above_endpoint(self):
+        change = [["block"], {"inner": {"attr": 1}, "attr2": 2}]
+        filtered = self.filter_change(change)
+        self.assertEqual(filtered, [
+            (("block",), self.block_sub,
+             [[], {"inner": {"attr": 1}, "attr2": 2}]),
+            (("block", "inner"), self.inner_sub, [[], {"attr": 1}])])
+
+    def test_change_above_endpoint_removes_it(self):
+        filtered = self.filter_change([["block"], {"attr2": 2}])
+        self.assertEqual(
+            filtered[1], (("block", "inner"), self.inner_sub, [[]]))
+        filtered = self.filter_change([["block"]])
+        self.assertEqual(filtered, [
+            (("block",), self.block_sub, [[]]),
+            (("block", "inner"), self.inner_sub, [[]])])
+
+    def test_unrelated_change(self):
+        change = [["block", "attr2"], "value"]
+        filtered = self.filter_change(change)
+        self.assertEqual(
+            filtered, [(("block",), self.block_sub, [["attr2"], "value"])])
+        self.assertEqual(self.filter_change([["nothing"], 1]), [])
+
+    def test_row_change(self):
+        self.t.add(["block", "inner", "e1"], self.other_sub)
+        self.t.add(["block", "inner", "typeid"], self.other_sub)
+        columns = {"e1": [1], "e2": ["a"]}
+        filtered = self.filter_change([["block", "inner"], "rows", 0, 1,
+                                       columns])
+        self.assertEqual(filtered, [
+            (("block",), self.block_sub, [["inner"], "rows", 0, 1, columns]),
+            (("block", "inner"), self.inner_sub,
+             [[], "rows", 0, 1, columns]),
+            (("block", "inner", "e1"), self.other_sub,
+             [[], "rows", 0, 1, [1]])])
+
+    def test_remove(self):
+        self.assertTrue(self.t.remove(["block", "inner"], self.inner_sub))
+        self.assertFalse(self.t.remove(["block", "inner"], self.inner_sub))
+        self.assertFalse(self.t.remove(["nothing"], self.inner_sub))
+        self.assertEqual(len(self.t), 2)
+        self.assertEqual(list(self.t._root.children["block"].children), [])
+        self.assertTrue(self.t.remove(["block"], self.block_sub))
+        self.assertEqual(list(self.t._root.children), ["other"])
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
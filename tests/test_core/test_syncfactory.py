@@ -4,10 +4,11 @@ sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
 import setup_malcolm_paths
 
 import unittest
-from mock import patch
+from mock import patch, MagicMock
 
 # module imports
-from malcolm.core.syncfactory import SyncFactory
+from malcolm.compat import queue
+from malcolm.core.syncfactory import SyncFactory, QueueLoop
 
 
 class TestBlock(unittest.TestCase):
@@ -15,7 +16,7 @@ class TestBlock(unittest.TestCase):
     @patch("malcolm.core.syncfactory.ThreadPool")
     def setUp(self, mock_pool):
         self.s = SyncFactory("sched")
-        mock_pool.assert_called_once_with()
+        mock_pool.assert_called_once_with(self.s.pool_size)
         self.assertEqual(self.s.pool, mock_pool.return_value)
 
     @patch("malcolm.core.syncfactory.queue.Queue")
@@ -31,10 +32,54 @@ class TestBlock(unittest.TestCase):
         self.assertEqual(l, mock_lock.return_value)
 
     def test_spawned_calls_pool_apply(self):
-        r = self.s.spawn(callable, "fred", b=43)
+        f = MagicMock()
+        r = self.s.spawn(f, "fred", b=43)
         self.s.pool.apply_async.assert_called_once_with(
-            callable, ("fred",), dict(b=43))
+            self.s._run, (f, ("fred",), dict(b=43)))
         self.assertEqual(r, self.s.pool.apply_async.return_value)
+        self.assertEqual(self.s.busy, 1)
+        ret = self.s._run(*self.s.pool.apply_async.call_args[0][1])
+        f.assert_called_once_with("fred", b=43)
+        self.assertEqual(ret, f.return_value)
+        self.assertEqual(self.s.busy, 0)
+
+    def test_busy_decremented_on_exception(self):
+        f = MagicMock(side_effect=ValueError())
+        self.s.spawn(f)
+        with self.assertRaises(ValueError):
+            self.s._run(*self.s.pool.apply_async.call_args[0][1])
+        self.assertEqual(self.s.busy, 0)
+
+    def test_queue_loop_spawned_outside_pool(self):
+        q = queue.Queue()
+        handled = []
+
+        def handle(item):
+            handled.append(item)
+            return item is not None
+
+        r = self.s.spawn(QueueLoop(q, handle))
+        self.s.pool.apply_async.assert_not_called()
+        self.assertEqual(self.s.busy, 0)
+        self.assertFalse(r.ready())
+        q.put(1)
+        q.put(None)
+        self.assertEqual(r.get(timeout=5), None)
+        self.assertTrue(r.ready())
+        self.assertEqual(handled, [1, None])
+
+    def test_queue_loop_exception_raised_by_get(self):
+        q = queue.Queue()
+        r = self.s.spawn(QueueLoop(q, MagicMock(side_effect=ValueError())))
+        q.put(1)
+        with self.assertRaises(ValueError):
+            r.get(timeout=5)
+
+    @patch("malcolm.core.syncfactory.ThreadPool")
+    def test_pool_size(self, mock_pool):
+        s = SyncFactory("sched", pool_size=3)
+        mock_pool.assert_called_once_with(3)
+        self.assertEqual(s.pool_size, 3)
 
 if __name__ == "__main__":
     unittest.main(verbosity=2)
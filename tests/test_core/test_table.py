@@ -7,6 +7,8 @@ import unittest
 from collections import OrderedDict
 from mock import Mock
 
+import numpy as np
+
 from malcolm.core.table import Table
 from malcolm.vmetas import StringArrayMeta, NumberArrayMeta
 
@@ -100,8 +102,218 @@ class TestTableRowOperations(unittest.TestCase):
             self.t[0]
         with self.assertRaises(AssertionError):
             self.t[0] = [0, 0, 0]
+        self.t.append([0, 0, 0])
         with self.assertRaises(AssertionError):
-            self.t.append([0, 0, 0])
+            len(self.t)
+
+class TestTableColumns(unittest.TestCase):
+    def setUp(self):
+        meta = Mock()
+        meta.elements = OrderedDict()
+        meta.elements["e1"] = NumberArrayMeta("int32")
+        meta.elements["e2"] = NumberArrayMeta("float64")
+        meta.elements["e3"] = StringArrayMeta()
+        self.meta = meta
+
+    def test_append_grows_buffer(self):
+        t = Table(self.meta)
+        for i in range(100):
+            t.append([i, i / 2.0, str(i)])
+        self.assertEqual(len(t), 100)
+        t.append([100, 50.0, "100"])
+        self.assertEqual(len(t), 101)
+        self.assertEqual(list(t.e1), list(range(101)))
+        self.assertEqual(t.e1.dtype, np.int32)
+        self.assertEqual(t[100], [100, 50.0, "100"])
+        # buffer has spare capacity, but that isn't a row
+        self.assertGreater(len(t._columns["e1"]), 101)
+        with self.assertRaises(IndexError):
+            t[101]
+        with self.assertRaises(IndexError):
+            t[101] = [0, 0, "0"]
+
+    def test_append_validated_when_used(self):
+        t = Table(self.meta)
+        t.append([1, 1.5, "a"])
+        t.append([2, 2.5, None])
+        t.append([2.5, 2.5, "b"])
+        t.append([3, 3.5, "c"])
+        with self.assertRaises(ValueError) as cm:
+            len(t)
+        self.assertIn("None", str(cm.exception))
+        self.assertIn("2.5", str(cm.exception))
+        # the valid rows are still added
+        self.assertEqual(len(t), 2)
+        self.assertEqual(t.e3, ["a", "c"])
+
+    def test_append_copies_row(self):
+        t = Table(self.meta)
+        row = [1, 1.5, "a"]
+        t.append(row)
+        row[0] = 2
+        t.append(row)
+        self.assertEqual(list(t.e1), [1, 2])
+
+    def test_column_is_view(self):
+        t = Table(self.meta)
+        t.append([1, 1.5, "a"])
+        e1 = t.e1
+        t.append([2, 2.5, "b"])
+        self.assertEqual(list(e1), [1])
+        t[0] = [7, 7.5, "c"]
+        self.assertEqual(list(e1), [7])
+
+    def test_extend(self):
+        t = Table(self.meta)
+        t.append([0, 0.0, "0"])
+        t.extend([[i, i / 2.0, str(i)] for i in range(1, 50)])
+        self.assertEqual(len(t), 50)
+        self.assertEqual(list(t.e2), [i / 2.0 for i in range(50)])
+        self.assertEqual(t.e3, [str(i) for i in range(50)])
+        t.extend([])
+        self.assertEqual(len(t), 50)
+
+    def test_extend_bad_rows_raise(self):
+        t = Table(self.meta)
+        self.assertRaises(ValueError, t.extend, [[1, 1.5, "a"], [2, 2.5]])
+        self.assertRaises(ValueError, t.extend, [[1, 1.5, "a"], [2.5, 2, "b"]])
+        self.assertEqual(len(t), 0)
+
+    def test_from_columns(self):
+        e1 = np.arange(3, dtype=np.int32)
+        t = Table.from_columns(
+            self.meta, [e1, [0.5, 1.5, 2.5], ["a", "b", "c"]])
+        self.assertIs(t.e1, e1)
+        self.assertEqual(t[1], [1, 1.5, "b"])
+        t = Table.from_columns(self.meta, dict(e1=[1], e2=[2], e3=["3"]))
+        self.assertEqual(t[0], [1, 2.0, "3"])
+
+    def test_from_columns_bad_columns_raise(self):
+        self.assertRaises(ValueError, Table.from_columns, self.meta, [[1]])
+        self.assertRaises(AssertionError, Table.from_columns, self.meta,
+                          [[1, 2], [1.5], ["a"]])
+
+    def test_slice_is_read_only_view(self):
+        t = Table.from_columns(
+            self.meta, [list(range(5)), [0.5] * 5, list("abcde")])
+        s = t[1:3]
+        self.assertTrue(np.shares_memory(s.e1, t.e1))
+        self.assertFalse(s.e1.flags.writeable)
+        self.assertTrue(t.e1.flags.writeable)
+        # changing the parent copies its columns first
+        t[1] = [8, 8.5, "y"]
+        self.assertFalse(np.shares_memory(s.e1, t.e1))
+        self.assertEqual(s[0], [1, 0.5, "b"])
+
+    def test_slice_is_copy_on_write(self):
+        t = Table.from_columns(
+            self.meta, [list(range(5)), [0.5] * 5, list("abcde")])
+        s = t[1:3]
+        self.assertEqual(len(s), 2)
+        self.assertEqual(s[0], [1, 0.5, "b"])
+        s[0] = [9, 9.5, "z"]
+        self.assertEqual(s[0], [9, 9.5, "z"])
+        self.assertEqual(t[1], [1, 0.5, "b"])
+        s.append([10, 10.5, "y"])
+        self.assertEqual(t.e1[3], 3)
+        self.assertEqual(len(t), 5)
+
+
+class TestTableRowChanges(unittest.TestCase):
+    def setUp(self):
+        meta = Mock()
+        meta.elements = OrderedDict()
+        meta.elements["e1"] = NumberArrayMeta("int32")
+        meta.elements["e2"] = StringArrayMeta()
+        self.meta = meta
+        self.t = Table.from_columns(meta, [[0, 1, 2], ["a", "b", "c"]])
+
+    def assertChanges(self, expected, changes):
+        self.assertEqual(len(expected), len(changes))
+        for (start, stop, e1, e2), change in zip(expected, changes):
+            self.assertEqual([start, stop], change[:2])
+            self.assertEqual(["e1", "e2"], list(change[2]))
+            self.assertEqual(np.int32, change[2]["e1"].dtype)
+            self.assertEqual(e1, list(change[2]["e1"]))
+            self.assertEqual(e2, change[2]["e2"])
+
+    def test_whole_columns_not_rows(self):
+        self.assertEqual([], self.t.take_row_changes())
+        self.t.e1 = [3, 4, 5]
+        self.assertIsNone(self.t.take_row_changes())
+
+    def test_setitem(self):
+        self.t.take_row_changes()
+        self.t[1] = [7, "x"]
+        self.t[-1] = [8, "y"]
+        self.assertChanges([[1, 2, [7], ["x"]], [2, 3, [8], ["y"]]],
+                           self.t.take_row_changes())
+        self.assertEqual([], self.t.take_row_changes())
+
+    def test_appends_merged(self):
+        self.t.take_row_changes()
+        self.t.append([3, "d"])
+        self.t.extend([[4, "e"], [5, "f"]])
+        self.t.append([6, "g"])
+        self.assertChanges([[3, 3, [3, 4, 5, 6], ["d", "e", "f", "g"]]],
+                           self.t.take_row_changes())
+
+    def test_insert_and_delete(self):
+        self.t.take_row_changes()
+        self.t.insert(1, [[9, "z"]])
+        del self.t[0]
+        del self.t[1:3]
+        self.assertEqual([9], list(self.t.e1))
+        self.assertEqual(["z"], self.t.e2)
+        self.assertChanges([[1, 1, [9], ["z"]], [0, 1, [], []],
+                            [1, 3, [], []]], self.t.take_row_changes())
+        self.assertRaises(ValueError, self.t.__delitem__, slice(0, 2, 2))
+        self.assertRaises(IndexError, self.t.__delitem__, 1)
+
+    def test_too_many_rows_changed(self):
+        self.t.take_row_changes()
+        for i in range(20):
+            self.t[0] = [i, str(i)]
+        self.assertIsNone(self.t.take_row_changes())
+
+    def test_slice_changes_neither_rows_nor_record(self):
+        t = Table(self.meta)
+        t.extend([[1, "a"], [2, "b"], [3, "c"]])
+        t.take_row_changes()
+        s = t[0:2]
+        s[0] = [10, "z"]
+        self.assertEqual(t[0], [1, "a"])
+        self.assertEqual(s[0], [10, "z"])
+        self.assertEqual([], t.take_row_changes())
+        t[2] = [4, "d"]
+        self.assertEqual(1, len(t.take_row_changes()))
+
+    def test_changes_after_to_dict_copy(self):
+        d = self.t.to_dict()
+        self.t[0] = [7, "x"]
+        self.t.append([3, "d"])
+        self.assertEqual([0, 1, 2], list(d["e1"]))
+        self.assertEqual(["a", "b", "c"], d["e2"])
+        self.assertEqual([7, 1, 2, 3], list(self.t.e1))
+
+    def test_splice(self):
+        self.t.take_row_changes()
+        columns = OrderedDict()
+        columns["e1"] = np.array([7, 8], dtype=np.int32)
+        columns["e2"] = ["x", "y"]
+        self.t.splice(1, 2, columns)
+        self.assertEqual([0, 7, 8, 2], list(self.t.e1))
+        self.assertEqual(["a", "x", "y", "c"], self.t.e2)
+        self.assertChanges([[1, 2, [7, 8], ["x", "y"]]],
+                           self.t.take_row_changes())
+        # Changes from one Table can be applied to another
+        other = Table.from_columns(self.meta, [[0, 1, 2], ["a", "b", "c"]])
+        other.splice(1, 2, columns)
+        self.assertEqual(list(self.t.e1), list(other.e1))
+        self.assertRaises(IndexError, self.t.splice, 3, 5, columns)
+        self.assertRaises(AssertionError, self.t.splice, 0, 0,
+                          dict(e1=[1], e2=["a", "b"]))
+
 
 class TestTableMetaSerialization(unittest.TestCase):
 
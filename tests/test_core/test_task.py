@@ -172,6 +172,21 @@ class TestTask(unittest.TestCase):
         self.assertEqual(self.callback_result, 8)
         t.unsubscribe(new_id)
 
+    def test_unsubscribe_all(self):
+        t = Task("testTask", self.proc)
+        t.subscribe(self.attr, self._callback, 3, 5)
+        t.subscribe(self.attr2, self._callback, 3, 5)
+        t.unsubscribe_all()
+        self.assertEqual(t._subscriptions, {})
+        self.proc.unsubscribe_all.assert_called_once_with(t.q)
+
+    def test_del_unsubscribes(self):
+        t = Task("testTask", self.proc)
+        t.subscribe(self.attr, self._callback, 3, 5)
+        q = t.q
+        del t
+        self.proc.unsubscribe_all.assert_called_once_with(q)
+
     def test_callback_error(self):
         t = Task("testTask", self.proc)
         resp = Error(0, None, None)
@@ -0,0 +1,87 @@
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+import setup_malcolm_paths
+
+import json
+import shutil
+import tempfile
+import unittest
+from mock import MagicMock, patch
+
+# module imports
+from malcolm.core.tracer import Tracer
+from malcolm.core.request import Get
+from malcolm.core.response import Return
+
+
+class TestTracer(unittest.TestCase):
+
+    def setUp(self):
+        self.t = Tracer()
+        self.context = MagicMock()
+        self.request = Get(self.context, MagicMock(), ["block"])
+        self.request.set_id(32)
+
+    def test_disabled_records_nothing(self):
+        self.t.instant("enqueue", self.request)
+        self.t.complete("write", self.request, self.t.now())
+        self.assertEqual(self.t.events(), [])
+
+    @patch("malcolm.core.tracer.time")
+    def test_instant(self, time_mock):
+        time_mock.time.return_value = 2.0
+        self.t.enable()
+        self.t.instant("enqueue", self.request)
+        event = self.t.events()[0]
+        self.assertEqual(event["name"], "enqueue")
+        self.assertEqual(event["ph"], "n")
+        self.assertEqual(event["ts"], 2e6)
+        self.assertEqual(event["args"]["id"], 32)
+        self.assertEqual(event["args"]["typeid"], "malcolm:core/Get:1.0")
+
+    def test_response_on_same_track_as_request(self):
+        self.t.enable()
+        self.t.instant("enqueue", self.request)
+        self.t.instant("respond", Return(32, self.context))
+        self.t.instant("respond", Return(32, MagicMock()))
+        events = self.t.events()
+        self.assertEqual(events[0]["id"], events[1]["id"])
+        self.assertNotEqual(events[0]["id"], events[2]["id"])
+
+    @patch("malcolm.core.tracer.time")
+    def test_complete(self, time_mock):
+        time_mock.time.return_value = 1.5
+        self.t.enable()
+        self.t.complete("write", None, 1.0)
+        event = self.t.events()[0]
+        self.assertEqual(event["ph"], "X")
+        self.assertEqual(event["ts"], 1e6)
+        self.assertEqual(event["dur"], 5e5)
+        self.assertNotIn("args", event)
+
+    def test_bounded(self):
+        self.t.enable(max_events=2)
+        for i in range(3):
+            self.t.complete(str(i), None, 0)
+        self.assertEqual([e["name"] for e in self.t.events()], ["1", "2"])
+        self.t.disable()
+        self.t.complete("3", None, 0)
+        self.assertEqual(len(self.t.events()), 2)
+
+    def test_export(self):
+        self.t.enable()
+        self.t.instant("enqueue", self.request)
+        tmpdir = tempfile.mkdtemp()
+        try:
+            filename = os.path.join(tmpdir, "trace.json")
+            self.t.export(filename)
+            with open(filename) as f:
+                d = json.load(f)
+        finally:
+            shutil.rmtree(tmpdir)
+        self.assertEqual(d["traceEvents"], self.t.events())
+        self.assertEqual(d["displayTimeUnit"], "ms")
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
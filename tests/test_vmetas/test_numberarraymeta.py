@@ -78,6 +78,20 @@ class TestValidation(unittest.TestCase):
         nm = NumberArrayMeta("int32")
         self.assertRaises(ValueError, nm.validate, [1.2, 34, 56])
 
+    def test_overflow_raises(self):
+        nm = NumberArrayMeta("int8")
+        self.assertRaises(ValueError, nm.validate, [1, 200])
+
+    def test_null_element_raises(self):
+        nm = NumberArrayMeta("float64")
+        self.assertRaises(ValueError, nm.validate, [1.0, None])
+
+    def test_strings_cast(self):
+        nm = NumberArrayMeta("int32")
+        response = nm.validate(["1", 2])
+        self.assertEqual(list(response), [1, 2])
+        self.assertEqual(response.dtype, np.int32)
+
     def test_null_element_raises(self):
         nm = NumberArrayMeta("float32")
         self.assertRaises(ValueError, nm.validate, [1.2, None, 5.6])
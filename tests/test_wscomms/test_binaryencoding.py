@@ -0,0 +1,122 @@
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+import setup_malcolm_paths
+
+from collections import OrderedDict
+import struct
+
+import unittest
+import numpy as np
+
+from malcolm.wscomms.binaryencoding import dumps, loads, pack_map_header, \
+    pack, frame, Attachments, loads_lazy
+from malcolm.core.request import Post
+
+
+class TestBinaryEncoding(unittest.TestCase):
+
+    def assertRoundTrips(self, o):
+        self.assertEqual(loads(dumps(o)), o)
+
+    def body(self, o):
+        return pack(o, Attachments())
+
+    def test_msgpack_format(self):
+        self.assertEqual(self.body(None), b"\xc0")
+        self.assertEqual(self.body(True), b"\xc3")
+        self.assertEqual(self.body(1), b"\x01")
+        self.assertEqual(self.body(-1), b"\xff")
+        self.assertEqual(self.body(256), b"\xcd\x01\x00")
+        self.assertEqual(self.body(1.5),
+                         b"\xcb\x3f\xf8\x00\x00\x00\x00\x00\x00")
+        self.assertEqual(self.body("a"), b"\xa1a")
+        self.assertEqual(self.body([1, 2]), b"\x92\x01\x02")
+        self.assertEqual(self.body(OrderedDict(a=1)), b"\x81\xa1a\x01")
+        self.assertEqual(pack_map_header(16), b"\xde\x00\x10")
+
+    def test_frame_format(self):
+        self.assertEqual(dumps(1), b"\x00\x00\x00\x01\x00\x00\x00\x00\x01")
+        attachments = Attachments()
+        body = pack(np.array([1, 2], dtype="<u2"), attachments)
+        message = frame(body, attachments)
+        self.assertEqual(message[:8], struct.pack(">I4x", len(body)))
+        self.assertEqual(message[8:8 + len(body)], body)
+        base = 8 + len(body) + (-len(body) % 8)
+        self.assertEqual(message[base:], b"\x01\x00\x02\x00" + b"\x00" * 4)
+
+    def test_round_trip(self):
+        for o in (None, False, True, 0, 127, 128, -32, -33, 2 ** 16,
+                  2 ** 40, -2 ** 40, 0.25, "", "x" * 40, "x" * 300,
+                  u"é", [], list(range(20)), b"\x00\x01"):
+            self.assertRoundTrips(o)
+
+    def test_map_order_kept(self):
+        d = OrderedDict((str(i), i) for i in reversed(range(20)))
+        decoded = loads(dumps(d))
+        self.assertIsInstance(decoded, OrderedDict)
+        self.assertEqual(list(decoded.items()), list(d.items()))
+
+    def test_numpy_array(self):
+        a = np.arange(12, dtype=np.float32).reshape(3, 4)
+        decoded = loads(dumps(a))
+        self.assertEqual(decoded.dtype, a.dtype)
+        self.assertEqual(decoded.shape, (3, 4))
+        self.assertTrue((decoded == a).all())
+        # a view of the message, not a copy
+        self.assertFalse(decoded.flags.writeable)
+        self.assertFalse(decoded.flags.owndata)
+
+    def test_numpy_arrays_aligned(self):
+        arrays = [np.arange(3, dtype=np.uint8), np.arange(5, dtype=np.float64),
+                  np.arange(6, dtype=np.int16).reshape(2, 3).T]
+        message = dumps(OrderedDict(a=arrays[0], b=arrays[1:]))
+        decoded = loads(message)
+        decoded = [decoded["a"]] + decoded["b"]
+        start = np.frombuffer(message, np.uint8).ctypes.data
+        for array, a in zip(decoded, arrays):
+            self.assertEqual(array.dtype, a.dtype)
+            self.assertTrue((array == a).all())
+            self.assertEqual((array.ctypes.data - start) % 8, 0)
+
+    def test_numpy_empty_and_object_arrays(self):
+        decoded = loads(dumps(np.zeros(0, dtype=np.int32)))
+        self.assertEqual(decoded.dtype, np.int32)
+        self.assertEqual(len(decoded), 0)
+        self.assertEqual(loads(dumps(np.array(["a", 1], dtype=object))),
+                         ["a", 1])
+
+    def test_numpy_scalars(self):
+        self.assertEqual(loads(dumps(np.uint32(3))), 3)
+        self.assertEqual(loads(dumps(np.float64(0.5))), 0.5)
+        self.assertEqual(loads(dumps(np.bool_(True))), True)
+
+    def test_serializable(self):
+        post = Post(None, None, ["block", "method"], dict(a=1))
+        post.set_id(4)
+        self.assertEqual(loads(dumps(post)), post.to_dict())
+
+    def test_loads_lazy(self):
+        value = OrderedDict([
+            ("a", [None, True, -1, 300, -300, 2 ** 40, 0.5, "x" * 40, b"b"]),
+            ("b", np.arange(4)), ("c", OrderedDict((str(i), i) for i in
+                                                   range(20)))])
+        d = OrderedDict([("typeid", "malcolm:core/Put:1.0"), ("value", value),
+                         ("endpoint", ["block", "attr", "value"]), ("id", 3)])
+        decoded = loads_lazy(dumps(d), ("value",))
+        self.assertEqual(list(decoded), ["typeid", "value", "endpoint", "id"])
+        self.assertEqual(decoded["endpoint"], ["block", "attr", "value"])
+        self.assertEqual(decoded["id"], 3)
+        lazy = decoded["value"]()
+        self.assertEqual(lazy["a"], value["a"])
+        self.assertEqual(list(lazy["b"]), [0, 1, 2, 3])
+        self.assertEqual(lazy["c"], value["c"])
+        self.assertRaises(ValueError, loads_lazy, dumps([1]), ("value",))
+
+    def test_unknown_raises(self):
+        self.assertRaises(TypeError, dumps, object())
+        self.assertRaises(ValueError, loads, struct.pack(">I4xB", 1, 0xc1))
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
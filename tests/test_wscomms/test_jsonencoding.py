@@ -0,0 +1,43 @@
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+import setup_malcolm_paths
+
+from collections import OrderedDict
+import json
+
+import unittest
+
+from malcolm.wscomms.jsonencoding import loads_lazy
+
+
+class TestLoadsLazy(unittest.TestCase):
+
+    def test_lazy_values_decoded_when_called(self):
+        value = OrderedDict([("a", [1, ']}[{"\\', {}]), ("b", 2.5)])
+        message = json.dumps(OrderedDict([
+            ("typeid", "malcolm:core/Put:1.0"), ("id", 3),
+            ("value", value), ("endpoint", ["block", "attr", "value"])]))
+        d = loads_lazy(message, ("value",))
+        self.assertEqual(list(d), ["typeid", "id", "value", "endpoint"])
+        self.assertEqual(d["id"], 3)
+        self.assertEqual(d["endpoint"], ["block", "attr", "value"])
+        decoded = d["value"]()
+        self.assertIsInstance(decoded, OrderedDict)
+        self.assertEqual(decoded, value)
+
+    def test_whitespace_and_scalars(self):
+        d = loads_lazy(' { "a" : 1 ,\n"b":"x" , "c" : null } ', ("b", "c"))
+        self.assertEqual(d["a"], 1)
+        self.assertEqual(d["b"](), "x")
+        self.assertEqual(d["c"](), None)
+        self.assertEqual(loads_lazy("{}", ("a",)), OrderedDict())
+
+    def test_invalid_raises(self):
+        for message in ("", "[1]", "{", '{"a": 1', '{"a" 1}', '{"a": 1}x',
+                        '{"a": 1,}', '{"a": [1, 2}'):
+            self.assertRaises(ValueError, loads_lazy, message, ("a",))
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
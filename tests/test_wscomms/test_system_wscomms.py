@@ -12,6 +12,7 @@ import unittest
 
 # tornado
 from tornado.websocket import websocket_connect
+from tornado.ioloop import IOLoop
 from tornado import gen
 import json
 
@@ -25,6 +26,10 @@ from malcolm.core.syncfactory import SyncFactory
 from malcolm.wscomms.wsservercomms import WSServerComms
 from malcolm.wscomms.wsclientcomms import WSClientComms
 
+if sys.version_info >= (3, 5):
+    import asyncio
+    from malcolm.core.asynciosyncfactory import AsyncioSyncFactory
+
 
 class TestSystemWSCommsServerOnly(unittest.TestCase):
     socket = 8881
@@ -98,5 +103,67 @@ class TestSystemWSCommsServerAndClient(TestSystemWSCommsServerOnly):
         self.assertEqual(ret, dict(greeting="Hello me2"))
 
 
+@unittest.skipIf(sys.version_info < (3, 5), "asyncio needs python 3.5")
+class TestSystemWSCommsAsyncio(unittest.TestCase):
+    socket = 8883
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        # WSServerComms runs its IOLoop on the current event loop
+        asyncio.set_event_loop(self.loop)
+        # the IOLoop holds one worker thread while it runs the event loop
+        self.sf = AsyncioSyncFactory("sync", loop=self.loop, pool_size=2)
+        self.process = Process("proc", self.sf)
+        block = Block()
+        HelloController(self.process, block, 'hello')
+        self.sc = WSServerComms("sc", self.process, self.socket)
+        asyncio.set_event_loop(None)
+        self.process.start()
+        # runs the event loop in a worker thread
+        self.sc.start()
+
+    def tearDown(self):
+        # the Process waits for the IOLoop and send_loop it spawned for
+        # WSServerComms, which run until it is stopped
+        self.process.stop(timeout=0.1)
+        self.sc.stop()
+        self.sc.wait(timeout=1)
+        self.loop.close()
+        self.sf.executor.shutdown()
+
+    @gen.coroutine
+    def send_message(self):
+        conn = yield websocket_connect("ws://localhost:%s/ws" % self.socket)
+        req = dict(
+            typeid="malcolm:core/Post:1.0",
+            id=0,
+            endpoint=["hello", "say_hello"],
+            parameters=dict(
+                name="me"
+            )
+        )
+        conn.write_message(json.dumps(req))
+        resp = yield conn.read_message()
+        conn.close()
+        raise gen.Return(json.loads(resp))
+
+    def test_server_and_simple_client(self):
+        client_loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(client_loop)
+        try:
+            resp = IOLoop.current().run_sync(self.send_message, timeout=5)
+        finally:
+            asyncio.set_event_loop(None)
+            client_loop.close()
+        self.assertEqual(resp, dict(
+            typeid="malcolm:core/Return:1.0",
+            id=0,
+            value=dict(
+                typeid="malcolm:core/Map:1.0",
+                greeting="Hello me"
+            )
+        ))
+
+
 if __name__ == "__main__":
     unittest.main(verbosity=2)
@@ -6,9 +6,13 @@ import setup_malcolm_paths
 from collections import OrderedDict
 
 import unittest
-from mock import MagicMock, patch, call
+from mock import MagicMock, patch, call, ANY
 
 from malcolm.wscomms.wsclientcomms import WSClientComms
+from malcolm.core.serializable import serialize_hook
+from malcolm.core.request import Get
+from malcolm.core.response import Return
+from malcolm.wscomms import binaryencoding
 
 
 class TestWSClientComms(unittest.TestCase):
@@ -24,14 +28,24 @@ class TestWSClientComms(unittest.TestCase):
         self.assertEqual(self.p, self.WS.process)
         self.assertEqual("test/url", self.WS.url)
         self.assertEqual(ioloop_mock.current(), self.WS.loop)
-        connect_mock.assert_called_once_with(self.WS.url, callback=self.WS.subscribe_server_blocks, on_message_callback=self.WS.on_message)
+        connect_mock.assert_called_once_with(
+            ANY, callback=self.WS.subscribe_server_blocks,
+            on_message_callback=self.WS.on_message)
+        request = connect_mock.call_args[0][0]
+        self.assertEqual(request.url, "test/url")
+        self.assertEqual(request.headers["Sec-WebSocket-Protocol"],
+                         "malcolm.msgpack")
         self.assertEqual(connect_mock(), self.WS.conn)
 
     @patch('malcolm.wscomms.wsclientcomms.websocket_connect')
     @patch('malcolm.wscomms.wsclientcomms.IOLoop')
     def test_subscribe_initial(self, _, _2):
         self.WS = WSClientComms("TestWebSocket", self.p, "test/url")
-        self.WS.subscribe_server_blocks("conn")
+        conn = MagicMock()
+        conn.result().headers = {}
+        self.WS.subscribe_server_blocks(conn)
+        self.assertFalse(self.WS.binary)
+        self.assertFalse(self.WS.rows)
         self.assertEqual(self.WS.loop.add_callback.call_count, 1)
         request = self.WS.loop.add_callback.call_args[0][1]
         self.assertEqual(request.id_, 0)
@@ -89,8 +103,40 @@ class TestWSClientComms(unittest.TestCase):
         request_mock = MagicMock()
         self.WS.send_to_server(request_mock)
 
-        json_mock.dumps.assert_called_once_with(request_mock.to_dict())
-        result_mock.write_message.assert_called_once_with(dumps_mock)
+        json_mock.dumps.assert_called_once_with(
+            request_mock.to_dict(), default=serialize_hook)
+        result_mock.write_message.assert_called_once_with(
+            dumps_mock, binary=False)
+
+    @patch('malcolm.wscomms.wsclientcomms.websocket_connect')
+    @patch('malcolm.wscomms.wsclientcomms.IOLoop')
+    def test_binary_negotiated(self, _, connect_mock):
+        self.WS = WSClientComms("TestWebSocket", self.p, "test/url")
+        conn = MagicMock()
+        conn.result().headers = {"Sec-WebSocket-Protocol": "malcolm.msgpack"}
+        self.WS.subscribe_server_blocks(conn)
+        self.assertTrue(self.WS.binary)
+        self.assertTrue(self.WS.rows)
+
+        request = Get(None, None, ["block", "attr"])
+        request.set_id(2)
+        self.WS.send_to_server(request)
+        write_message = connect_mock().result().write_message
+        message = write_message.call_args[0][0]
+        self.assertEqual(write_message.call_args[1], dict(binary=True))
+        self.assertEqual(binaryencoding.loads(message), request.to_dict())
+
+    @patch('malcolm.wscomms.wsclientcomms.websocket_connect')
+    @patch('malcolm.wscomms.wsclientcomms.IOLoop')
+    def test_on_binary_message(self, _, _1):
+        self.WS = WSClientComms("TestWebSocket", self.p, "test/url")
+        request_mock = MagicMock()
+        self.WS.requests[1] = request_mock
+        self.WS.on_message(binaryencoding.dumps(
+            Return(1, None, value=[1, 2]).to_dict()))
+        response = request_mock.response_queue.put.call_args[0][0]
+        self.assertIsInstance(response, Return)
+        self.assertEqual(response.value, [1, 2])
 
     @patch('malcolm.wscomms.wsclientcomms.websocket_connect')
     @patch('malcolm.wscomms.wsclientcomms.IOLoop')
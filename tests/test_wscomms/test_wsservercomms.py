@@ -4,12 +4,18 @@ sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
 import setup_malcolm_paths
 
 from collections import OrderedDict
+import json
 
 import unittest
+import numpy as np
 from mock import MagicMock, patch, call
 
 from malcolm.wscomms.wsservercomms import WSServerComms
 from malcolm.wscomms.wsservercomms import MalcolmWebSocketHandler
+from malcolm.core.request import Get, Put, Post, Deferred
+from malcolm.core.response import Delta, Update, Return
+from malcolm.core.serializable import serialize_hook
+from malcolm.wscomms import binaryencoding
 
 
 class TestWSServerComms(unittest.TestCase):
@@ -113,12 +119,154 @@ class TestWSServerComms(unittest.TestCase):
     def test_send_to_client(self, _, _2, json_mock):
         self.WS = WSServerComms("TestWebSocket", self.p, 1)
 
-        response_mock = MagicMock()
+        response_mock = MagicMock(encoding_key=None)
+        response_mock.context.binary = False
         self.WS.send_to_client(response_mock)
 
-        json_mock.dumps.assert_called_once_with(response_mock.to_dict())
+        json_mock.dumps.assert_called_once_with(
+            response_mock.to_dict(), default=serialize_hook)
         response_mock.context.write_message.assert_called_once_with(
-            json_mock.dumps())
+            json_mock.dumps(), binary=False)
+
+    @patch('malcolm.wscomms.wsservercomms.HTTPServer.listen')
+    @patch('malcolm.wscomms.wsservercomms.IOLoop')
+    def test_send_binary_to_client(self, _, _2):
+        self.WS = WSServerComms("TestWebSocket", self.p, 1)
+        context = MagicMock(binary=True)
+        response = Return(1, context, value=dict(a=[1, 2]))
+        self.WS.send_to_client(response)
+
+        message = context.write_message.call_args[0][0]
+        self.assertEqual(context.write_message.call_args[1], dict(binary=True))
+        self.assertEqual(binaryencoding.loads(message), response.to_dict())
+
+    def test_select_subprotocol(self):
+        m = MagicMock()
+        MWSH = MalcolmWebSocketHandler(m, m)
+        self.assertEqual(MWSH.select_subprotocol([]), None)
+        self.assertFalse(MWSH.binary)
+        self.assertEqual(MWSH.select_subprotocol(["malcolm.msgpack"]),
+                         "malcolm.msgpack")
+        self.assertTrue(MWSH.binary)
+
+    def test_MWSH_on_binary_message(self):
+        m = MagicMock()
+        MWSH = MalcolmWebSocketHandler(m, m)
+        MWSH.servercomms = MagicMock()
+        get = Get(None, None, ["block", "attr"])
+        get.set_id(3)
+        MWSH.on_message(binaryencoding.dumps(get.to_dict()))
+        request = MWSH.servercomms.on_request.call_args[0][0]
+        self.assertIsInstance(request, Get)
+        self.assertEqual(request.id_, 3)
+        self.assertEqual(request.endpoint, ["block", "attr"])
+        self.assertIs(request.context, MWSH)
+
+    def test_MWSH_on_message_defers_payload(self):
+        m = MagicMock()
+        MWSH = MalcolmWebSocketHandler(m, m)
+        MWSH.servercomms = MagicMock(lazy=True)
+        put = Put(None, None, ["block", "attr", "value"], [1, 2, 3])
+        put.set_id(4)
+        for message in (json.dumps(put.to_dict()),
+                        binaryencoding.dumps(put.to_dict())):
+            MWSH.on_message(message)
+            request = MWSH.servercomms.on_request.call_args[0][0]
+            self.assertIsInstance(request, Put)
+            self.assertEqual(request.id_, 4)
+            self.assertEqual(request.endpoint, ["block", "attr", "value"])
+            self.assertIsInstance(request._value, Deferred)
+            self.assertEqual(list(request.value), [1, 2, 3])
+            self.assertNotIsInstance(request._value, Deferred)
+
+    def test_MWSH_on_message_malformed_payload(self):
+        m = MagicMock()
+        MWSH = MalcolmWebSocketHandler(m, m)
+        MWSH.servercomms = MagicMock(lazy=True)
+        MWSH.on_message(
+            '{"typeid": "malcolm:core/Put:1.0", "id": 4, '
+            '"endpoint": ["block", "attr", "value"], "value": {"a" 1}}')
+        # routed, so the Block can respond with an Error when it decodes it
+        request = MWSH.servercomms.on_request.call_args[0][0]
+        self.assertIsInstance(request, Put)
+        self.assertEqual(request.id_, 4)
+        with self.assertRaises(ValueError):
+            request.value
+
+    def test_MWSH_on_message_not_lazy(self):
+        m = MagicMock()
+        MWSH = MalcolmWebSocketHandler(m, m)
+        MWSH.servercomms = MagicMock(lazy=False)
+        post = Post(None, None, ["block", "method"], OrderedDict(a=1))
+        MWSH.on_message(json.dumps(post.to_dict()))
+        request = MWSH.servercomms.on_request.call_args[0][0]
+        self.assertEqual(request._parameters, dict(a=1))
+
+    @patch('malcolm.wscomms.wsservercomms.HTTPServer')
+    @patch('malcolm.wscomms.wsservercomms.IOLoop')
+    def test_encode_shared_response(self, _, _2):
+        self.WS = WSServerComms("TestWebSocket", self.p, 1)
+        key = object()
+        changes = [[["attr", "value"], 32]]
+        responses = [Delta(i, MagicMock(), changes, key) for i in range(3)]
+        with patch('malcolm.core.serializable.serialize_object',
+                   side_effect=lambda o: o) as serialize_mock:
+            messages = [self.WS.encode_response(r) for r in responses]
+        self.assertEqual(serialize_mock.call_args_list,
+                         [call(0), call(changes)])
+        for response, message in zip(responses, messages):
+            self.assertEqual(json.loads(message), response.to_dict())
+        self.assertEqual(messages[2], json.dumps(responses[2].to_dict()))
+
+    @patch('malcolm.wscomms.wsservercomms.HTTPServer')
+    @patch('malcolm.wscomms.wsservercomms.IOLoop')
+    def test_encode_shared_binary_response(self, _, _2):
+        self.WS = WSServerComms("TestWebSocket", self.p, 1)
+        key = object()
+        changes = [[["attr", "value"], 32]]
+        responses = [Delta(i, MagicMock(), changes, key) for i in range(3)]
+        messages = [self.WS.encode_response(r, True) for r in responses]
+        for response, message in zip(responses, messages):
+            self.assertEqual(binaryencoding.loads(message), response.to_dict())
+        # the json frame is kept separately
+        message = self.WS.encode_response(responses[0])
+        self.assertEqual(json.loads(message), responses[0].to_dict())
+
+    @patch('malcolm.wscomms.wsservercomms.HTTPServer')
+    @patch('malcolm.wscomms.wsservercomms.IOLoop')
+    def test_encode_shared_binary_array_response(self, _, _2):
+        self.WS = WSServerComms("TestWebSocket", self.p, 1)
+        key = object()
+        array = np.arange(10, dtype=np.int32)
+        changes = [[["attr", "value"], array]]
+        for i in range(2):
+            message = self.WS.encode_response(
+                Delta(i, MagicMock(), changes, key), True)
+            decoded = binaryencoding.loads(message)
+            self.assertEqual(decoded["id"], i)
+            value = decoded["changes"][0][1]
+            self.assertEqual(value.dtype, np.int32)
+            self.assertEqual(list(value), list(range(10)))
+
+    @patch('malcolm.wscomms.wsservercomms.HTTPServer')
+    @patch('malcolm.wscomms.wsservercomms.IOLoop')
+    def test_encode_new_key_reencodes(self, _, _2):
+        self.WS = WSServerComms("TestWebSocket", self.p, 1)
+        value = dict(attr=1)
+        first = self.WS.encode_response(Update(1, None, value, object()))
+        value["attr"] = 2
+        second = self.WS.encode_response(Update(1, None, value, object()))
+        self.assertEqual(json.loads(first)["value"], dict(attr=1))
+        self.assertEqual(json.loads(second)["value"], dict(attr=2))
+
+    @patch('malcolm.wscomms.wsservercomms.HTTPServer')
+    @patch('malcolm.wscomms.wsservercomms.IOLoop')
+    def test_on_close(self, _, _2):
+        self.WS = WSServerComms("ws", self.p, 1)
+        m = MagicMock()
+        MWSH = MalcolmWebSocketHandler(m, m)
+        MWSH.on_close()
+        self.p.unsubscribe_all.assert_called_once_with(self.WS.q, MWSH)
 
 if __name__ == "__main__":
     unittest.main(verbosity=2)